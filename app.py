@@ -1,388 +1,193 @@
 # app.py
+"""Flask front end: ``create_app()`` and the HTTP routes.
+
+The ship tracking itself lives in :mod:`core`, which the routes reach
+through the module (``core.X``) so its lazily initialised state is shared.
+"""
 from __future__ import annotations
-import os
-import json
+import atexit
+import hmac
 import logging
+import os
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Any
-
-import requests
-try:
-    import pycountry
-except ImportError:  # pragma: no cover - optional dependency
-    pycountry = None
-from sqlalchemy import (
-    create_engine,
-    MetaData,
-    Table,
-    Column,
-    Integer,
-    DateTime,
-    select,
-)
-from sqlalchemy.engine import Engine
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.pool import StaticPool
-
-from flask import Flask, jsonify, request, render_template
-from dotenv import load_dotenv
-
-from barentswatch import BarentsWatchClient
-from geometry_utils import (
-    ensure_valid_polygon_geometry,
-    geometry_area_km2,
+from typing import Dict, Any, Iterable, Iterator
+
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request, render_template
+
+import core
+from core import _parse_msgtime
+from geometry_utils import ensure_valid_polygon_geometry, geometry_hash
+from live_feed import FeedFull, SnapshotFeed
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    GEOMETRY_SECONDS,
+    REGISTRY,
+    REQUEST_PHASE_SECONDS,
 )
+from request_timing import activate, current_timings, deactivate, phase, timed_chunks
+from sampling_profiler import SamplingProfiler
+from serializers import FORMATS, SERIALIZERS, choose_encoding, compress, iter_ships_delta
+from vessel_store import VesselState, VesselStore
 
-# Load environment (local dev)
-load_dotenv()
-
-logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 logger = logging.getLogger("barentswatch-geoapp")
 
-app = Flask(__name__)
-
-# Configuration
-DEFAULT_GEOJSON_PATH = os.getenv("GEOJSON_PATH", "map.geojson")
-MAX_AREA_KM2 = float(os.getenv("MAX_AREA_KM2", "500"))
-SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
-DATABASE_URL = os.getenv("DATABASE_URL")
-# Heroku provides URLs starting with ``postgres://`` which is no longer
-# recognised by SQLAlchemy. Normalise it to ``postgresql+psycopg2://`` so the
-# correct dialect/driver is loaded.
-if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace(
-        "postgres://", "postgresql+psycopg2://", 1
-    )
-
-# Track ships we've already notified about
-_known_mmsi: set[int] = set()
-_engine: Engine | None = None
-_seen_table: Table | None = None
-_ignored_ships: list[dict[str, Any]] = []
-
-
-def _load_ignored_ships() -> list[dict[str, Any]]:
-    """Load ships that should be ignored for notifications."""
-
-    path = os.path.join(os.path.dirname(__file__), "ignored_ships.json")
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        logger.info("Ignored ships file not found: %s", path)
-        return []
-    except json.JSONDecodeError as exc:
-        logger.warning("Invalid ignored ships file %s: %s", path, exc)
-        return []
-
-    ships = data if isinstance(data, list) else data.get("ignored_ships", [])
-    cleaned: list[dict[str, Any]] = []
-    for entry in ships:
-        if not isinstance(entry, dict):
-            continue
-        name = entry.get("name")
-        mmsi = entry.get("mmsi")
-        if name or mmsi:
-            cleaned.append({"name": name, "mmsi": mmsi})
-    return cleaned
-
-
-def _load_flag_map() -> dict[str, str]:
-    """Load MMSI MID to flag name mapping."""
-    path = os.path.join(os.path.dirname(__file__), "mmsi_mid_to_flag.json")
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data.get("mid_to_flag", {})
-    except FileNotFoundError:
-        logger.warning("Flag mapping file not found: %s", path)
-    except json.JSONDecodeError as exc:
-        logger.warning("Invalid flag mapping file %s: %s", path, exc)
-    return {}
-
-
-_mid_to_flag = _load_flag_map()
-
-
-def _load_ship_type_map() -> dict[int, str]:
-    """Load mapping of ship type numbers to human readable strings."""
-    path = os.path.join(os.path.dirname(__file__), "ship_type_map.json")
-    mapping: dict[int, str] = {}
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        logger.warning("Ship type mapping file not found: %s", path)
-        return mapping
-    except json.JSONDecodeError as exc:
-        logger.warning("Invalid ship type mapping file %s: %s", path, exc)
-        return mapping
-
-    def _expand_range(key: str) -> range:
-        if "-" in key:
-            start, end = key.split("-", 1)
-            return range(int(start), int(end) + 1)
-        return range(int(key), int(key) + 1)
-
-    for key, val in data.items():
-        if isinstance(val, str):
-            for num in _expand_range(key):
-                mapping[num] = val
-        elif isinstance(val, dict):
-            descriptions = val.get("beskrivelser", {})
-            for d_key, d_val in descriptions.items():
-                for num in _expand_range(d_key):
-                    mapping[num] = d_val
-
-    return mapping
-
-
-_ship_type_map = _load_ship_type_map()
-_ignored_ships = _load_ignored_ships()
-
-
-def _ship_type_description(code: Any) -> str:
-    try:
-        return _ship_type_map.get(int(code), "Unknown")
-    except (TypeError, ValueError):
-        return "Unknown"
-
-
-def _is_ignored_ship(ship: Dict[str, Any]) -> bool:
-    name = str(ship.get("name") or "").strip().lower()
-    mmsi_raw = ship.get("mmsi")
-    for ignored in _ignored_ships:
-        ignored_name = str(ignored.get("name") or "").strip().lower()
-        ignored_mmsi = ignored.get("mmsi")
-
-        name_matches = bool(name and ignored_name and name == ignored_name)
-        try:
-            mmsi_matches = ignored_mmsi is not None and int(mmsi_raw) == int(
-                ignored_mmsi
-            )
-        except (TypeError, ValueError):
-            mmsi_matches = False
-
-        if name_matches or mmsi_matches:
-            return True
-    return False
-
-def _country_to_emoji(name: str) -> str:
-    if not pycountry:
-        return ""
-    try:
-        # Handle names like "Portugal - Azores"
-        clean_name = name.split(" - ")[0]
-        country = pycountry.countries.search_fuzzy(clean_name)[0]
-    except Exception:
-        return ""
-    code = country.alpha_2.upper()
-    return "".join(chr(0x1F1E6 + ord(c) - ord("A")) for c in code)
-
-
-def _flag_from_mmsi(mmsi: int) -> str:
-    mid = str(mmsi)[:3]
-    name = _mid_to_flag.get(mid)
-    if not name:
-        return "Unknown"
-    emoji = _country_to_emoji(name)
-    if emoji:
-        return f"{emoji} {name}"
-    return name
-
-# Initialize BarentsWatch client (token management inside)
-bw_client = BarentsWatchClient(
-    client_id=os.getenv("BW_CLIENT_ID"),
-    client_secret=os.getenv("BW_CLIENT_SECRET"),
-    static_access_token=os.getenv("BW_ACCESS_TOKEN"),
-    token_url=os.getenv("BW_TOKEN_URL", "https://id.barentswatch.no/connect/token"),
-)
-
-def _init_db() -> None:
-    """Initialize persistent storage of seen MMSIs."""
-    global _engine, _seen_table
-    if not DATABASE_URL:
-        return
-    kwargs = {}
-    if DATABASE_URL.startswith("sqlite"):
-        kwargs["connect_args"] = {"check_same_thread": False}
-        if DATABASE_URL.endswith(":memory:"):
-            kwargs["poolclass"] = StaticPool
-    _engine = create_engine(DATABASE_URL, **kwargs)
-    metadata = MetaData()
-    _seen_table = Table(
-        "seen_mmsi",
-        metadata,
-        Column("mmsi", Integer, primary_key=True),
-        Column("last_seen", DateTime(timezone=True), nullable=False),
-    )
-    metadata.create_all(_engine)
-    try:
-        with _engine.begin() as conn:
-            rows = conn.execute(select(_seen_table.c.mmsi)).fetchall()
-            _known_mmsi.update(row[0] for row in rows)
-    except SQLAlchemyError as exc:
-        logger.warning("DB init failed: %s", exc)
-
-_init_db()
-
-def _load_default_geometry() -> Dict[str, Any]:
-    """Load geometry from DEFAULT_GEOJSON_PATH (Polygon or MultiPolygon)."""
-    if not os.path.exists(DEFAULT_GEOJSON_PATH):
-        raise FileNotFoundError(f"GeoJSON file not found: {DEFAULT_GEOJSON_PATH}")
-    with open(DEFAULT_GEOJSON_PATH, "r", encoding="utf-8") as f:
-        gj = json.load(f)
-    # Allow either a FeatureCollection/Feature or direct geometry
-    if gj.get("type") == "FeatureCollection":
-        if not gj.get("features"):
-            raise ValueError("FeatureCollection has no features")
-        geom = gj["features"][0].get("geometry")
-    elif gj.get("type") == "Feature":
-        geom = gj.get("geometry")
-    else:
-        geom = gj  # assume bare geometry
-    geom = ensure_valid_polygon_geometry(geom)
-    return geom
-
-def _validate_area(geom: Dict[str, Any]) -> float:
-    area_km2 = geometry_area_km2(geom)
-    if area_km2 > MAX_AREA_KM2:
-        raise ValueError(f"Area too large: {area_km2:.1f} km^2 (max {MAX_AREA_KM2} km^2)")
-    return area_km2
-
-
-def notify_new_ships(features: list[Dict[str, Any]]) -> None:
-    """Send Slack notifications for ships not seen before."""
-
-    new_ships: list[Dict[str, Any]] = []
-    now = datetime.now(timezone.utc)
-    current_mmsi: set[int] = set()
-    for ship in features:
-        mmsi_raw = ship.get("mmsi")
-        try:
-            mmsi = int(mmsi_raw)
-        except (TypeError, ValueError):
-            continue
-        current_mmsi.add(mmsi)
-        if _engine and _seen_table is not None:
-            try:
-                with _engine.begin() as conn:
-                    if mmsi in _known_mmsi:
-                        conn.execute(
-                            _seen_table.update()
-                            .where(_seen_table.c.mmsi == mmsi)
-                            .values(last_seen=now)
-                        )
-                    else:
-                        conn.execute(
-                            _seen_table.insert().values(mmsi=mmsi, last_seen=now)
-                        )
-            except SQLAlchemyError as exc:
-                logger.warning("Failed to store MMSI %s: %s", mmsi, exc)
-        if mmsi not in _known_mmsi:
-            _known_mmsi.add(mmsi)
-            if not _is_ignored_ship(ship):
-                new_ships.append(ship)
-
-    # Remove ships that are no longer present
-    departed = _known_mmsi - current_mmsi
-    if departed:
-        _known_mmsi.difference_update(departed)
-        if _engine and _seen_table is not None:
-            try:
-                with _engine.begin() as conn:
-                    conn.execute(
-                        _seen_table.delete().where(
-                            _seen_table.c.mmsi.in_(departed)
-                        )
-                    )
-            except SQLAlchemyError as exc:
-                logger.warning("Failed to remove MMSIs %s: %s", departed, exc)
-
-    for ship in new_ships:
-        if not SLACK_WEBHOOK_URL:
-            continue
-        name = ship.get("name") or "Unknown"
-        destination = ship.get("destination") or "Unknown"
-        length = ship.get("length") or ship.get("lengthoverall") or "Unknown"
-
-        ship_type_code = ship.get("shipType") or ship.get("ship_type")
-        ship_type_desc = _ship_type_description(ship_type_code)
-
-        mmsi_raw = ship.get("mmsi")
-        try:
-            mmsi_val = int(mmsi_raw)
-        except (TypeError, ValueError):
-            mmsi_val = 0
-        flag = _flag_from_mmsi(mmsi_val)
-
-        lat = ship.get("latitude")
-        lon = ship.get("longitude")
-        text = (
-            "Nytt skip på vei!\n"
-            f"{name}\n"
-            f"({mmsi_raw})\n"
-            f"{flag}\n"
-            f"{ship_type_desc}\n"
+# How often /ships/stream refreshes the shared snapshot, and heartbeat period
+SHIPS_STREAM_INTERVAL = float(os.getenv("SHIPS_STREAM_INTERVAL", "30"))
+SHIPS_STREAM_HEARTBEAT = float(os.getenv("SHIPS_STREAM_HEARTBEAT", "15"))
+# Each /ships/stream client holds a worker thread; keep some for other requests
+SHIPS_STREAM_MAX_CLIENTS = int(os.getenv("SHIPS_STREAM_MAX_CLIENTS", "12"))
+# Keep sampled stacks of the slowest PROFILE_SLOWEST requests (0 = off);
+# /debug/profiles requires ADMIN_TOKEN in the X-Admin-Token header
+PROFILE_SLOWEST = int(os.getenv("PROFILE_SLOWEST", "0"))
+PROFILE_WINDOW_SECONDS = float(os.getenv("PROFILE_WINDOW_SECONDS", "300"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+bp = Blueprint("ships", __name__)
+
+
+def create_app() -> Flask:
+    """Build the Flask app. Nothing is fetched or connected until first use."""
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(bp)
+    return flask_app
+
+
+# Sampled stacks of the slowest requests, see GET /debug/profiles
+_profiler: SamplingProfiler | None = None
+if PROFILE_SLOWEST > 0:
+    if ADMIN_TOKEN:
+        _profiler = SamplingProfiler(
+            keep=PROFILE_SLOWEST,
+            window=PROFILE_WINDOW_SECONDS,
+            interval=PROFILE_INTERVAL_MS / 1000.0,
         )
-        try:
-            requests.post(SLACK_WEBHOOK_URL, json={"text": text}, timeout=10)
-        except Exception as exc:
-            logger.warning("Failed to notify Slack: %s", exc)
-
-
-def clear_seen_mmsi() -> None:
-    """Clear all stored MMSI entries both in memory and in the database."""
-    _known_mmsi.clear()
-    # Ensure database is initialised so we can clear the table
-    if not _engine or _seen_table is None:
-        _init_db()
-    if not _engine or _seen_table is None:
-        return
-    try:
-        with _engine.begin() as conn:
-            conn.execute(_seen_table.delete())
-    except SQLAlchemyError as exc:
-        logger.warning("Failed to clear seen_mmsi table: %s", exc)
-
-@app.get("/")
+    else:
+        logger.warning("PROFILE_SLOWEST is set but ADMIN_TOKEN is not; profiler disabled")
+
+# Long-lived SSE connections would always be the "slowest" requests
+_UNPROFILED_PATHS = {"/ships/stream"}
+
+
+@bp.before_app_request
+def _start_request_timing() -> None:
+    _, g.timing_token = activate()
+    if _profiler is not None and request.path not in _UNPROFILED_PATHS:
+        g.profile_handle = _profiler.begin(f"{request.method} {request.path}")
+
+
+@bp.after_app_request
+def _add_server_timing(response: Response) -> Response:
+    timings = current_timings()
+    if timings is None:
+        return response
+    response.headers["Server-Timing"] = timings.header()
+    profiler, handle = _profiler, g.pop("profile_handle", None)
+
+    def finish() -> None:
+        # Runs once a streamed body has been sent, so it sees serialization
+        for name, seconds in timings.items():
+            REQUEST_PHASE_SECONDS.observe(seconds, phase=name)
+        if profiler is not None and handle is not None:
+            profiler.end(handle)
+
+    response.call_on_close(finish)
+    return response
+
+
+@bp.teardown_app_request
+def _stop_request_timing(exc: BaseException | None) -> None:
+    token = g.pop("timing_token", None)
+    if token is not None:
+        deactivate(token)
+
+
+def _admin_error():
+    """Return an error response unless the profiler is on and the caller is admin."""
+    if _profiler is None:
+        return jsonify({"error": "profiler disabled"}), 404
+    supplied = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"error": "forbidden"}), 403
+    return None
+
+
+@bp.get("/debug/profiles")
+def list_profiles():
+    """The slowest requests of the profiler window, slowest first."""
+    error = _admin_error()
+    if error:
+        return error
+    return jsonify({
+        "window_seconds": _profiler.window,
+        "profiles": [profile.summary() for profile in _profiler.slowest()],
+    })
+
+
+@bp.get("/debug/profiles/<int:profile_id>")
+def get_profile(profile_id: int):
+    """Folded stacks of one request, for flamegraph.pl or speedscope."""
+    error = _admin_error()
+    if error:
+        return error
+    profile = _profiler.get(profile_id)
+    if profile is None:
+        return jsonify({"error": "profile not found"}), 404
+    return Response(profile.folded(), mimetype="text/plain")
+
+
+@bp.get("/")
 def index():
     return render_template("index.html",
-                           max_area_km2=MAX_AREA_KM2,
-                           default_geojson_path=DEFAULT_GEOJSON_PATH)
+                           max_area_km2=core.MAX_AREA_KM2,
+                           default_geojson_path=core.DEFAULT_GEOJSON_PATH)
 
-@app.get("/health")
+@bp.get("/health")
 def health():
-    return jsonify({"status": "ok", "time": datetime.now(timezone.utc).isoformat()})
+    return jsonify({
+        "status": "ok",
+        "time": datetime.now(timezone.utc).isoformat(),
+        # Whether this worker polls and notifies; see leader.py
+        "leader": core._election.leader,
+    })
+
 
+@bp.get("/metrics")
+def metrics():
+    """Prometheus text exposition of this worker's metrics."""
+    return Response(REGISTRY.render(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
 
-@app.get("/data")
+@bp.get("/data")
 def data():
     """Return rows from the ``seen_mmsi`` table to verify DB access."""
+    from sqlalchemy import select
+    from sqlalchemy.exc import SQLAlchemyError
+
     # Lazily (re)initialize the database so the endpoint works even if the
     # table has been dropped after startup or the engine wasn't ready yet.
-    if not _engine or _seen_table is None:
-        _init_db()
-    if not _engine or _seen_table is None:
+    if not core._ensure_db() or core._seen_table is None:
+        core._init_db()
+    if not core._engine or core._seen_table is None:
         return jsonify({"error": "database not configured"}), 500
 
     try:
-        with _engine.connect() as conn:
-            rows = conn.execute(select(_seen_table)).fetchall()
+        with core._engine.connect() as conn:
+            rows = conn.execute(select(core._seen_table)).fetchall()
     except SQLAlchemyError as exc:
         message = str(exc).lower()
         # Handle missing table (e.g. after a reset) by recreating it on demand
         if "no such table" in message or "undefinedtable" in message:
             logger.warning("seen_mmsi table missing, creating it: %s", exc)
-            _init_db()
-            if not _engine or _seen_table is None:
+            core._init_db()
+            if not core._engine or core._seen_table is None:
                 return jsonify({"error": "database not configured"}), 500
-            with _engine.connect() as conn:
-                rows = conn.execute(select(_seen_table)).fetchall()
+            with core._engine.connect() as conn:
+                rows = conn.execute(select(core._seen_table)).fetchall()
         else:
             logger.warning("Database error: %s", exc)
             response = {"error": "database query failed"}
-            if app.debug:
+            if current_app.debug:
                 response["detail"] = str(exc)
             return jsonify(response), 500
 
@@ -396,41 +201,187 @@ def data():
     return jsonify({"rows": result})
 
 
-@app.delete("/data")
+@bp.delete("/data")
 def clear_data():
     """Clear the ``seen_mmsi`` table and in-memory cache."""
-    clear_seen_mmsi()
+    core.clear_seen_mmsi()
     return jsonify({"status": "cleared"})
 
-@app.get("/ships")
-def get_ships():
+def _ships_response(
+    geom: Dict[str, Any],
+    area_km2: float,
+    key: str | None = None,
+    store: VesselStore | None = None,
+):
+    fmt = request.args.get("format", "json")
+    if fmt not in SERIALIZERS:
+        return jsonify({"error": f"Unsupported format: {fmt}. Use json, geojson or ndjson."}), 400
+    since = request.args.get("since")
+    since_version = None
+    if since is not None:
+        if store is None or fmt != "json":
+            return jsonify({"error": "since is only supported for GET /ships with format=json"}), 400
+        try:
+            # None for a version of another worker's store: full snapshot
+            since_version = store.parse_token(since)
+        except ValueError:
+            return jsonify({"error": "since must be an X-Snapshot-Version value"}), 400
     try:
-        geom = _load_default_geometry()
-        area_km2 = _validate_area(geom)
+        if store is None:
+            features = core._ships_in_area(geom, key)
+        else:
+            served = core._default_ships(geom, key or geometry_hash(geom))
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        logger.exception("BarentsWatch error")
+        return jsonify({"error": f"Upstream error: {e}"}), 502
 
+    area_km2 = round(area_km2, 3)
+    if store is None:
+        return _stream_ships(features, len(features), area_km2, fmt)
+
+    # Read after the version: a newer view only repeats changes later
+    records = store.view()
+    age = max(0.0, time.time() - served.taken_at)
+    version = served.value
+    changes = store.changes_since(since_version) if since_version is not None else None
+    if changes is not None:
+        version = changes.version
+    etag = f"{store.token(version)}-{fmt}"
+    if changes is not None:
+        etag += f"-since-{since_version}"
+    headers = {"X-Snapshot-Version": store.token(version), "Age": str(int(age))}
+    if age >= core._snapshots.stale_after:
+        headers["X-Snapshot-Stale"] = "1"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304, headers={**headers, "Vary": "Accept-Encoding"})
+    elif changes is not None:
+        features = _render_records(changes.changed)
+        chunks = iter_ships_delta(
+            features, changes.removed, len(features), area_km2, store.token(changes.version), since
+        )
+        response = _stream_chunks(chunks, FORMATS[fmt], headers)
+    else:
+        # Unknown, expired or another worker's ``since`` gets the full snapshot
+        response = _stream_ships(_iter_records(records), len(records), area_km2, fmt, headers)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def _render_records(records: Iterable[VesselState]) -> list[Dict[str, Any]]:
+    features = [record.to_feature() for record in records]
+    core._enrich_features(features)
+    return features
+
+
+def _iter_records(records: Iterable[VesselState]) -> Iterator[Dict[str, Any]]:
+    """Render ``records`` one at a time, so no full feature list is built."""
+    for record in records:
+        feature = record.to_feature()
+        feature["shipType"] = core._ship_type_description(record.ship_type)
+        yield feature
+
+
+def _stream_ships(
+    features: Iterable[Dict[str, Any]],
+    count: int,
+    area_km2: float,
+    fmt: str,
+    headers: Dict[str, str] | None = None,
+) -> Response:
+    """Stream ``features`` as ``fmt``, compressed if the client accepts it."""
+    return _stream_chunks(SERIALIZERS[fmt](features, count, area_km2), FORMATS[fmt], headers)
+
+
+def _stream_chunks(
+    chunks: Iterable[bytes], mimetype: str, headers: Dict[str, str] | None = None
+) -> Response:
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    if encoding:
+        chunks = compress(chunks, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(timed_chunks(chunks), mimetype=mimetype, headers=headers)
+
+_live_feed = SnapshotFeed(
+    core.vessel_store,
+    lambda: core._refresh_default_area(),
+    render=_render_records,
+    interval=SHIPS_STREAM_INTERVAL,
+    heartbeat=SHIPS_STREAM_HEARTBEAT,
+    max_subscribers=SHIPS_STREAM_MAX_CLIENTS,
+)
+atexit.register(_live_feed.stop)
+
+
+@bp.get("/ships/stream")
+def stream_ships():
+    """Server-Sent Events feed of vessel changes in the default area."""
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        events = _live_feed.events(last_event_id or None)
+    except FeedFull:
+        resp = jsonify({"error": "Too many /ships/stream clients on this worker, try again later"})
+        resp.headers["Retry-After"] = str(int(SHIPS_STREAM_INTERVAL))
+        return resp, 503
+    return Response(
+        events,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@bp.get("/tracks/<int:mmsi>")
+def get_track(mmsi: int):
+    """Return stored positions for ``mmsi``, by default for the last 24 hours."""
     now = datetime.now(timezone.utc)
-    # Siste 1 time
-    msgtimefrom = now - timedelta(hours=1)
+    time_from = _parse_msgtime(request.args.get("from")) if request.args.get("from") else now - timedelta(hours=24)
+    time_to = _parse_msgtime(request.args.get("to")) if request.args.get("to") else now
+    if time_from is None or time_to is None:
+        return jsonify({"error": "from/to must be ISO 8601 timestamps"}), 400
+
+    if not core._ensure_db() or core._positions_table is None:
+        return jsonify({"error": "database not configured"}), 500
+    from sqlalchemy import select
+    from sqlalchemy.exc import SQLAlchemyError
 
+    table = core._positions_table
     try:
-        mmsi_list = bw_client.find_mmsi_in_area(
-            polygon_geometry=geom,
-            msgtimefrom=msgtimefrom,
-            msgtimeto=now,
-        )
-        features = bw_client.fetch_latest_combined(mmsi_list)
-        notify_new_ships(features)
-        for ship in features:
-            ship["shipType"] = _ship_type_description(ship.get("shipType"))
+        with core._engine.connect() as conn:
+            rows = conn.execute(
+                select(table.c.msgtime, table.c.latitude, table.c.longitude)
+                .where(
+                    table.c.mmsi == mmsi,
+                    table.c.msgtime >= time_from,
+                    table.c.msgtime <= time_to,
+                )
+                .order_by(table.c.msgtime)
+            ).fetchall()
+    except SQLAlchemyError as exc:
+        logger.warning("Database error: %s", exc)
+        return jsonify({"error": "database query failed"}), 500
+
+    positions = [
+        {
+            "msgtime": _parse_msgtime(row.msgtime).isoformat(),
+            "latitude": row.latitude,
+            "longitude": row.longitude,
+        }
+        for row in rows
+    ]
+    return jsonify({"mmsi": mmsi, "count": len(positions), "positions": positions})
+
+@bp.get("/ships")
+def get_ships():
+    try:
+        with phase("geometry"):
+            default = core._load_default_area()
+        with phase("area"):
+            area_km2 = core._check_area(default.area_km2)
     except Exception as e:
-        logger.exception("BarentsWatch error")
-        return jsonify({"error": f"Upstream error: {e}"}), 502
+        return jsonify({"error": str(e)}), 400
 
-    return jsonify({"count": len(features), "features": features, "area_km2": round(area_km2, 3)})
+    return _ships_response(default.geometry, area_km2, default.key, core.vessel_store)
 
-@app.post("/ships")
+@bp.post("/ships")
 def post_ships():
     try:
         payload = request.get_json(force=True, silent=False)
@@ -438,30 +389,15 @@ def post_ships():
             return jsonify({"error": "Expected JSON body"}), 400
         # Either full GeoJSON feature/collection or direct 'geometry'
         geom = payload.get("geometry", payload)
-        geom = ensure_valid_polygon_geometry(geom)
-        area_km2 = _validate_area(geom)
+        with phase("geometry"), GEOMETRY_SECONDS.time(operation="validate"):
+            geom = ensure_valid_polygon_geometry(geom)
+        area_km2 = core._validate_area(geom)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-    now = datetime.now(timezone.utc)
-    # Siste 1 time
-    msgtimefrom = now - timedelta(hours=1)
-
-    try:
-        mmsi_list = bw_client.find_mmsi_in_area(
-            polygon_geometry=geom,
-            msgtimefrom=msgtimefrom,
-            msgtimeto=now,
-        )
-        features = bw_client.fetch_latest_combined(mmsi_list)
-        notify_new_ships(features)
-        for ship in features:
-            ship["shipType"] = _ship_type_description(ship.get("shipType"))
-    except Exception as e:
-        logger.exception("BarentsWatch error")
-        return jsonify({"error": f"Upstream error: {e}"}), 502
+    return _ships_response(geom, area_km2)
 
-    return jsonify({"count": len(features), "features": features, "area_km2": round(area_km2, 3)})
+app = create_app()
 
 if __name__ == "__main__":
     # For local dev only. In Heroku, gunicorn (Procfile) will run the app.
@@ -0,0 +1,98 @@
+from __future__ import annotations
+import glob
+import os
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from geometry_utils import positions_xy, read_geojson_feature
+
+
+class Area(NamedTuple):
+    name: str
+    geometry: Dict[str, Any]
+    webhook_url: Optional[str] = None
+
+
+def _env_suffix(name: str) -> str:
+    return re.sub(r"[^A-Z0-9]+", "_", name.upper()).strip("_")
+
+
+def area_files(sources: Iterable[str]) -> List[str]:
+    """Expand directories in ``sources`` to the ``*.geojson`` files they contain."""
+    files: List[str] = []
+    for source in sources:
+        if os.path.isdir(source):
+            files.extend(sorted(glob.glob(os.path.join(source, "*.geojson"))))
+        else:
+            files.append(source)
+    return files
+
+
+def load_areas(sources: Iterable[str]) -> List[Area]:
+    """Load polling areas from GeoJSON files and/or directories.
+
+    The area name is the feature's ``name`` property or the file name without
+    extension. Notifications go to the ``slack_webhook_url`` property, then
+    ``SLACK_WEBHOOK_URL_<NAME>`` from the environment; ``None`` means the
+    default webhook.
+    """
+    areas: List[Area] = []
+    for path in area_files(sources):
+        geom, properties = read_geojson_feature(path)
+        name = str(properties.get("name") or os.path.splitext(os.path.basename(path))[0])
+        if any(area.name == name for area in areas):
+            raise ValueError(f"Duplicate area name: {name}")
+        webhook_url = properties.get("slack_webhook_url") or os.getenv(
+            f"SLACK_WEBHOOK_URL_{_env_suffix(name)}"
+        )
+        areas.append(Area(name, geom, webhook_url))
+    if not areas:
+        raise ValueError("No area files found")
+    return areas
+
+
+def merged_footprint(areas: List[Area]) -> Dict[str, Any]:
+    """Union of all area geometries, used for a single upstream query."""
+    import shapely
+    from shapely.geometry import mapping, shape
+
+    merged = shapely.union_all([shape(area.geometry) for area in areas])
+    return mapping(merged)
+
+
+class AreaIndex:
+    """STRtree over the polled areas for assigning vessels locally.
+
+    Built once per set of areas; :meth:`assign` places every vessel with a
+    single vectorized tree query, so cost grows with the number of vessels
+    rather than vessels x areas. Vessels without a position are not assigned.
+    """
+
+    def __init__(self, areas: List[Area]) -> None:
+        from shapely.geometry import shape
+        from shapely.strtree import STRtree
+
+        self.areas = list(areas)
+        self._tree = STRtree([shape(area.geometry) for area in self.areas])
+        self._footprint: Optional[Dict[str, Any]] = None
+
+    @property
+    def footprint(self) -> Dict[str, Any]:
+        """:func:`merged_footprint` of the areas, computed once."""
+        if self._footprint is None:
+            self._footprint = merged_footprint(self.areas)
+        return self._footprint
+
+    def assign(self, features: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        result: Dict[str, List[Dict[str, Any]]] = {area.name: [] for area in self.areas}
+        if not features:
+            return result
+        import numpy as np
+        import shapely
+
+        lon, lat = positions_xy(features)
+        points = shapely.points(lon, lat)
+        feature_idx, area_idx = self._tree.query(points, predicate="within")
+        for i in np.lexsort((area_idx, feature_idx)):
+            result[self.areas[area_idx[i]].name].append(features[feature_idx[i]])
+        return result
@@ -1,11 +1,16 @@
 # barentswatch.py
 from __future__ import annotations
-import time
-from typing import List, Dict, Any, Optional
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timezone
 
 import requests
 
+from metrics import UPSTREAM_ERRORS, UPSTREAM_SECONDS, VESSELS_FETCHED
+from request_timing import phase
+from token_manager import TokenManager, TokenStore
+from transport import Transport
+
 DEFAULT_FIND_IN_AREA_URL = "https://historic.ais.barentswatch.no/v1/historic/mmsiinarea"
 DEFAULT_LATEST_COMBINED_URL = "https://live.ais.barentswatch.no/v1/latest/combined"
 
@@ -19,6 +24,10 @@ class BarentsWatchClient:
         find_in_area_url: str = DEFAULT_FIND_IN_AREA_URL,
         latest_combined_url: str = DEFAULT_LATEST_COMBINED_URL,
         session: Optional[requests.Session] = None,
+        max_concurrency: int = 1,
+        token_store: Optional[TokenStore] = None,
+        token_refresh_margin: float = 300.0,
+        transport: Optional[Transport] = None,
     ) -> None:
         self.client_id = client_id
         self.client_secret = client_secret
@@ -26,9 +35,44 @@ class BarentsWatchClient:
         self.token_url = token_url
         self.find_in_area_url = find_in_area_url
         self.latest_combined_url = latest_combined_url
-        self._session = session or requests.Session()
-        self._token: Optional[str] = None
-        self._token_expiry_epoch: float = 0.0
+        # Number of latest/combined chunks posted in parallel (1 = sequential)
+        self.max_concurrency = max(1, int(max_concurrency))
+        # Retries, timeouts and circuit breaker for every upstream call; the
+        # connection pool must fit all parallel chunks plus a token request
+        self.transport = transport or Transport(session, pool_size=self.max_concurrency + 2)
+        self._session = self.transport.session
+        # Single-flight token cache, optionally shared between processes
+        self.token_manager = TokenManager(
+            self._request_token,
+            store=token_store,
+            refresh_margin=token_refresh_margin,
+        )
+
+    def _post(self, endpoint: str, url: str, **kwargs: Any) -> Any:
+        """POST through the transport, recording duration and failures.
+
+        A managed token that BarentsWatch rejects with 401 (revoked or
+        rotated) is dropped and the call is retried once with a new token.
+        """
+        resp = self._post_once(endpoint, url, **kwargs)
+        headers = kwargs.get("headers") or {}
+        rejected = headers.get("Authorization", "").partition("Bearer ")[2]
+        if resp.status_code == 401 and rejected and self.client_id and self.client_secret:
+            self.token_manager.invalidate(rejected)
+            kwargs["headers"] = {**headers, "Authorization": f"Bearer {self._get_access_token()}"}
+            resp = self._post_once(endpoint, url, **kwargs)
+        return resp
+
+    def _post_once(self, endpoint: str, url: str, **kwargs: Any) -> Any:
+        try:
+            with UPSTREAM_SECONDS.time(endpoint=endpoint):
+                resp = self.transport.post(url, **kwargs)
+        except Exception:
+            UPSTREAM_ERRORS.inc(endpoint=endpoint)
+            raise
+        if resp.status_code != 200:
+            UPSTREAM_ERRORS.inc(endpoint=endpoint)
+        return resp
 
     # -------------------------
     # OAuth2 Client Credentials
@@ -38,14 +82,13 @@ class BarentsWatchClient:
         if self.static_access_token and not (self.client_id and self.client_secret):
             return self.static_access_token
 
-        # Cached?
-        now = time.time()
-        if self._token and now < self._token_expiry_epoch - 30:
-            return self._token
-
         if not (self.client_id and self.client_secret):
             raise RuntimeError("Missing BW_CLIENT_ID / BW_CLIENT_SECRET (or BW_ACCESS_TOKEN)")
 
+        with phase("token"):
+            return self.token_manager.get_token()
+
+    def _request_token(self) -> Tuple[str, int]:
         data = {
             "grant_type": "client_credentials",
             "client_id": self.client_id,
@@ -53,15 +96,11 @@ class BarentsWatchClient:
             "scope": "ais",
         }
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        resp = self._session.post(self.token_url, data=data, headers=headers, timeout=30)
+        resp = self._post("token", self.token_url, data=data, headers=headers)
         if resp.status_code != 200:
             raise RuntimeError(f"Token request failed: {resp.status_code} {resp.text}")
         token_payload = resp.json()
-        self._token = token_payload["access_token"]
-        # Compute expiry
-        expires_in = int(token_payload.get("expires_in", 3600))
-        self._token_expiry_epoch = now + expires_in
-        return self._token
+        return token_payload["access_token"], int(token_payload.get("expires_in", 3600))
 
     # ------------------------------------
     # Historic: find MMSI within a polygon
@@ -79,7 +118,8 @@ class BarentsWatchClient:
             "msgtimeto": msgtimeto.replace(microsecond=0, tzinfo=timezone.utc).isoformat(),
             "polygon": polygon_geometry,
         }
-        resp = self._session.post(self.find_in_area_url, headers=headers, json=payload, timeout=60)
+        with phase("mmsiinarea"):
+            resp = self._post("mmsiinarea", self.find_in_area_url, headers=headers, json=payload)
         if resp.status_code != 200:
             raise RuntimeError(f"find_mmsi_in_area failed: {resp.status_code} {resp.text}")
         data = resp.json()
@@ -98,45 +138,92 @@ class BarentsWatchClient:
     # --------------------------------------------
     # Live: fetch latest combined positions by MMSI
     # --------------------------------------------
-    def fetch_latest_combined(self, mmsi_list: List[int], batch_size: int = 300) -> List[Dict[str, Any]]:
+    def fetch_latest_combined(
+        self,
+        mmsi_list: List[int],
+        batch_size: int = 300,
+        max_concurrency: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Fetch latest positions for ``mmsi_list`` in chunks of ``batch_size``.
+
+        Duplicate MMSIs are dropped before chunking. With ``max_concurrency``
+        above 1 the chunks are posted in parallel; results are still returned
+        in input order and the first failing chunk aborts the remaining ones.
+        """
         if not mmsi_list:
             return []
+        unique = list(dict.fromkeys(mmsi_list))
+        chunks = [unique[i:i+batch_size] for i in range(0, len(unique), batch_size)]
         token = self._get_access_token()
         headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-        results: List[Dict[str, Any]] = []
-        for i in range(0, len(mmsi_list), batch_size):
-            chunk = mmsi_list[i:i+batch_size]
-            payload = {"mmsi": chunk}
-            resp = self._session.post(self.latest_combined_url, headers=headers, json=payload, timeout=60)
-            if resp.status_code != 200:
-                raise RuntimeError(f"latest/combined failed: {resp.status_code} {resp.text}")
-            data = resp.json()
-            # Normalize to a simple list of features
-            for item in data if isinstance(data, list) else []:
-                length = (
-                    item.get("length")
-                    or item.get("lengthoverall")
-                    or item.get("lengthOverall")
-                )
-                # Destination may reside either at the top level or inside a
-                # nested vessel/static data structure depending on the API
-                # endpoint used.  Attempt to extract it from the most common
-                # locations.
-                destination = item.get("destination")
-                if not destination:
-                    vessel = item.get("vesselData") or item.get("vesseldata")
-                    if isinstance(vessel, dict):
-                        destination = vessel.get("destination") or vessel.get("dest")
-
-                simplified = {
-                    "mmsi": item.get("mmsi"),
-                    "name": item.get("name"),
-                    "latitude": item.get("latitude"),
-                    "longitude": item.get("longitude"),
-                    "msgtime": item.get("msgtime"),
-                    "shipType": item.get("shipType"),
-                    "destination": destination,
-                    "length": length,
-                }
-                results.append(simplified)
-        return results
+        workers = min(max_concurrency or self.max_concurrency, len(chunks))
+
+        with phase("latest"):
+            if workers <= 1:
+                batches = [self._post_latest_combined(chunk, headers) for chunk in chunks]
+            else:
+                batches = self._post_latest_combined_concurrently(chunks, headers, workers)
+
+        features = [item for batch in batches for item in batch]
+        VESSELS_FETCHED.inc(len(features))
+        return features
+
+    def _post_latest_combined_concurrently(
+        self,
+        chunks: List[List[int]],
+        headers: Dict[str, str],
+        workers: int,
+    ) -> List[List[Dict[str, Any]]]:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bw-latest")
+        try:
+            futures = [
+                executor.submit(self._post_latest_combined, chunk, headers)
+                for chunk in chunks
+            ]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in futures:
+                if future in done and future.exception() is not None:
+                    raise future.exception()
+            return [future.result() for future in futures]
+        finally:
+            # Drop chunks that have not started yet; in-flight ones finish.
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _post_latest_combined(
+        self, chunk: List[int], headers: Dict[str, str]
+    ) -> List[Dict[str, Any]]:
+        payload = {"mmsi": chunk}
+        resp = self._post("latest_combined", self.latest_combined_url, headers=headers, json=payload)
+        if resp.status_code != 200:
+            raise RuntimeError(f"latest/combined failed: {resp.status_code} {resp.text}")
+        data = resp.json()
+        # Normalize to a simple list of features
+        return [_simplify_latest(item) for item in (data if isinstance(data, list) else [])]
+
+
+def _simplify_latest(item: Dict[str, Any]) -> Dict[str, Any]:
+    length = (
+        item.get("length")
+        or item.get("lengthoverall")
+        or item.get("lengthOverall")
+    )
+    # Destination may reside either at the top level or inside a
+    # nested vessel/static data structure depending on the API
+    # endpoint used.  Attempt to extract it from the most common
+    # locations.
+    destination = item.get("destination")
+    if not destination:
+        vessel = item.get("vesselData") or item.get("vesseldata")
+        if isinstance(vessel, dict):
+            destination = vessel.get("destination") or vessel.get("dest")
+
+    return {
+        "mmsi": item.get("mmsi"),
+        "name": item.get("name"),
+        "latitude": item.get("latitude"),
+        "longitude": item.get("longitude"),
+        "msgtime": item.get("msgtime"),
+        "shipType": item.get("shipType"),
+        "destination": destination,
+        "length": length,
+    }
@@ -0,0 +1,407 @@
+"""Offline microbenchmarks for the hot paths, with baseline comparison.
+
+Every case runs against synthetic fleets (or polygons) of each ``--sizes``
+entry without touching the network or Slack. Results are written as JSON
+and, given ``--baseline``, compared against a stored report; the exit code
+is 1 when a case got slower than ``--threshold`` times its baseline and by
+more than ``--min-delta-ms``::
+
+    python benchmarks/bench_suite.py --output report.json --baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --save-baseline          # refresh benchmarks/baseline.json
+    python benchmarks/bench_suite.py --only notify --sizes 10 100 1000 5000
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, NamedTuple, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import core  # noqa: E402
+import geometry_utils  # noqa: E402
+from barentswatch import BarentsWatchClient  # noqa: E402
+from geometry_utils import ensure_valid_polygon_geometry, geometry_area_km2  # noqa: E402
+from transport import Transport  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+SHIP_TYPES = [30, 36, 52, 60, 70, 80, 99, None]
+
+
+class Case(NamedTuple):
+    name: str
+    # size -> context manager yielding the zero-argument callable to time
+    setup: Callable[[int], ContextManager[Callable[[], Any]]]
+    # False for cases whose input does not depend on the size
+    scales: bool = True
+
+
+def _plain(factory: Callable[[int], Callable[[], Any]]) -> Callable[[int], ContextManager[Callable[[], Any]]]:
+    @contextlib.contextmanager
+    def setup(size: int) -> Iterator[Callable[[], Any]]:
+        yield factory(size)
+
+    return setup
+
+
+def fleet(size: int, start: int = 0) -> List[Dict[str, Any]]:
+    """Synthetic ``latest/combined`` features spread over real MIDs."""
+    mids = (257, 258, 259, 230, 219, 273, 636, 538)
+    return [
+        {
+            "mmsi": mids[i % len(mids)] * 1000000 + i,
+            "name": f"SHIP {i}",
+            "latitude": 62.7 + (i % 100) * 0.001,
+            "longitude": 7.1 + (i % 97) * 0.001,
+            "msgtime": "2024-01-01T00:00:00+00:00",
+            "shipType": SHIP_TYPES[i % len(SHIP_TYPES)],
+            "destination": "MOLDE",
+            "length": 50 + i % 200,
+        }
+        for i in range(start, start + size)
+    ]
+
+
+def star_polygon(vertices: int) -> Dict[str, Any]:
+    """A valid, non-convex polygon with ``vertices`` corners (about 40 km²)."""
+    vertices = max(4, vertices)
+    ring = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        radius = 0.05 if i % 2 else 0.03
+        ring.append([7.1 + radius * 2 * math.cos(angle), 62.7 + radius * math.sin(angle)])
+    ring.append(ring[0])
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+# -------------------------
+# notify_new_ships
+# -------------------------
+@contextlib.contextmanager
+def core_database(url: str) -> Iterator[None]:
+    """Point ``core`` at ``url`` with Slack disabled, restoring it afterwards."""
+    saved = {
+        name: getattr(core, name)
+        for name in (
+            "DATABASE_URL",
+            "SLACK_WEBHOOK_URL",
+            "_engine",
+            "_seen_table",
+            "_area_seen_table",
+            "_positions_table",
+            "_db_ready",
+        )
+    }
+    known = set(core._known_mmsi)
+    by_area = dict(core._known_by_area)
+    try:
+        core.DATABASE_URL = url
+        core.SLACK_WEBHOOK_URL = None
+        core._known_mmsi.clear()
+        core._init_db()
+        yield
+    finally:
+        if core._engine is not None and core._engine is not saved["_engine"]:
+            core._engine.dispose()
+        for name, value in saved.items():
+            setattr(core, name, value)
+        core._known_mmsi.clear()
+        core._known_mmsi.update(known)
+        core._known_by_area.clear()
+        core._known_by_area.update(by_area)
+
+
+def _notify(database: str, churn: bool) -> Callable[[int], ContextManager[Callable[[], Any]]]:
+    @contextlib.contextmanager
+    def setup(size: int) -> Iterator[Callable[[], Any]]:
+        fleets = [fleet(size), fleet(size, max(1, size // 10))]
+        polls = iter(range(10**12))
+
+        def poll() -> None:
+            # Alternating fleets: 10 % departed and 10 % arrived per poll
+            core.notify_new_ships(fleets[next(polls) % 2] if churn else fleets[0])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            url = "sqlite:///:memory:" if database == "memory" else f"sqlite:///{tmp}/bench.db"
+            with core_database(url):
+                core.notify_new_ships(fleets[0])
+                yield poll
+
+    return setup
+
+
+# -------------------------
+# Enrichment and filters
+# -------------------------
+def _flags(size: int) -> Callable[[], Any]:
+    mmsis = [ship["mmsi"] for ship in fleet(size)]
+    flag = core._flag_from_mmsi
+    return lambda: [flag(mmsi) for mmsi in mmsis]
+
+
+def _ship_types(size: int) -> Callable[[], Any]:
+    ships = fleet(size)
+    return lambda: core._enrich_features([dict(ship) for ship in ships])
+
+
+def _ship_type_description(size: int) -> Callable[[], Any]:
+    codes = [ship["shipType"] for ship in fleet(size)]
+    describe = core._ship_type_description
+    return lambda: [describe(code) for code in codes]
+
+
+def _ignored(size: int) -> Callable[[], Any]:
+    ships = fleet(size)
+    index = core._current_ignored_index()
+    return lambda: [core._is_ignored_ship(ship, index) for ship in ships]
+
+
+# -------------------------
+# Geometry
+# -------------------------
+def _default_geometry() -> Dict[str, Any]:
+    return core._read_geojson_geometry(os.path.join(ROOT, "map.geojson"))
+
+
+def _area(geometry: Callable[[int], Dict[str, Any]]) -> Callable[[int], Callable[[], Any]]:
+    def factory(size: int) -> Callable[[], Any]:
+        geom = geometry(size)
+        return lambda: geometry_area_km2(geom)
+
+    return factory
+
+
+def _validate(geometry: Callable[[int], Dict[str, Any]]) -> Callable[[int], Callable[[], Any]]:
+    def factory(size: int) -> Callable[[], Any]:
+        geom = geometry(size)
+        return lambda: ensure_valid_polygon_geometry(geom)
+
+    return factory
+
+
+def _cold(factory: Callable[[int], Callable[[], Any]]) -> Callable[[int], Callable[[], Any]]:
+    """Empty the per-geometry memo caches before every call.
+
+    Repeated calls with one geometry otherwise only time ``lru_cache`` hits,
+    not the shapely and pyproj work a new polygon costs.
+    """
+
+    def cold_factory(size: int) -> Callable[[], Any]:
+        func = factory(size)
+
+        def cold() -> Any:
+            geometry_utils._shape_from_canonical.cache_clear()
+            geometry_utils._area_km2_from_canonical.cache_clear()
+            return func()
+
+        return cold
+
+    return cold_factory
+
+
+# -------------------------
+# latest/combined normalisation
+# -------------------------
+class _Response:
+    status_code = 200
+    text = ""
+    headers: Dict[str, str] = {}
+
+    def __init__(self, payload: List[Dict[str, Any]]) -> None:
+        self._payload = payload
+
+    def json(self) -> List[Dict[str, Any]]:
+        return self._payload
+
+
+class _OfflineSession:
+    """Answers ``latest/combined`` with raw upstream-shaped records."""
+
+    def __init__(self, size: int) -> None:
+        self.records = {}
+        for ship in fleet(size):
+            # Upstream spells these differently than the normalised features
+            ship["lengthOverall"] = ship.pop("length")
+            ship["vesselData"] = {"destination": ship.pop("destination")}
+            self.records[ship["mmsi"]] = ship
+
+    def post(self, url: str, json: Dict[str, Any] = None, **kwargs: Any) -> _Response:
+        return _Response([self.records[mmsi] for mmsi in json["mmsi"]])
+
+
+def _fetch_latest(size: int) -> Callable[[], Any]:
+    session = _OfflineSession(size)
+    client = BarentsWatchClient(
+        None, None, static_access_token="offline", transport=Transport(session)
+    )
+    mmsis = list(session.records)
+    return lambda: client.fetch_latest_combined(mmsis, max_concurrency=1)
+
+
+CASES = [
+    Case("notify_new_ships/sqlite/steady", _notify("sqlite", churn=False)),
+    Case("notify_new_ships/sqlite/churn", _notify("sqlite", churn=True)),
+    Case("notify_new_ships/memory/steady", _notify("memory", churn=False)),
+    Case("notify_new_ships/memory/churn", _notify("memory", churn=True)),
+    Case("enrich/flag_from_mmsi", _plain(_flags)),
+    Case("enrich/ship_type_description", _plain(_ship_type_description)),
+    Case("enrich/enrich_features", _plain(_ship_types)),
+    Case("filter/is_ignored_ship", _plain(_ignored)),
+    Case("geometry/area_km2/simple", _plain(_area(lambda size: _default_geometry())), scales=False),
+    Case("geometry/area_km2/complex", _plain(_area(star_polygon))),
+    Case("geometry/validate/simple", _plain(_validate(lambda size: _default_geometry())), scales=False),
+    Case("geometry/validate/complex", _plain(_validate(star_polygon))),
+    Case("geometry/area_km2/simple/cold", _plain(_cold(_area(lambda size: _default_geometry()))), scales=False),
+    Case("geometry/area_km2/complex/cold", _plain(_cold(_area(star_polygon)))),
+    Case("geometry/validate/simple/cold", _plain(_cold(_validate(lambda size: _default_geometry()))), scales=False),
+    Case("geometry/validate/complex/cold", _plain(_cold(_validate(star_polygon)))),
+    Case("barentswatch/fetch_latest_combined", _plain(_fetch_latest)),
+]
+
+
+# -------------------------
+# Runner
+# -------------------------
+class Measurement(NamedTuple):
+    best_ms: float
+    median_ms: float
+    loops: int
+
+
+def measure(func: Callable[[], Any], repeat: int = 5, min_time: float = 0.2) -> Measurement:
+    """Per-call time over ``repeat`` samples of a loop lasting ``min_time``."""
+    timer = timeit.Timer(func)
+    loops = 1
+    while timer.timeit(loops) < min_time:
+        loops *= 2
+    samples = [t / loops * 1000.0 for t in timer.repeat(repeat, loops)]
+    return Measurement(min(samples), statistics.median(samples), loops)
+
+
+def run(
+    sizes: List[int], only: Optional[str] = None, repeat: int = 5, min_time: float = 0.2
+) -> Dict[str, Any]:
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for case in CASES:
+        if only and only not in case.name:
+            continue
+        results[case.name] = {}
+        for size in sizes if case.scales else [None]:
+            with case.setup(size or 0) as func:
+                measured = measure(func, repeat, min_time)
+            entry = {
+                "best_ms": round(measured.best_ms, 6),
+                "median_ms": round(measured.median_ms, 6),
+                "loops": measured.loops,
+            }
+            if size:
+                entry["per_item_us"] = round(measured.median_ms * 1000.0 / size, 4)
+            results[case.name][str(size or "-")] = entry
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "repeat": repeat,
+            "min_time": min_time,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    report: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 1.3, min_delta_ms: float = 0.5
+) -> List[Dict[str, Any]]:
+    """Per-measurement ratios against ``baseline``; marks regressions.
+
+    A regression is both ``threshold`` times slower and ``min_delta_ms``
+    slower in absolute terms, so timer noise on sub-millisecond cases does
+    not count.
+    """
+    rows = []
+    for name, sizes in report["results"].items():
+        for size, entry in sizes.items():
+            base = baseline.get("results", {}).get(name, {}).get(size)
+            if base is None:
+                continue
+            ratio = entry["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+            regressed = ratio > threshold and entry["median_ms"] - base["median_ms"] > min_delta_ms
+            rows.append(
+                {
+                    "case": name,
+                    "size": size,
+                    "baseline_ms": base["median_ms"],
+                    "median_ms": entry["median_ms"],
+                    "ratio": round(ratio, 3),
+                    "regressed": regressed,
+                }
+            )
+    return rows
+
+
+def _print_report(report: Dict[str, Any], rows: Optional[List[Dict[str, Any]]]) -> None:
+    ratios = {(r["case"], r["size"]): r for r in rows or []}
+    print(f"{'case':<38} {'size':>6} {'median ms':>11} {'best ms':>11} {'vs base':>9}")
+    for name, sizes in report["results"].items():
+        for size, entry in sizes.items():
+            row = ratios.get((name, size))
+            versus = f"{row['ratio']:.2f}x" + ("!" if row["regressed"] else " ") if row else ""
+            print(f"{name:<38} {size:>6} {entry['median_ms']:>11.4f} {entry['best_ms']:>11.4f} {versus:>9}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--only", help="Run only cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timed sample")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Compare against this JSON report")
+    parser.add_argument("--threshold", type=float, default=1.3, help="Slowdown ratio that counts as a regression")
+    parser.add_argument(
+        "--min-delta-ms", type=float, default=0.5, help="Smallest slowdown in ms that counts as a regression"
+    )
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write the report to {BASELINE_PATH}")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    report = run(args.sizes, args.only, args.repeat, args.min_time)
+    rows = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            rows = compare(report, json.load(f), args.threshold, args.min_delta_ms)
+        report["comparison"] = {
+            "baseline": args.baseline,
+            "threshold": args.threshold,
+            "min_delta_ms": args.min_delta_ms,
+            "rows": rows,
+        }
+    _print_report(report, rows)
+    print(f"\nfinished in {time.perf_counter() - started:.1f}s")
+
+    for path in filter(None, [args.output, BASELINE_PATH if args.save_baseline else None]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+            f.write("\n")
+
+    regressions = [r for r in rows or [] if r["regressed"]]
+    for row in regressions:
+        print(f"REGRESSION {row['case']} size {row['size']}: {row['ratio']:.2f}x baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
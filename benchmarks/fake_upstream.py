@@ -0,0 +1,267 @@
+"""Local stand-in for the BarentsWatch token, mmsiinarea and latest/combined APIs.
+
+Serves a synthetic fleet positioned inside whatever polygon is queried, with
+configurable latency, jitter, error and 429 rates and payload padding, so the
+app and the poller can be load-tested without spending BarentsWatch quota::
+
+    python benchmarks/fake_upstream.py --port 8900 --fleet 2000 --latency 0.2 --jitter 0.1
+    BW_TOKEN_URL=http://127.0.0.1:8900/connect/token \\
+    BW_FIND_IN_AREA_URL=http://127.0.0.1:8900/v1/historic/mmsiinarea \\
+    BW_LATEST_COMBINED_URL=http://127.0.0.1:8900/v1/latest/combined \\
+    BW_CLIENT_ID=fake BW_CLIENT_SECRET=fake gunicorn app:app
+
+``GET /stats`` returns the number of calls per endpoint.
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from shapely.geometry import Point, shape
+
+ENDPOINTS = {
+    "/connect/token": "token",
+    "/v1/historic/mmsiinarea": "mmsiinarea",
+    "/v1/latest/combined": "latest",
+}
+
+
+class FakeConfig(NamedTuple):
+    fleet: int = 500
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    payload_bytes: int = 0
+    token_lifetime: int = 3600
+    seed: int = 1
+
+
+class FakeBarentsWatch:
+    """State shared by all request handlers: fleet, positions and call counts."""
+
+    def __init__(self, config: FakeConfig) -> None:
+        self.config = config
+        self._random = random.Random(config.seed)
+        self._positions: Dict[int, Tuple[float, float]] = {}
+        self._area_key: Optional[str] = None
+        self.calls: Dict[str, int] = {name: 0 for name in ENDPOINTS.values()}
+        self.errors: Dict[str, int] = {"500": 0, "429": 0}
+        self._lock = threading.Lock()
+
+    def mmsis(self) -> List[int]:
+        return [257000000 + i for i in range(self.config.fleet)]
+
+    def place_fleet(self, polygon: Dict[str, Any]) -> None:
+        """Scatter the fleet inside ``polygon`` (once per distinct polygon)."""
+        key = json.dumps(polygon, sort_keys=True)
+        with self._lock:
+            if key == self._area_key:
+                return
+            geom = shape(polygon)
+            minx, miny, maxx, maxy = geom.bounds
+            positions = {}
+            for mmsi in self.mmsis():
+                while True:
+                    lon = self._random.uniform(minx, maxx)
+                    lat = self._random.uniform(miny, maxy)
+                    if geom.contains(Point(lon, lat)):
+                        break
+                positions[mmsi] = (lat, lon)
+            self._positions, self._area_key = positions, key
+
+    def record(self, endpoint: str) -> None:
+        with self._lock:
+            self.calls[endpoint] += 1
+
+    def fault(self) -> Optional[int]:
+        """Roll for an injected 429 or 500; ``None`` means answer normally."""
+        config = self.config
+        with self._lock:
+            roll = self._random.random()
+        if roll < config.throttle_rate:
+            status = 429
+        elif roll < config.throttle_rate + config.error_rate:
+            status = 500
+        else:
+            return None
+        with self._lock:
+            self.errors[str(status)] += 1
+        return status
+
+    def delay(self) -> None:
+        config = self.config
+        if config.latency or config.jitter:
+            time.sleep(max(0.0, config.latency + self._random.uniform(-config.jitter, config.jitter)))
+
+    def latest(self, mmsis: List[int]) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc).isoformat()
+        padding = "x" * self.config.payload_bytes
+        records = []
+        for mmsi in mmsis:
+            lat, lon = self._positions.get(mmsi, (None, None))
+            record = {
+                "mmsi": mmsi,
+                "name": f"FAKE {mmsi % 100000}",
+                "latitude": lat,
+                "longitude": lon,
+                "msgtime": now,
+                "shipType": (30, 52, 60, 70, 80)[mmsi % 5],
+                "lengthOverall": 20 + mmsi % 180,
+                "vesselData": {"destination": "MOLDE"},
+            }
+            if padding:
+                record["padding"] = padding
+            records.append(record)
+        return records
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"calls": dict(self.calls), "errors": dict(self.errors)}
+
+
+def _handler(upstream: FakeBarentsWatch):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+            pass
+
+        def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path == "/stats":
+                self._send(200, upstream.stats())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+            endpoint = ENDPOINTS.get(self.path.split("?")[0])
+            if endpoint is None:
+                self._send(404, {"error": "not found"})
+                return
+            upstream.record(endpoint)
+            upstream.delay()
+            status = upstream.fault()
+            if status == 429:
+                self._send(429, {"error": "throttled"}, {"Retry-After": str(upstream.config.retry_after)})
+                return
+            if status:
+                self._send(status, {"error": "injected failure"})
+                return
+
+            if endpoint == "token":
+                self._send(200, {"access_token": "fake-token", "expires_in": upstream.config.token_lifetime})
+                return
+            payload = json.loads(body or b"{}")
+            if endpoint == "mmsiinarea":
+                upstream.place_fleet(payload["polygon"])
+                self._send(200, upstream.mmsis())
+            else:
+                self._send(200, upstream.latest(payload.get("mmsi", [])))
+
+    return Handler
+
+
+class FakeServer:
+    """Runs :class:`FakeBarentsWatch` on a background thread."""
+
+    def __init__(self, config: FakeConfig = FakeConfig(), host: str = "127.0.0.1", port: int = 0) -> None:
+        self.upstream = FakeBarentsWatch(config)
+        self._server = ThreadingHTTPServer((host, port), _handler(self.upstream))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment pointing the app's BarentsWatch client at this server."""
+        return {
+            "BW_CLIENT_ID": "fake",
+            "BW_CLIENT_SECRET": "fake",
+            "BW_TOKEN_URL": f"{self.url}/connect/token",
+            "BW_FIND_IN_AREA_URL": f"{self.url}/v1/historic/mmsiinarea",
+            "BW_LATEST_COMBINED_URL": f"{self.url}/v1/latest/combined",
+        }
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-bw", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--fleet", type=int, default=500, help="Vessels in the synthetic fleet")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="Padding added to every vessel record")
+    parser.add_argument("--token-lifetime", type=int, default=3600, help="Seconds until issued tokens expire")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(
+        fleet=args.fleet,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        payload_bytes=args.payload_bytes,
+        token_lifetime=args.token_lifetime,
+        seed=args.seed,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    server = FakeServer(config_from_args(args), args.host, args.port)
+    print(f"Fake BarentsWatch on {server.url}")
+    for name, value in server.env().items():
+        print(f"  {name}={value}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Import-time budget for the app, the poller and their shared core.
+
+Runs ``python -X importtime -c "import <module>"`` in fresh interpreters,
+takes the median cumulative import time of each module and checks it
+against ``benchmarks/import_budget.json``, which also lists packages a
+module must not pull in at import (e.g. Flask for the poller). The exit
+code is 1 when a budget is exceeded or a forbidden package is imported::
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --modules poller --repeat 9 --top 15
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(ROOT, "benchmarks", "import_budget.json")
+
+
+class ImportLine(NamedTuple):
+    name: str
+    self_us: int
+    cumulative_us: int
+    # Nesting depth; 0 for modules imported directly by the ``-c`` code
+    depth: int
+
+
+def parse_importtime(stderr: str) -> List[ImportLine]:
+    lines = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        lines.append(ImportLine(name.strip(), int(self_us), int(cumulative_us), depth))
+    return lines
+
+
+def import_once(module: str) -> List[ImportLine]:
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    # Importing must not need a database; leave it out so runs are comparable
+    env.pop("DATABASE_URL", None)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def measure(module: str, repeat: int = 5, top: int = 10) -> Dict[str, Any]:
+    """Median cumulative import time of ``module`` over ``repeat`` runs."""
+    runs = [import_once(module) for _ in range(repeat)]
+    totals = []
+    for lines in runs:
+        total = next(l.cumulative_us for l in lines if l.name == module and l.depth == 0)
+        totals.append(total / 1000.0)
+    last = runs[-1]
+    slowest = sorted(last, key=lambda l: l.self_us, reverse=True)[:top]
+    return {
+        "median_ms": round(statistics.median(totals), 2),
+        "min_ms": round(min(totals), 2),
+        "modules": sorted({l.name.split(".")[0] for l in last}),
+        "slowest_self_ms": {l.name: round(l.self_us / 1000.0, 2) for l in slowest},
+    }
+
+
+def check(results: Dict[str, Dict[str, Any]], budgets: Dict[str, Any]) -> List[str]:
+    """Human-readable budget violations; empty when everything is in budget."""
+    problems = []
+    for module, result in results.items():
+        budget = budgets.get(module, {})
+        limit = budget.get("budget_ms")
+        if limit is not None and result["median_ms"] > limit:
+            problems.append(f"{module}: {result['median_ms']:.0f} ms > budget {limit:.0f} ms")
+        for package in budget.get("forbidden", []):
+            if package in result["modules"]:
+                problems.append(f"{module}: imports {package}")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", default=BUDGET_PATH, help="JSON file with budgets")
+    parser.add_argument("--modules", nargs="+", help="Modules to measure (default: all in the budget)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per module")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    with open(args.budget, "r", encoding="utf-8") as f:
+        budgets = json.load(f)
+    results = {}
+    for module in args.modules or list(budgets):
+        results[module] = result = measure(module, args.repeat, args.top)
+        limit = budgets.get(module, {}).get("budget_ms")
+        print(f"{module:<8} {result['median_ms']:8.1f} ms  (min {result['min_ms']:.1f}, budget {limit})")
+        for name, ms in result["slowest_self_ms"].items():
+            print(f"    {ms:7.2f} ms  {name}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+            f.write("\n")
+
+    problems = check(results, budgets)
+    for problem in problems:
+        print(f"OVER BUDGET {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""End-to-end load test of the gunicorn app against the fake BarentsWatch.
+
+Starts :mod:`fake_upstream` and ``gunicorn app:app`` wired to it (temporary
+SQLite database, Slack disabled), drives ``--path`` with ``--clients``
+concurrent clients and reports throughput, latency percentiles and how many
+upstream calls each client request cost::
+
+    python benchmarks/loadgen.py --clients 20 --duration 30 --workers 2 --latency 0.3
+    python benchmarks/loadgen.py --target http://localhost:5000 --path /ships --upstream http://127.0.0.1:8900
+
+With ``--target`` no servers are started; ``--upstream`` then names a
+running fake upstream to read call counts from.
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_upstream import FakeServer, add_arguments, config_from_args  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LoadResult(NamedTuple):
+    latencies_ms: List[float]
+    errors: int
+    elapsed: float
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values``."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def drive(
+    url: str,
+    clients: int,
+    duration: Optional[float] = None,
+    requests_per_client: Optional[int] = None,
+    timeout: float = 60.0,
+) -> LoadResult:
+    """GET ``url`` from ``clients`` threads for ``duration`` s or a fixed count."""
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration if duration else None
+
+    def client() -> None:
+        session = requests.Session()
+        sent = 0
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if requests_per_client is not None and sent >= requests_per_client:
+                break
+            sent += 1
+            start = time.perf_counter()
+            try:
+                ok = session.get(url, timeout=timeout).status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000.0
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return LoadResult(latencies, errors[0], time.perf_counter() - started)
+
+
+def summarize(result: LoadResult, upstream_calls: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    count = len(result.latencies_ms)
+    report: Dict[str, Any] = {
+        "requests": count,
+        "errors": result.errors,
+        "elapsed_s": round(result.elapsed, 3),
+        "throughput_rps": round(count / result.elapsed, 2) if result.elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(result.latencies_ms, 50), 2),
+            "p95": round(percentile(result.latencies_ms, 95), 2),
+            "p99": round(percentile(result.latencies_ms, 99), 2),
+            "max": round(max(result.latencies_ms, default=0.0), 2),
+        },
+    }
+    if upstream_calls is not None:
+        total = sum(upstream_calls.values())
+        report["upstream_calls"] = upstream_calls
+        report["upstream_calls_per_request"] = round(total / count, 4) if count else 0.0
+    return report
+
+
+def _upstream_calls(upstream_url: Optional[str]) -> Optional[Dict[str, int]]:
+    if not upstream_url:
+        return None
+    return requests.get(f"{upstream_url}/stats", timeout=5).json()["calls"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(env: Dict[str, str], workers: int, threads: int, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "gunicorn", "app:app",
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", str(workers),
+        "--worker-class", "gthread",
+        "--threads", str(threads),
+        "--log-level", "warning",
+    ]
+    proc = subprocess.Popen(command, cwd=ROOT, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not become ready")
+
+
+def _diff(after: Optional[Dict[str, int]], before: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
+    if after is None or before is None:
+        return None
+    return {name: after[name] - before.get(name, 0) for name in after}
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.target:
+        before = _upstream_calls(args.upstream)
+        result = drive(args.target.rstrip("/") + args.path, args.clients, args.duration, args.requests)
+        return summarize(result, _diff(_upstream_calls(args.upstream), before))
+
+    with FakeServer(config_from_args(args)) as fake, tempfile.TemporaryDirectory() as tmp:
+        env = {k: v for k, v in os.environ.items() if k not in ("BW_ACCESS_TOKEN", "SLACK_WEBHOOK_URL")}
+        env.update(fake.env())
+        env.update({"DATABASE_URL": f"sqlite:///{tmp}/load.db", "BW_TOKEN_CACHE_PATH": f"{tmp}/token.json"})
+        port = _free_port()
+        proc = start_app(env, args.workers, args.threads, port)
+        try:
+            url = f"http://127.0.0.1:{port}{args.path}"
+            if args.warmup:
+                drive(url, 1, requests_per_client=args.warmup)
+            before = fake.upstream.stats()["calls"]
+            result = drive(url, args.clients, args.duration, args.requests)
+            report = summarize(result, _diff(fake.upstream.stats()["calls"], before))
+        finally:
+            proc.terminate()
+            proc.wait(10)
+    report["config"] = {
+        "path": args.path,
+        "clients": args.clients,
+        "workers": args.workers,
+        "threads": args.threads,
+        "upstream": config_from_args(args)._asdict(),
+    }
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="/ships", help="App path to request")
+    parser.add_argument("--clients", type=int, default=10, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--requests", type=int, help="Requests per client instead of --duration")
+    parser.add_argument("--warmup", type=int, default=1, help="Requests sent before measuring")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="Threads per gunicorn worker")
+    parser.add_argument("--target", help="Load an already running app instead")
+    parser.add_argument("--upstream", help="Fake upstream URL to read call counts from (with --target)")
+    parser.add_argument("--output", help="Write the JSON report here")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.requests:
+        args.duration = None
+
+    report = run(args)
+    print(json.dumps(report, indent=1))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,840 @@
+"""Ship tracking core shared by the web app and the poller.
+
+Configuration, the BarentsWatch client, the seen-MMSI and position tables,
+Slack notifications and the default-area snapshot live here, without Flask,
+so ``poller.py`` can use them without importing the web stack. Of all
+processes sharing a database only the elected leader (:mod:`leader`) polls,
+writes the seen-sets and notifies.
+
+Importing this module does no I/O: the database is connected and the
+seen-set loaded on first use (:func:`_ensure_db`), the MID, ship type and
+ignored-ship tables are parsed when first needed, and SQLAlchemy, shapely
+and pyproj are only imported by the code paths that use them.
+"""
+from __future__ import annotations
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Dict, NamedTuple
+
+import requests
+from dotenv import load_dotenv
+
+from barentswatch import (
+    DEFAULT_FIND_IN_AREA_URL,
+    DEFAULT_LATEST_COMBINED_URL,
+    BarentsWatchClient,
+)
+from db import upsert
+from geometry_utils import (
+    features_in_area,
+    geometry_area_km2,
+    geometry_hash,
+    read_geojson_feature,
+)
+from leader import AdvisoryLeaderLock, Election, FileLeaderLock, LeaderLock
+from metrics import GEOMETRY_SECONDS, NOTIFY_DB_SECONDS, SLACK_POST_SECONDS, VESSELS_NOTIFIED
+from mid_table import load_mid_table
+from request_timing import phase
+from ship_cache import ShipsCache
+from slack_notifier import SlackDispatcher, SqlOutbox
+from snapshot_store import (
+    FileSnapshotStore,
+    Served,
+    SnapshotCache,
+    SnapshotStore,
+    SqlSnapshotStore,
+)
+from token_manager import FileTokenStore, SqlTokenStore, TokenStore
+from transport import CircuitBreaker, Transport
+from vessel_store import VesselStore
+
+if TYPE_CHECKING:
+    from sqlalchemy import Table
+    from sqlalchemy.engine import Connection, Engine
+
+# Load environment (local dev)
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger("barentswatch-geoapp")
+
+# Configuration
+DEFAULT_GEOJSON_PATH = os.getenv("GEOJSON_PATH", "map.geojson")
+MAX_AREA_KM2 = float(os.getenv("MAX_AREA_KM2", "500"))
+SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
+# Send Slack notifications from a background worker instead of the request
+SLACK_ASYNC = os.getenv("SLACK_ASYNC", "1").lower() not in ("0", "false", "no")
+SLACK_RATE_PER_SECOND = float(os.getenv("SLACK_RATE_PER_SECOND", "1"))
+SLACK_QUEUE_SIZE = int(os.getenv("SLACK_QUEUE_SIZE", "1000"))
+DATABASE_URL = os.getenv("DATABASE_URL")
+# Identical /ships requests within the same TTL slot share one upstream call
+SHIPS_CACHE_TTL = float(os.getenv("SHIPS_CACHE_TTL", "10"))
+SHIPS_CACHE_SIZE = int(os.getenv("SHIPS_CACHE_SIZE", "64"))
+# GET /ships serves the poller's snapshot; older ones are refreshed in the background
+SHIPS_STALE_AFTER = float(os.getenv("SHIPS_STALE_AFTER", "180"))
+# Share snapshots through this directory instead of the database
+SHIPS_SNAPSHOT_DIR = os.getenv("SHIPS_SNAPSHOT_DIR")
+# Only the elected leader polls, writes the seen-sets and notifies (leader.py);
+# LEADER_CANDIDATE=0 keeps a process (e.g. the web dyno) a follower
+LEADER_CANDIDATE = os.getenv("LEADER_CANDIDATE", "1").lower() not in ("0", "false", "no")
+LEADER_CHECK_SECONDS = float(os.getenv("LEADER_CHECK_SECONDS", "10"))
+# Elect through lock files in this directory instead of DATABASE_URL
+LEADER_LOCK_DIR = os.getenv("LEADER_LOCK_DIR")
+# Heroku provides URLs starting with ``postgres://`` which is no longer
+# recognised by SQLAlchemy. Normalise it to ``postgresql+psycopg2://`` so the
+# correct dialect/driver is loaded.
+if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace(
+        "postgres://", "postgresql+psycopg2://", 1
+    )
+
+# Track ships we've already notified about
+_known_mmsi: set[int] = set()
+_engine: Engine | None = None
+# Set once _init_db() has run; the database is set up on first use
+_db_ready = False
+_db_lock = threading.Lock()
+_seen_table: Table | None = None
+_area_seen_table: Table | None = None
+_positions_table: Table | None = None
+_known_by_area: dict[str, set[int]] = {}
+_ignored_ships: list[dict[str, Any]] = []
+_ships_cache = ShipsCache(SHIPS_CACHE_TTL, SHIPS_CACHE_SIZE)
+# Latest state of every vessel in the default area
+vessel_store = VesselStore()
+
+
+IGNORED_SHIPS_PATH = os.path.join(os.path.dirname(__file__), "ignored_ships.json")
+
+
+def _read_ignored_ships(path: str) -> list[dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    ships = data if isinstance(data, list) else data.get("ignored_ships", [])
+    cleaned: list[dict[str, Any]] = []
+    for entry in ships:
+        if not isinstance(entry, dict):
+            continue
+        name = entry.get("name")
+        mmsi = entry.get("mmsi")
+        if name or mmsi:
+            cleaned.append({"name": name, "mmsi": mmsi})
+    return cleaned
+
+
+class _IgnoredIndex(NamedTuple):
+    source: list[dict[str, Any]]
+    names: frozenset[str]
+    mmsis: frozenset[int]
+
+
+def _normalise_name(name: Any) -> str:
+    return str(name or "").strip().lower()
+
+
+def _build_ignored_index(entries: list[dict[str, Any]]) -> _IgnoredIndex:
+    names = set()
+    mmsis = set()
+    for entry in entries:
+        name = _normalise_name(entry.get("name"))
+        if name:
+            names.add(name)
+        try:
+            mmsis.add(int(entry.get("mmsi")))
+        except (TypeError, ValueError):
+            pass
+    return _IgnoredIndex(entries, frozenset(names), frozenset(mmsis))
+
+
+def _ignored_file_mtime() -> int | None:
+    try:
+        return os.stat(IGNORED_SHIPS_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+_ignored_lock = threading.Lock()
+_ignored_mtime_ns: int | None = None
+_ignored_checked_at = 0.0
+_ignored_index: _IgnoredIndex | None = None
+
+
+def _reload_ignored_ships_if_changed() -> None:
+    """Re-read ignored_ships.json when its mtime changed (checked once a second).
+
+    A file that fails to parse - e.g. caught mid-edit - keeps the previous
+    list and is retried on the next check.
+    """
+    global _ignored_ships, _ignored_mtime_ns, _ignored_checked_at
+    now = time.monotonic()
+    if now - _ignored_checked_at < 1.0:
+        return
+    with _ignored_lock:
+        if now - _ignored_checked_at < 1.0:
+            return
+        _ignored_checked_at = now
+        mtime_ns = _ignored_file_mtime()
+        if mtime_ns == _ignored_mtime_ns:
+            return
+        try:
+            entries = _read_ignored_ships(IGNORED_SHIPS_PATH) if mtime_ns else []
+        except (OSError, json.JSONDecodeError) as exc:
+            logger.warning("Invalid ignored ships file %s: %s", IGNORED_SHIPS_PATH, exc)
+            return
+        _ignored_ships = entries
+        _ignored_mtime_ns = mtime_ns
+        logger.info("Loaded %d ignored ships", len(entries))
+
+
+def _current_ignored_index() -> _IgnoredIndex:
+    """Hashed lookup index over ``_ignored_ships``, rebuilt when it changes."""
+    global _ignored_index
+    _reload_ignored_ships_if_changed()
+    index = _ignored_index
+    if index is None or index.source is not _ignored_ships:
+        index = _build_ignored_index(_ignored_ships)
+        _ignored_index = index  # single reference swap, safe for readers
+    return index
+
+
+# MID -> (country name, ISO code, flag emoji), precompiled in mmsi_mid_table.json;
+# like the ship type table below it is parsed on first use
+_mid_table: dict[str, tuple[str, str, str]] | None = None
+_ship_type_map: tuple[str, ...] | None = None
+
+
+def _mid_lookup() -> dict[str, tuple[str, str, str]]:
+    global _mid_table
+    table = _mid_table
+    if table is None:
+        table = _mid_table = load_mid_table()
+    return table
+
+
+def _ship_types() -> tuple[str, ...]:
+    global _ship_type_map
+    table = _ship_type_map
+    if table is None:
+        table = _ship_type_map = _dense_ship_types(_load_ship_type_map())
+    return table
+
+
+def _load_ship_type_map() -> dict[int, str]:
+    """Load mapping of ship type numbers to human readable strings."""
+    path = os.path.join(os.path.dirname(__file__), "ship_type_map.json")
+    mapping: dict[int, str] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        logger.warning("Ship type mapping file not found: %s", path)
+        return mapping
+    except json.JSONDecodeError as exc:
+        logger.warning("Invalid ship type mapping file %s: %s", path, exc)
+        return mapping
+
+    def _expand_range(key: str) -> range:
+        if "-" in key:
+            start, end = key.split("-", 1)
+            return range(int(start), int(end) + 1)
+        return range(int(key), int(key) + 1)
+
+    for key, val in data.items():
+        if isinstance(val, str):
+            for num in _expand_range(key):
+                mapping[num] = val
+        elif isinstance(val, dict):
+            descriptions = val.get("beskrivelser", {})
+            for d_key, d_val in descriptions.items():
+                for num in _expand_range(d_key):
+                    mapping[num] = d_val
+
+    return mapping
+
+
+def _dense_ship_types(mapping: dict[int, str]) -> tuple[str, ...]:
+    """AIS ship types are 0-99; index a tuple instead of hashing into a dict."""
+    return tuple(mapping.get(code, "Unknown") for code in range(100))
+
+
+
+def _ship_type_description(code: Any) -> str:
+    try:
+        index = int(code)
+    except (TypeError, ValueError):
+        return "Unknown"
+    return _ship_types()[index] if 0 <= index < 100 else "Unknown"
+
+
+def _enrich_features(features: list[Dict[str, Any]]) -> None:
+    """Replace ship type codes with descriptions for a whole batch in place."""
+    table = _ship_types()
+    with phase("enrich"):
+        for ship in features:
+            code = ship.get("shipType")
+            if type(code) is int and 0 <= code < 100:
+                ship["shipType"] = table[code]
+            else:
+                ship["shipType"] = _ship_type_description(code)
+
+
+def _is_ignored_ship(ship: Dict[str, Any], index: _IgnoredIndex | None = None) -> bool:
+    index = index or _current_ignored_index()
+    name = _normalise_name(ship.get("name"))
+    if name and name in index.names:
+        return True
+    try:
+        return int(ship.get("mmsi")) in index.mmsis
+    except (TypeError, ValueError):
+        return False
+
+def _flag_from_mmsi(mmsi: int) -> str:
+    entry = _mid_lookup().get(str(mmsi)[:3])
+    if not entry:
+        return "Unknown"
+    name, _, emoji = entry
+    if emoji:
+        return f"{emoji} {name}"
+    return name
+
+def _token_store() -> TokenStore | None:
+    """Select where the OAuth token is shared between worker processes."""
+    path = os.getenv("BW_TOKEN_CACHE_PATH")
+    if path:
+        return FileTokenStore(path)
+    if DATABASE_URL:
+        return SqlTokenStore(lambda: _ensure_db())
+    return None
+
+
+BW_FETCH_CONCURRENCY = int(os.getenv("BW_FETCH_CONCURRENCY", "4"))
+
+# Initialize BarentsWatch client (token management inside)
+bw_client = BarentsWatchClient(
+    client_id=os.getenv("BW_CLIENT_ID"),
+    client_secret=os.getenv("BW_CLIENT_SECRET"),
+    static_access_token=os.getenv("BW_ACCESS_TOKEN"),
+    token_url=os.getenv("BW_TOKEN_URL", "https://id.barentswatch.no/connect/token"),
+    find_in_area_url=os.getenv("BW_FIND_IN_AREA_URL", DEFAULT_FIND_IN_AREA_URL),
+    latest_combined_url=os.getenv("BW_LATEST_COMBINED_URL", DEFAULT_LATEST_COMBINED_URL),
+    max_concurrency=BW_FETCH_CONCURRENCY,
+    token_store=_token_store(),
+    token_refresh_margin=float(os.getenv("BW_TOKEN_REFRESH_MARGIN", "300")),
+    transport=Transport(
+        pool_size=int(os.getenv("BW_POOL_SIZE", str(BW_FETCH_CONCURRENCY + 2))),
+        max_retries=int(os.getenv("BW_MAX_RETRIES", "3")),
+        connect_timeout=float(os.getenv("BW_CONNECT_TIMEOUT", "5")),
+        read_timeout=float(os.getenv("BW_READ_TIMEOUT", "60")),
+        deadline=float(os.getenv("BW_REQUEST_DEADLINE", "90")),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("BW_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("BW_BREAKER_RESET_SECONDS", "30")),
+        ),
+    ),
+)
+
+def _init_db() -> None:
+    """Initialize persistent storage of seen MMSIs."""
+    global _engine, _seen_table, _area_seen_table, _positions_table, _db_ready
+    if not DATABASE_URL:
+        _db_ready = True
+        return
+    from sqlalchemy import (
+        Column,
+        DateTime,
+        Float,
+        Integer,
+        MetaData,
+        String,
+        Table,
+        create_engine,
+        select,
+    )
+    from sqlalchemy.exc import SQLAlchemyError
+    from sqlalchemy.pool import StaticPool
+
+    kwargs = {}
+    if DATABASE_URL.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if DATABASE_URL.endswith(":memory:"):
+            kwargs["poolclass"] = StaticPool
+    _engine = create_engine(DATABASE_URL, **kwargs)
+    metadata = MetaData()
+    _seen_table = Table(
+        "seen_mmsi",
+        metadata,
+        Column("mmsi", Integer, primary_key=True),
+        Column("last_seen", DateTime(timezone=True), nullable=False),
+    )
+    # Seen-sets of the named areas polled by ``poller.py --areas``
+    _area_seen_table = Table(
+        "seen_mmsi_area",
+        metadata,
+        Column("area", String(128), primary_key=True),
+        Column("mmsi", Integer, primary_key=True),
+        Column("last_seen", DateTime(timezone=True), nullable=False),
+    )
+    # Position history; the (mmsi, msgtime) key doubles as the track index
+    # and suppresses duplicate reports of the same message
+    _positions_table = Table(
+        "ais_positions",
+        metadata,
+        Column("mmsi", Integer, primary_key=True),
+        Column("msgtime", DateTime(timezone=True), primary_key=True),
+        Column("latitude", Float, nullable=False),
+        Column("longitude", Float, nullable=False),
+    )
+    _known_by_area.clear()
+    metadata.create_all(_engine)
+    try:
+        with _engine.begin() as conn:
+            rows = conn.execute(select(_seen_table.c.mmsi)).fetchall()
+            _known_mmsi.update(row[0] for row in rows)
+    except SQLAlchemyError as exc:
+        logger.warning("DB init failed: %s", exc)
+    # Only now: _ensure_db() callers must not see a half-initialised engine
+    _db_ready = True
+
+
+def _ensure_db() -> Engine | None:
+    """Return the engine, connecting and loading the seen-set on first use."""
+    if not _db_ready:
+        with _db_lock:
+            if not _db_ready:
+                _init_db()
+    return _engine
+
+
+def _reload_seen_sets() -> None:
+    """Re-read the seen-sets the previous leader kept writing meanwhile."""
+    if not _db_ready:
+        return  # loaded on first use anyway
+    _known_by_area.clear()
+    if not _engine or _seen_table is None:
+        return
+    from sqlalchemy import select
+
+    with _engine.connect() as conn:
+        rows = conn.execute(select(_seen_table.c.mmsi)).fetchall()
+    _known_mmsi.clear()
+    _known_mmsi.update(row[0] for row in rows)
+
+
+def _take_over() -> None:
+    """Run when this process is elected leader, before it acts as one."""
+    _reload_seen_sets()
+    if SLACK_ASYNC and _slack.outbox is not None:
+        # Send what an earlier leader left in the outbox now, not with the next new ship
+        _slack.start()
+
+
+def _leader_lock(name: str) -> LeaderLock | None:
+    """Select the lock that elects one leader for ``name`` across processes."""
+    if LEADER_LOCK_DIR:
+        return FileLeaderLock(os.path.join(LEADER_LOCK_DIR, f"{name}.leader"))
+    if not DATABASE_URL:
+        return None
+    if DATABASE_URL.startswith("sqlite"):
+        # All processes using one SQLite file share a host: lock next to it
+        path = DATABASE_URL.partition(":///")[2].split("?", 1)[0]
+        if not path or path == ":memory:":
+            return None
+        return FileLeaderLock(f"{path}.{name}.leader")
+    if DATABASE_URL.startswith("postgresql"):
+        return AdvisoryLeaderLock(_ensure_db, name)
+    return None
+
+
+def election(name: str) -> Election:
+    """Leader election for ``name``; ``"default"`` is the default area's."""
+    elected = Election(
+        _leader_lock(name),
+        name,
+        candidate=LEADER_CANDIDATE,
+        check_interval=LEADER_CHECK_SECONDS,
+        on_elected=_take_over,
+    )
+    atexit.register(elected.release)
+    return elected
+
+
+_election = election("default")
+
+
+class _DefaultArea(NamedTuple):
+    path: str
+    mtime_ns: int
+    geometry: Dict[str, Any]
+    area_km2: float
+    key: str
+
+
+_default_area: _DefaultArea | None = None
+
+
+def _read_geojson_geometry(path: str) -> Dict[str, Any]:
+    """Read the first Polygon/MultiPolygon geometry from a GeoJSON file."""
+    return read_geojson_feature(path)[0]
+
+
+def _load_default_area() -> _DefaultArea:
+    """Return the validated default geometry and its area.
+
+    The file is parsed once and only re-read when its mtime changes.
+    """
+    global _default_area
+    path = DEFAULT_GEOJSON_PATH
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"GeoJSON file not found: {path}") from None
+    cached = _default_area
+    if cached is not None and cached.path == path and cached.mtime_ns == mtime_ns:
+        return cached
+    geom = _read_geojson_geometry(path)
+    with GEOMETRY_SECONDS.time(operation="area"):
+        area_km2 = geometry_area_km2(geom)
+    cached = _DefaultArea(path, mtime_ns, geom, area_km2, geometry_hash(geom))
+    _default_area = cached
+    return cached
+
+
+def _load_default_geometry() -> Dict[str, Any]:
+    """Load geometry from DEFAULT_GEOJSON_PATH (Polygon or MultiPolygon)."""
+    return _load_default_area().geometry
+
+def _check_area(area_km2: float) -> float:
+    if area_km2 > MAX_AREA_KM2:
+        raise ValueError(f"Area too large: {area_km2:.1f} km^2 (max {MAX_AREA_KM2} km^2)")
+    return area_km2
+
+def _validate_area(geom: Dict[str, Any]) -> float:
+    with phase("area"), GEOMETRY_SECONDS.time(operation="area"):
+        area_km2 = geometry_area_km2(geom)
+    return _check_area(area_km2)
+
+
+def _seen_target(area: str | None) -> tuple[Table | None, dict[str, Any]]:
+    """Return the seen-table and key columns for the default or a named area."""
+    if area is None:
+        return _seen_table, {}
+    return _area_seen_table, {"area": area}
+
+
+def _known_set(area: str | None) -> set[int]:
+    """In-memory seen-set for ``area``, loaded from the DB on first use."""
+    _ensure_db()
+    if area is None:
+        return _known_mmsi
+    known = _known_by_area.get(area)
+    if known is None:
+        known = _known_by_area[area] = set()
+        if _engine and _area_seen_table is not None:
+            from sqlalchemy import select
+            from sqlalchemy.exc import SQLAlchemyError
+
+            try:
+                with _engine.connect() as conn:
+                    rows = conn.execute(
+                        select(_area_seen_table.c.mmsi).where(
+                            _area_seen_table.c.area == area
+                        )
+                    ).fetchall()
+                known.update(row[0] for row in rows)
+            except SQLAlchemyError as exc:
+                logger.warning("Failed to load seen MMSIs for %s: %s", area, exc)
+    return known
+
+
+def _upsert_seen_mmsi(
+    conn: Connection, mmsis: set[int], now: datetime, area: str | None = None
+) -> None:
+    """Write ``last_seen=now`` for all ``mmsis`` as one executemany upsert."""
+    if not mmsis:
+        return
+    table, scope = _seen_target(area)
+    rows = [{**scope, "mmsi": mmsi, "last_seen": now} for mmsi in mmsis]
+    upsert(conn, table, rows, keys=[*scope, "mmsi"], update=["last_seen"])
+
+def _post_slack(url: str, text: str) -> Any:
+    with SLACK_POST_SECONDS.time():
+        return requests.post(url, json={"text": text}, timeout=10)
+
+
+_slack = SlackDispatcher(
+    _post_slack,
+    outbox=SqlOutbox(_ensure_db) if DATABASE_URL else None,
+    queue_size=SLACK_QUEUE_SIZE,
+    rate=SLACK_RATE_PER_SECOND,
+)
+atexit.register(_slack.stop)
+
+
+def _slack_text(ship: Dict[str, Any], area: str | None = None) -> str:
+    name = ship.get("name") or "Unknown"
+
+    ship_type_code = ship.get("shipType") or ship.get("ship_type")
+    ship_type_desc = _ship_type_description(ship_type_code)
+
+    mmsi_raw = ship.get("mmsi")
+    try:
+        mmsi_val = int(mmsi_raw)
+    except (TypeError, ValueError):
+        mmsi_val = 0
+    flag = _flag_from_mmsi(mmsi_val)
+
+    text = (
+        "Nytt skip på vei!\n"
+        f"{name}\n"
+        f"({mmsi_raw})\n"
+        f"{flag}\n"
+        f"{ship_type_desc}\n"
+    )
+    if area:
+        text += f"Område: {area}\n"
+    return text
+
+
+def notify_new_ships(
+    features: list[Dict[str, Any]],
+    area: str | None = None,
+    webhook_url: str | None = None,
+) -> None:
+    """Send Slack notifications for ships not seen before.
+
+    ``area`` selects a separate seen-set for one of several polled areas and
+    ``webhook_url`` routes its notifications; both default to the single
+    default area and ``SLACK_WEBHOOK_URL``.
+    """
+
+    new_ships: list[Dict[str, Any]] = []
+    now = datetime.now(timezone.utc)
+    known = _known_set(area)
+    ignored = _current_ignored_index()
+    current_mmsi: set[int] = set()
+    for ship in features:
+        mmsi_raw = ship.get("mmsi")
+        try:
+            mmsi = int(mmsi_raw)
+        except (TypeError, ValueError):
+            continue
+        current_mmsi.add(mmsi)
+        if mmsi not in known:
+            known.add(mmsi)
+            if not _is_ignored_ship(ship, ignored):
+                new_ships.append(ship)
+
+    # Remove ships that are no longer present
+    departed = known - current_mmsi
+    known.difference_update(departed)
+
+    table, scope = _seen_target(area)
+    if _engine and table is not None and (current_mmsi or departed):
+        from sqlalchemy.exc import SQLAlchemyError
+
+        try:
+            with NOTIFY_DB_SECONDS.time(), _engine.begin() as conn:
+                _upsert_seen_mmsi(conn, current_mmsi, now, area)
+                if departed:
+                    conn.execute(
+                        table.delete().where(
+                            table.c.mmsi.in_(departed),
+                            *(table.c[key] == value for key, value in scope.items()),
+                        )
+                    )
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to store seen MMSIs: %s", exc)
+
+    url = webhook_url or SLACK_WEBHOOK_URL
+    if url and new_ships:
+        VESSELS_NOTIFIED.inc(len(new_ships))
+        # One message per poll, however many ships arrived
+        text = "\n".join(_slack_text(ship, area) for ship in new_ships)
+        if SLACK_ASYNC:
+            _slack.submit(url, text)
+        else:
+            _slack.send_now(url, text)
+
+
+def _parse_msgtime(value: Any) -> datetime | None:
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def store_positions(features: list[Dict[str, Any]]) -> int:
+    """Append the positions in ``features`` to ``ais_positions`` in one insert.
+
+    Reports already stored for the same (mmsi, msgtime) are skipped. Returns
+    the number of rows offered to the database.
+    """
+    if not _ensure_db() or _positions_table is None:
+        return 0
+    rows: dict[tuple[int, datetime], dict[str, Any]] = {}
+    for ship in features:
+        try:
+            mmsi = int(ship.get("mmsi"))
+            lat = float(ship.get("latitude"))
+            lon = float(ship.get("longitude"))
+        except (TypeError, ValueError):
+            continue
+        msgtime = _parse_msgtime(ship.get("msgtime"))
+        if msgtime is None:
+            continue
+        rows[(mmsi, msgtime)] = {"mmsi": mmsi, "msgtime": msgtime, "latitude": lat, "longitude": lon}
+    if not rows:
+        return 0
+
+    from sqlalchemy.exc import SQLAlchemyError
+
+    try:
+        with _engine.begin() as conn:
+            upsert(conn, _positions_table, list(rows.values()), keys=["mmsi", "msgtime"])
+    except SQLAlchemyError as exc:
+        logger.warning("Failed to store positions: %s", exc)
+        return 0
+    return len(rows)
+
+
+def cleanup_positions(max_age_hours: float) -> None:
+    """Delete positions older than ``max_age_hours``."""
+    if not _ensure_db() or _positions_table is None:
+        return
+    from sqlalchemy.exc import SQLAlchemyError
+
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+    try:
+        with _engine.begin() as conn:
+            conn.execute(
+                _positions_table.delete().where(_positions_table.c.msgtime < cutoff)
+            )
+    except SQLAlchemyError as exc:
+        logger.warning("Position cleanup failed: %s", exc)
+
+
+def clear_seen_mmsi() -> None:
+    """Clear all stored MMSI entries both in memory and in the database."""
+    _known_mmsi.clear()
+    _known_by_area.clear()
+    # Ensure database is initialised so we can clear the table
+    if not _engine or _seen_table is None:
+        _init_db()
+    if not _engine or _seen_table is None:
+        return
+    from sqlalchemy.exc import SQLAlchemyError
+
+    try:
+        with _engine.begin() as conn:
+            conn.execute(_seen_table.delete())
+            if _area_seen_table is not None:
+                conn.execute(_area_seen_table.delete())
+    except SQLAlchemyError as exc:
+        logger.warning("Failed to clear seen_mmsi table: %s", exc)
+
+
+def _collect_ships(
+    geom: Dict[str, Any], snapshot: list[Dict[str, Any]] | None = None
+) -> list[Dict[str, Any]]:
+    """Query BarentsWatch for ships in ``geom`` and notify about new ones.
+
+    When ``snapshot`` (fresh latest positions covering ``geom``) is given the
+    upstream calls are skipped and the snapshot is filtered locally instead.
+    Either way, vessels whose latest position is outside ``geom`` - they left
+    during the one-hour window - are dropped. The features are returned as
+    received, without enrichment. Processes that are not the elected leader
+    leave notifying and storing positions to it.
+    """
+    if snapshot is None:
+        now = datetime.now(timezone.utc)
+        # Siste 1 time
+        msgtimefrom = now - timedelta(hours=1)
+
+        mmsi_list = bw_client.find_mmsi_in_area(
+            polygon_geometry=geom,
+            msgtimefrom=msgtimefrom,
+            msgtimeto=now,
+        )
+        features = bw_client.fetch_latest_combined(mmsi_list)
+    else:
+        features = [dict(ship) for ship in snapshot]
+    features = features_in_area(features, geom)
+    if _election.is_leader():
+        with phase("notify"):
+            notify_new_ships(features)
+            store_positions(features)
+    return features
+
+
+def _fetch_ships(
+    geom: Dict[str, Any],
+    snapshot: list[Dict[str, Any]] | None = None,
+    store: VesselStore | None = None,
+) -> list[Dict[str, Any]]:
+    """:func:`_collect_ships`, applied to ``store`` and enriched for output."""
+    features = _collect_ships(geom, snapshot)
+    if store is not None:
+        store.apply(features)
+    _enrich_features(features)
+    return features
+
+
+def _ships_in_area(geom: Dict[str, Any], key: str | None = None) -> list[Dict[str, Any]]:
+    """Return ships in ``geom``, sharing upstream calls between clients."""
+    return _ships_cache.get_or_compute(key or geometry_hash(geom), lambda: _fetch_ships(geom))
+
+
+def _install_snapshot(features: list[Dict[str, Any]]) -> int:
+    """Apply a snapshot to ``vessel_store``; the version is what is served.
+
+    Responses render from :meth:`VesselStore.view`, so the feature dicts
+    are not kept once applied.
+    """
+    vessel_store.apply(features)
+    return vessel_store.version
+
+
+def _snapshot_store() -> SnapshotStore | None:
+    if SHIPS_SNAPSHOT_DIR:
+        return FileSnapshotStore(SHIPS_SNAPSHOT_DIR)
+    if DATABASE_URL:
+        return SqlSnapshotStore(_ensure_db)
+    return None
+
+
+_snapshots = SnapshotCache(
+    _install_snapshot,
+    _snapshot_store(),
+    stale_after=SHIPS_STALE_AFTER,
+    leader=lambda: _election.is_leader(),
+)
+
+
+def _default_ships(geom: Dict[str, Any], key: str) -> Served:
+    """Serve the default area from the newest snapshot (see SnapshotCache)."""
+    return _snapshots.get(key, lambda: _collect_ships(geom))
+
+
+def publish_default_snapshot(features: list[Dict[str, Any]]) -> None:
+    """Share the poller's latest result for the default area with web workers."""
+    _snapshots.publish(_load_default_area().key, features)
+
+
+def _refresh_default_area() -> None:
+    default = _load_default_area()
+    _check_area(default.area_km2)
+    _default_ships(default.geometry, default.key)
@@ -0,0 +1,107 @@
+"""Database helpers shared by the SQL-backed stores.
+
+SQLAlchemy is imported inside the functions, so importing this module costs
+nothing for processes that never touch a database.
+"""
+from __future__ import annotations
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+
+class LazyTable:
+    """Tables that are created on first use in the application's engine.
+
+    The engine is created lazily and can be replaced (e.g. by tests), so
+    ``engine_getter`` is called on every :meth:`resolve` and ``build`` runs
+    again, with ``create_all``, whenever it returns a different engine.
+    ``build`` adds the table (or a tuple of tables) to the given ``MetaData``
+    and returns it.
+    """
+
+    def __init__(self, engine_getter: Callable[[], Any], build: Callable[[Any], Any]) -> None:
+        self._engine_getter = engine_getter
+        self._build = build
+        self._tables = None
+        self._engine = None
+
+    def resolve(self) -> Tuple[Any, Any]:
+        """``(engine, tables)``, or ``(None, None)`` without a database."""
+        from sqlalchemy import MetaData
+
+        engine = self._engine_getter()
+        if engine is None:
+            return None, None
+        if self._tables is None or self._engine is not engine:
+            metadata = MetaData()
+            tables = self._build(metadata)
+            metadata.create_all(engine)
+            self._tables, self._engine = tables, engine
+        return engine, self._tables
+
+
+def _comparable(value: Any) -> Any:
+    # Some drivers hand back naive datetimes even for timezone-aware columns
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    return value
+
+
+def upsert(
+    conn: Any,
+    table: Any,
+    rows: List[Dict[str, Any]],
+    keys: Sequence[str],
+    update: Sequence[str] = (),
+) -> None:
+    """Insert ``rows``; rows whose ``keys`` already exist get ``update`` set.
+
+    Without ``update`` columns existing rows are left alone. Postgres and
+    SQLite get one ``INSERT ... ON CONFLICT`` executemany. Other dialects
+    look up which keys exist and split ``rows`` into an update and an
+    insert, so call it inside a transaction. ``rows`` must not repeat a key.
+    """
+    if not rows:
+        return
+    from sqlalchemy import bindparam, select
+
+    dialect = conn.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        index = [table.c[key] for key in keys]
+        if update:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=index, set_={column: stmt.excluded[column] for column in update}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index)
+        conn.execute(stmt, rows)
+        return
+
+    def key_of(values: Any) -> Tuple[Any, ...]:
+        return tuple(_comparable(values[key]) for key in keys)
+
+    query = select(*[table.c[key] for key in keys]).where(
+        *[table.c[key].in_({row[key] for row in rows}) for key in keys]
+    )
+    existing = {key_of(row._mapping) for row in conn.execute(query)}
+    if update:
+        # Bind names must differ from the column names they set
+        updates = [
+            {**{f"k_{key}": row[key] for key in keys}, **{f"u_{column}": row[column] for column in update}}
+            for row in rows
+            if key_of(row) in existing
+        ]
+        if updates:
+            conn.execute(
+                table.update()
+                .where(*[table.c[key] == bindparam(f"k_{key}") for key in keys])
+                .values({column: bindparam(f"u_{column}") for column in update}),
+                updates,
+            )
+    inserts = [row for row in rows if key_of(row) not in existing]
+    if inserts:
+        conn.execute(table.insert(), inserts)
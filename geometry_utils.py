@@ -1,37 +1,154 @@
 # geometry_utils.py
+"""GeoJSON helpers. numpy, shapely and pyproj are imported on first use,
+so importing this module (and hashing geometries) stays cheap."""
 from __future__ import annotations
-from typing import Dict, Any
+import hashlib
+import json
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Any, List, Tuple
 
-from shapely.geometry import shape
-from shapely.ops import transform
-from pyproj import CRS, Transformer
+if TYPE_CHECKING:
+    import numpy as np
+    from pyproj import Transformer
 
 def ensure_valid_polygon_geometry(geom: Dict[str, Any]) -> Dict[str, Any]:
     if not isinstance(geom, dict) or "type" not in geom:
         raise ValueError("Invalid geometry: expected GeoJSON geometry object")
     if geom["type"] not in ("Polygon", "MultiPolygon"):
         raise ValueError(f"Unsupported geometry type: {geom['type']}. Use Polygon or MultiPolygon.")
-    # Quick shapely validation
-    _ = shape(geom)
+    # Quick shapely validation, memoized per canonical geometry
+    _shape_from_canonical(canonical_geometry(geom))
     return geom
 
-def _utm_crs_for_lonlat(lon: float, lat: float) -> CRS:
+def read_geojson_feature(path: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Read the first Polygon/MultiPolygon and its properties from a GeoJSON file."""
+    with open(path, "r", encoding="utf-8") as f:
+        gj = json.load(f)
+    properties: Dict[str, Any] = {}
+    # Allow either a FeatureCollection/Feature or direct geometry
+    if gj.get("type") == "FeatureCollection":
+        if not gj.get("features"):
+            raise ValueError("FeatureCollection has no features")
+        feature = gj["features"][0]
+        geom = feature.get("geometry")
+        properties = feature.get("properties") or {}
+    elif gj.get("type") == "Feature":
+        geom = gj.get("geometry")
+        properties = gj.get("properties") or {}
+    else:
+        geom = gj  # assume bare geometry
+    return ensure_valid_polygon_geometry(geom), properties
+
+def _round_coords(coords: Any, ndigits: int) -> Any:
+    if isinstance(coords, (list, tuple)):
+        return [_round_coords(c, ndigits) for c in coords]
+    if isinstance(coords, (int, float)):
+        return round(float(coords), ndigits)
+    return coords
+
+def canonical_geometry(geom: Dict[str, Any], ndigits: int = 9) -> str:
+    """Return a stable JSON string for the type and coordinates of ``geom``.
+
+    Foreign members (``bbox``, ``crs``...) are ignored and coordinates are
+    rounded to ``ndigits`` decimals (~0.1 mm), so equal areas sent by different
+    clients map to the same string.
+    """
+    canonical = {
+        "type": geom.get("type"),
+        "coordinates": _round_coords(geom.get("coordinates"), ndigits),
+    }
+    return json.dumps(canonical, separators=(",", ":"), sort_keys=True)
+
+def geometry_hash(geom: Dict[str, Any]) -> str:
+    """Short hex digest of :func:`canonical_geometry`, usable as a cache key."""
+    return hashlib.sha1(canonical_geometry(geom).encode("utf-8")).hexdigest()
+
+def _utm_epsg_for_lonlat(lon: float, lat: float) -> int:
     zone = int((lon + 180) // 6) + 1
     # North if lat >= 0 else South
     if lat >= 0:
-        return CRS.from_epsg(32600 + zone)  # WGS84 / UTM zone N
+        return 32600 + zone  # WGS84 / UTM zone N
     else:
-        return CRS.from_epsg(32700 + zone)  # WGS84 / UTM zone S
+        return 32700 + zone  # WGS84 / UTM zone S
 
-def geometry_area_km2(geom: Dict[str, Any]) -> float:
-    """Compute area in square kilometers using an appropriate UTM projection."""
-    shp = shape(geom)
+@lru_cache(maxsize=None)
+def _transformer_to_utm(epsg: int) -> Transformer:
+    """One WGS84 -> UTM transformer per zone; building them is expensive."""
+    from pyproj import CRS, Transformer
+
+    return Transformer.from_crs(CRS.from_epsg(4326), CRS.from_epsg(epsg), always_xy=True)
+
+@lru_cache(maxsize=256)
+def _shape_from_canonical(canonical: str):
+    from shapely.geometry import shape
+
+    return shape(json.loads(canonical))
+
+@lru_cache(maxsize=256)
+def _area_km2_from_canonical(canonical: str) -> float:
+    import numpy as np
+    import shapely
+
+    shp = _shape_from_canonical(canonical)
     centroid = shp.centroid
-    lon, lat = centroid.x, centroid.y
-    src = CRS.from_epsg(4326)
-    dst = _utm_crs_for_lonlat(lon, lat)
-    transformer = Transformer.from_crs(src, dst, always_xy=True)
-    proj = lambda x, y: transformer.transform(x, y)
-    shp_m = transform(proj, shp)  # meters
+    transformer = _transformer_to_utm(_utm_epsg_for_lonlat(centroid.x, centroid.y))
+
+    def proj(coords: np.ndarray) -> np.ndarray:
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack((x, y))
+
+    shp_m = shapely.transform(shp, proj)  # meters
     area_m2 = shp_m.area
     return area_m2 / 1_000_000.0
+
+@lru_cache(maxsize=64)
+def _prepared_from_canonical(canonical: str):
+    import shapely
+    from shapely.geometry import shape
+
+    shp = shape(json.loads(canonical))
+    shapely.prepare(shp)
+    return shp
+
+def _coordinate(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+def positions_xy(features: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Longitude and latitude arrays of ``features``; NaN where unknown."""
+    import numpy as np
+
+    n = len(features)
+    lon = np.fromiter((_coordinate(f.get("longitude")) for f in features), float, n)
+    lat = np.fromiter((_coordinate(f.get("latitude")) for f in features), float, n)
+    return lon, lat
+
+def features_in_area(
+    features: List[Dict[str, Any]], geom: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Keep features whose ``longitude``/``latitude`` lie inside ``geom``.
+
+    All positions are tested in a single vectorized ``contains_xy`` call on a
+    prepared (and memoized) geometry. Features without a usable position are
+    kept, since there is nothing to say they have left.
+    """
+    if not features:
+        return []
+    import numpy as np
+    import shapely
+
+    lon, lat = positions_xy(features)
+    unknown = np.isnan(lon) | np.isnan(lat)
+    inside = shapely.contains_xy(_prepared_from_canonical(canonical_geometry(geom)), lon, lat)
+    keep = inside | unknown
+    return [f for f, k in zip(features, keep) if k]
+
+def geometry_area_km2(geom: Dict[str, Any]) -> float:
+    """Compute area in square kilometers using an appropriate UTM projection.
+
+    Results are memoized by :func:`canonical_geometry`, so repeated requests
+    for the same area skip shapely and pyproj entirely.
+    """
+    return _area_km2_from_canonical(canonical_geometry(geom))
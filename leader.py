@@ -0,0 +1,204 @@
+"""Leader election between the web workers and pollers of one deployment.
+
+Only the leader of an area polls BarentsWatch for it, writes its seen-set and
+sends Slack notifications; every other process serves the snapshots the
+leader publishes. Leadership is a lock that the operating system or the
+database drops when its holder exits or crashes, so a standby process takes
+over on its next check:
+
+* :class:`FileLeaderLock` - an exclusive ``flock`` on a local file, for
+  SQLite deployments where all processes share one host.
+* :class:`AdvisoryLeaderLock` - a Postgres session advisory lock held on a
+  dedicated connection.
+"""
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Any, Callable, Optional, Protocol
+
+logger = logging.getLogger("barentswatch-geoapp")
+
+
+class LeaderLock(Protocol):
+    def try_acquire(self) -> bool:
+        """Take the lock without waiting; True while this process holds it."""
+        ...
+
+    def release(self) -> None: ...
+
+
+class FileLeaderLock:
+    """Leader lock backed by a non-blocking exclusive ``flock`` on ``path``."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        try:
+            import fcntl
+        except ImportError:  # pragma: no cover - non-POSIX platforms
+            return True
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as exc:
+            logger.warning("Cannot open leader lock %s: %s", self.path, exc)
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            import fcntl
+
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class AdvisoryLeaderLock:
+    """Leader lock backed by ``pg_try_advisory_lock`` on a dedicated connection.
+
+    ``engine_getter`` is called on every attempt, as in :class:`db.LazyTable`.
+    The holding connection is kept out of the pool and pinged on every
+    check; if it drops, so does the lock.
+    """
+
+    _KEY_PREFIX = 0x4257 << 32
+
+    def __init__(self, engine_getter: Callable[[], Any], name: str = "default") -> None:
+        self._engine_getter = engine_getter
+        self.key = self._KEY_PREFIX | zlib.crc32(name.encode())
+        self._conn = None
+
+    def try_acquire(self) -> bool:
+        from sqlalchemy import text
+        from sqlalchemy.exc import SQLAlchemyError
+
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT 1"))
+                return True
+            except SQLAlchemyError as exc:
+                logger.warning("Leader connection lost: %s", exc)
+                self._conn.invalidate()
+                self._conn = None
+        try:
+            engine = self._engine_getter()
+            if engine is None:
+                return False
+            conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to connect for leader lock: %s", exc)
+            return False
+        try:
+            held = conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": self.key}).scalar()
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to take leader lock: %s", exc)
+            held = False
+        if not held:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def release(self) -> None:
+        from sqlalchemy import text
+        from sqlalchemy.exc import SQLAlchemyError
+
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": self.key})
+            conn.close()
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to release leader lock: %s", exc)
+            conn.invalidate()
+
+
+class Election:
+    """Whether this process leads ``name``, re-checked every ``check_interval``.
+
+    Without a ``lock`` there is nothing to coordinate with and the process
+    always leads; a process that is not a ``candidate`` never does. Each
+    check retries the lock, so a standby takes over once the leader is gone.
+    ``on_elected`` runs before the process acts as leader (also for the
+    first check without a ``lock``), to reload state the previous leader
+    kept changing; if it fails, the lock is given back and retried later.
+    """
+
+    def __init__(
+        self,
+        lock: Optional[LeaderLock],
+        name: str = "default",
+        candidate: bool = True,
+        check_interval: float = 10.0,
+        on_elected: Optional[Callable[[], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.lock = lock
+        self.name = name
+        self.candidate = candidate
+        self.check_interval = check_interval
+        self._on_elected = on_elected
+        self._clock = clock
+        self._leader = False
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    @property
+    def leader(self) -> bool:
+        """Result of the last check, without checking again."""
+        return self._leader if self.lock is not None else self.candidate
+
+    def is_leader(self) -> bool:
+        if not self.candidate:
+            return False
+        if self.lock is None and self._leader:
+            return True
+        now = self._clock()
+        if now - self._checked_at < self.check_interval:
+            return self._leader
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return self._leader
+            self._checked_at = now
+            held = self.lock is None or self.lock.try_acquire()
+            if held and not self._leader:
+                held = self._elected()
+            elif not held and self._leader:
+                logger.warning("Lost leadership of %s", self.name)
+            self._leader = held
+        return held
+
+    def _elected(self) -> bool:
+        # Called with self._lock held
+        try:
+            if self._on_elected is not None:
+                self._on_elected()
+        except Exception:
+            logger.exception("Failed to take over as leader of %s", self.name)
+            if self.lock is not None:
+                self.lock.release()
+            return False
+        logger.info("Elected leader of %s (pid %d)", self.name, os.getpid())
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            if self.lock is not None:
+                self.lock.release()
+            self._leader = False
+            self._checked_at = float("-inf")
@@ -0,0 +1,197 @@
+"""Server-Sent Events feed of vessel changes for ``GET /ships/stream``.
+
+One refresh thread updates the shared :class:`VesselStore` every
+``interval`` seconds while at least one client is connected; every client
+only reads the store, so upstream load does not grow with the number of
+listeners. Event ids are store version tokens (see
+:meth:`VesselStore.token`), which lets a client reconnecting to the same
+worker resume from ``Last-Event-ID`` with just the changes it missed; on any
+other worker it gets a full snapshot.
+
+Every connected client occupies a server thread for as long as it listens,
+so a feed takes at most ``max_subscribers`` clients and refuses the rest
+with :class:`FeedFull`.
+"""
+from __future__ import annotations
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from serializers import dumps
+from vessel_store import VesselState, VesselStore
+
+logger = logging.getLogger("barentswatch-geoapp")
+
+
+def _render_default(records: Iterable[VesselState]) -> List[Dict[str, Any]]:
+    return [record.to_feature() for record in records]
+
+
+def format_event(event: str, data: Any, event_id: Optional[str] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\n".encode() + b"data: " + dumps(data) + b"\n\n"
+
+
+class FeedFull(Exception):
+    """Raised by :meth:`SnapshotFeed.events` when no subscriber slot is free."""
+
+
+class Subscription:
+    """One subscriber's messages; closing it frees the subscriber slot."""
+
+    def __init__(self, feed: "SnapshotFeed", messages: Iterator[bytes]) -> None:
+        self._feed = feed
+        self._messages = messages
+        self._closed = False
+
+    def __iter__(self) -> "Subscription":
+        return self
+
+    def __next__(self) -> bytes:
+        return next(self._messages)
+
+    def close(self) -> None:
+        # Also for a subscription that never started, unlike a generator's finally
+        if self._closed:
+            return
+        self._closed = True
+        self._messages.close()
+        self._feed._leave()
+
+    def __del__(self) -> None:
+        self.close()
+
+
+class SnapshotFeed:
+    """Broadcasts ``store`` changes to any number of SSE subscribers."""
+
+    def __init__(
+        self,
+        store: VesselStore,
+        refresh: Callable[[], Any],
+        render: Callable[[Iterable[VesselState]], List[Dict[str, Any]]] = _render_default,
+        interval: float = 30.0,
+        heartbeat: float = 15.0,
+        max_subscribers: Optional[int] = None,
+    ) -> None:
+        self.store = store
+        self._refresh = refresh
+        self._render = render
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self._cond = threading.Condition()
+        self._subscribers = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    # -------------------------
+    # Refresh loop
+    # -------------------------
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                if self._subscribers == 0:
+                    self._thread = None
+                    return
+            try:
+                self._refresh()
+            except Exception as exc:
+                logger.warning("Live feed refresh failed: %s", exc)
+            with self._cond:
+                self._cond.notify_all()
+            self._stop.wait(self.interval)
+        with self._cond:
+            self._thread = None
+
+    def _ensure_running(self) -> None:
+        # Called with self._cond held
+        if self._thread is None and not self._stop.is_set():
+            self._thread = threading.Thread(target=self._run, name="live-feed", daemon=True)
+            self._thread.start()
+
+    # -------------------------
+    # Subscribers
+    # -------------------------
+    def _snapshot(self) -> tuple[int, bytes]:
+        # Read the version first: a newer view only repeats changes later
+        version = self.store.version
+        token = self.store.token(version)
+        features = self._render(self.store.view())
+        return version, format_event("snapshot", {"version": token, "features": features}, token)
+
+    def _resume_from(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Version to resume from, if ``last_event_id`` is one of this store's."""
+        if last_event_id is None:
+            return None
+        try:
+            version = self.store.parse_token(last_event_id)
+        except ValueError:
+            return None
+        if version is None or self.store.changes_since(version) is None:
+            return None
+        return version
+
+    def events(self, last_event_id: Optional[str] = None) -> Subscription:
+        """SSE messages until the client disconnects or :meth:`stop`.
+
+        Raises :class:`FeedFull` if ``max_subscribers`` clients are connected.
+        """
+        with self._cond:
+            if self.max_subscribers is not None and self._subscribers >= self.max_subscribers:
+                raise FeedFull(f"{self._subscribers} clients connected")
+            self._subscribers += 1
+            self._ensure_running()
+        return Subscription(self, self._messages(last_event_id))
+
+    def _leave(self) -> None:
+        with self._cond:
+            self._subscribers -= 1
+
+    def _messages(self, last_event_id: Optional[str]) -> Iterator[bytes]:
+        yield f"retry: {int(self.interval * 1000)}\n\n".encode()
+        sent = self._resume_from(last_event_id)
+        if sent is None and last_event_id is None and self.store.version == 0:
+            # Nothing fetched yet; the first refresh arrives as a delta
+            sent = 0
+        elif sent is None:
+            # Clients resuming from another worker must replace what they have
+            sent, message = self._snapshot()
+            yield message
+
+        while not self._stop.is_set():
+            if sent == self.store.version:
+                with self._cond:
+                    changed = self._cond.wait_for(
+                        lambda: self.store.version != sent or self._stop.is_set(),
+                        timeout=self.heartbeat,
+                    )
+                if not changed:
+                    yield format_event("heartbeat", {"version": self.store.token(sent)})
+                    continue
+                if self._stop.is_set():
+                    break
+            changes = self.store.changes_since(sent)
+            if changes is None:
+                sent, message = self._snapshot()
+                yield message
+                continue
+            sent = changes.version
+            if changes.changed or changes.removed:
+                token = self.store.token(changes.version)
+                data = {
+                    "version": token,
+                    "since": self.store.token(changes.since),
+                    "features": self._render(changes.changed),
+                    "removed": changes.removed,
+                }
+                yield format_event("delta", data, token)
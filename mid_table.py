@@ -0,0 +1,120 @@
+"""Precompiled MMSI MID -> (country name, ISO code, flag emoji) table.
+
+Resolving a country name to its ISO code with ``pycountry.search_fuzzy`` is
+slow, so it is done once per MID when the table is built rather than for
+every notification. The result is kept in ``mmsi_mid_table.json`` together
+with a hash of ``mmsi_mid_to_flag.json``; the table is only rebuilt (and
+pycountry only imported) when that source file changes. Regenerate with::
+
+    python mid_table.py
+"""
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Tuple
+
+logger = logging.getLogger("barentswatch-geoapp")
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PATH = os.path.join(ROOT, "mmsi_mid_to_flag.json")
+ARTIFACT_PATH = os.path.join(ROOT, "mmsi_mid_table.json")
+
+# (country name, ISO 3166 alpha-2 code or "", flag emoji or "")
+MidEntry = Tuple[str, str, str]
+
+
+def _emoji_for_code(code: str) -> str:
+    return "".join(chr(0x1F1E6 + ord(c) - ord("A")) for c in code.upper())
+
+
+def _file_sha1(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _load_source(path: str) -> Dict[str, str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+            return data.get("mid_to_flag", {})
+    except FileNotFoundError:
+        logger.warning("Flag mapping file not found: %s", path)
+    except json.JSONDecodeError as exc:
+        logger.warning("Invalid flag mapping file %s: %s", path, exc)
+    return {}
+
+
+def build_mid_table(mid_to_flag: Dict[str, str]) -> Dict[str, MidEntry]:
+    """Resolve every MID's country once, using pycountry when it is installed."""
+    try:
+        import pycountry
+    except ImportError:  # pragma: no cover - optional dependency
+        pycountry = None
+
+    codes: Dict[str, str] = {}
+    table: Dict[str, MidEntry] = {}
+    for mid, name in mid_to_flag.items():
+        # Handle names like "Portugal - Azores"
+        clean_name = name.split(" - ")[0]
+        if clean_name not in codes:
+            code = ""
+            if pycountry:
+                try:
+                    code = pycountry.countries.search_fuzzy(clean_name)[0].alpha_2.upper()
+                except Exception:
+                    code = ""
+            codes[clean_name] = code
+        code = codes[clean_name]
+        table[mid] = (name, code, _emoji_for_code(code) if code else "")
+    return table
+
+
+def write_artifact(
+    source_path: str = SOURCE_PATH, artifact_path: str = ARTIFACT_PATH
+) -> Dict[str, MidEntry]:
+    table = build_mid_table(_load_source(source_path))
+    # One MID per line keeps the generated file readable in diffs
+    rows = ",\n".join(
+        f"  {json.dumps(mid)}: {json.dumps(list(entry), ensure_ascii=False)}"
+        for mid, entry in sorted(table.items())
+    )
+    tmp = f"{artifact_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(f'{{\n "source_sha1": "{_file_sha1(source_path)}",\n "mid_table": {{\n{rows}\n }}\n}}\n')
+    os.replace(tmp, artifact_path)
+    return table
+
+
+def load_mid_table(
+    source_path: str = SOURCE_PATH, artifact_path: str = ARTIFACT_PATH
+) -> Dict[str, MidEntry]:
+    """Load the artifact, rebuilding it if it is missing or out of date."""
+    try:
+        source_sha1 = _file_sha1(source_path)
+    except FileNotFoundError:
+        logger.warning("Flag mapping file not found: %s", source_path)
+        return {}
+    try:
+        with open(artifact_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("source_sha1") == source_sha1:
+            return {mid: tuple(entry) for mid, entry in data["mid_table"].items()}
+        logger.info("MID table %s is out of date, rebuilding", artifact_path)
+    except FileNotFoundError:
+        logger.info("MID table %s not found, building it", artifact_path)
+    except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as exc:
+        logger.warning("Invalid MID table %s: %s", artifact_path, exc)
+
+    try:
+        return write_artifact(source_path, artifact_path)
+    except OSError as exc:
+        # Read-only deploys still work, they just rebuild on every start
+        logger.warning("Could not write MID table %s: %s", artifact_path, exc)
+        return build_mid_table(_load_source(source_path))
+
+
+if __name__ == "__main__":
+    table = write_artifact()
+    print(f"Wrote {len(table)} MIDs to {ARTIFACT_PATH}")
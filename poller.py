@@ -2,30 +2,155 @@ from __future__ import annotations
 import logging
 from datetime import datetime, timedelta, timezone
 
-from sqlalchemy.exc import SQLAlchemyError
-
-import app
-from app import _load_default_geometry, _validate_area, bw_client, notify_new_ships
+import core
+from core import _load_default_geometry, _validate_area, bw_client, notify_new_ships
+from areas import Area, AreaIndex, load_areas
+from geometry_utils import features_in_area, geometry_hash
+from metrics import POLL_SECONDS, REGISTRY
+from sliding_window import SlidingWindow, SqlWindowStore
 
 import argparse
+import os
+import random
+import signal
+import threading
+import time
+from typing import Callable
 
 logging.basicConfig(level="INFO")
 logger = logging.getLogger("poller")
 
+POLL_WINDOW_MINUTES = float(os.getenv("POLL_WINDOW_MINUTES", "60"))
+POLL_OVERLAP_SECONDS = float(os.getenv("POLL_OVERLAP_SECONDS", "60"))
+POSITION_RETENTION_HOURS = float(os.getenv("POSITION_RETENTION_HOURS", "168"))
+
+# One sliding window per polled geometry, persisted when a DB is configured
+_windows: dict[str, SlidingWindow] = {}
+_window_store = SqlWindowStore(core._ensure_db)
+
 
 def cleanup_seen_mmsi(max_age_hours: int = 24) -> None:
-    if not app._engine or app._seen_table is None:
+    if not core._ensure_db() or core._seen_table is None:
         return
+    from sqlalchemy.exc import SQLAlchemyError
+
     cutoff = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
     try:
-        with app._engine.begin() as conn:
+        with core._engine.begin() as conn:
             conn.execute(
-                app._seen_table.delete().where(app._seen_table.c.last_seen < cutoff)
+                core._seen_table.delete().where(core._seen_table.c.last_seen < cutoff)
             )
+            if core._area_seen_table is not None:
+                conn.execute(
+                    core._area_seen_table.delete().where(
+                        core._area_seen_table.c.last_seen < cutoff
+                    )
+                )
     except SQLAlchemyError as exc:
         logger.warning("Cleanup failed: %s", exc)
 
 
+def _window_for(geom: dict) -> SlidingWindow:
+    scope = geometry_hash(geom)[:32]
+    window = _windows.get(scope)
+    if window is None:
+        window = _windows[scope] = SlidingWindow(
+            scope,
+            window=timedelta(minutes=POLL_WINDOW_MINUTES),
+            overlap=timedelta(seconds=POLL_OVERLAP_SECONDS),
+            store=_window_store,
+        )
+    return window
+
+
+def query_mmsi_in_window(geom: dict) -> list[int]:
+    """MMSIs seen in ``geom`` during the poll window, asking only for the delta.
+
+    The timestamp of the last successful query and the per-vessel
+    last-in-area times are kept in a :class:`SlidingWindow`, so each poll
+    requests ``mmsiinarea`` only for the interval since the previous one.
+    """
+    window = _window_for(geom)
+    window.load()
+    now = datetime.now(timezone.utc)
+    delta = bw_client.find_mmsi_in_area(
+        polygon_geometry=geom,
+        msgtimefrom=window.next_query_start(now),
+        msgtimeto=now,
+    )
+    window.record(delta, now)
+    window.save()
+    return window.mmsis()
+
+
+def poll_areas(areas: list[Area], index: AreaIndex | None = None) -> int:
+    """Poll several areas with one upstream query for their merged footprint.
+
+    Vessels are assigned to areas locally and each area keeps its own
+    seen-set and Slack webhook. Returns the number of distinct vessels.
+    """
+    for area in areas:
+        _validate_area(area.geometry)
+    index = index or AreaIndex(areas)
+    mmsi_list = query_mmsi_in_window(index.footprint)
+    features = bw_client.fetch_latest_combined(mmsi_list)
+    core.store_positions(features)
+    assigned = index.assign(features)
+    for area in areas:
+        # Copy so one area's notification cannot affect another's
+        ships = [dict(ship) for ship in assigned[area.name]]
+        notify_new_ships(ships, area=area.name, webhook_url=area.webhook_url)
+    return len(features)
+
+
+def poll_default_area() -> int:
+    geom = _load_default_geometry()
+    _validate_area(geom)
+    mmsi_list = query_mmsi_in_window(geom)
+    features = features_in_area(bw_client.fetch_latest_combined(mmsi_list), geom)
+    notify_new_ships(features)
+    core.store_positions(features)
+    core.publish_default_snapshot(features)
+    return len(features)
+
+
+def run_daemon(
+    poll_once: Callable[[], None],
+    interval: float,
+    jitter: float = 0.0,
+    stop: threading.Event | None = None,
+    clock: Callable[[], float] = time.monotonic,
+) -> None:
+    """Call ``poll_once`` every ``interval`` seconds until ``stop`` is set.
+
+    Ticks are scheduled on a fixed timeline from the start time, so run time
+    does not accumulate as drift. A random ``0..jitter`` delay is added per
+    tick to spread load. When a cycle overruns, the ticks it overlapped are
+    skipped instead of being run back to back.
+    """
+    stop = stop or threading.Event()
+    start = clock()
+    tick = 0
+    while not stop.is_set():
+        poll_once()
+        now = clock()
+        next_tick = max(tick + 1, int((now - start) // interval) + 1)
+        skipped = next_tick - tick - 1
+        if skipped:
+            logger.warning("Poll cycle overran, skipping %d cycle(s)", skipped)
+        tick = next_tick
+        stop.wait(max(0.0, start + tick * interval - now) + random.uniform(0, jitter))
+
+
+def _install_stop_handlers(stop: threading.Event) -> None:
+    def handle(signum, frame):
+        logger.info("Received signal %s, stopping after current cycle", signum)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
+
+
 def main(argv: list[str] | None = None) -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -33,28 +158,89 @@ def main(argv: list[str] | None = None) -> None:
         action="store_true",
         help="Clear the seen_mmsi database and exit",
     )
+    parser.add_argument(
+        "--areas",
+        nargs="+",
+        metavar="PATH",
+        default=[p for p in os.getenv("POLLER_AREAS", "").split(",") if p],
+        help="GeoJSON files or directories of areas to poll together "
+        "(default: POLLER_AREAS, else GEOJSON_PATH)",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running and poll every --interval seconds",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=float(os.getenv("POLL_INTERVAL_SECONDS", "120")),
+        help="Seconds between polls in daemon mode (default: POLL_INTERVAL_SECONDS or 120)",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=float(os.getenv("POLL_JITTER_SECONDS", "5")),
+        help="Random extra delay per poll in daemon mode (default: POLL_JITTER_SECONDS or 5)",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=os.getenv("POLLER_METRICS_FILE"),
+        help="Write Prometheus metrics here after every poll (default: POLLER_METRICS_FILE)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=int(os.getenv("POLLER_METRICS_PORT", "0")),
+        help="Serve /metrics on this port in daemon mode (default: POLLER_METRICS_PORT, off)",
+    )
     args = parser.parse_args(argv)
     if args.clear:
-        app.clear_seen_mmsi()
+        core.clear_seen_mmsi()
         logger.info("Cleared seen_mmsi database")
         return
 
-    try:
-        geom = _load_default_geometry()
-        _validate_area(geom)
-        now = datetime.now(timezone.utc)
-        msgtimefrom = now - timedelta(hours=1)
-        mmsi_list = bw_client.find_mmsi_in_area(
-            polygon_geometry=geom,
-            msgtimefrom=msgtimefrom,
-            msgtimeto=now,
-        )
-        features = bw_client.fetch_latest_combined(mmsi_list)
-        notify_new_ships(features)
-        cleanup_seen_mmsi()
-        logger.info("Fetched %d ships", len(features))
-    except Exception as exc:
-        logger.exception("Poller failed: %s", exc)
+    areas = load_areas(args.areas) if args.areas else None
+    index = AreaIndex(areas) if areas else None
+    # Pollers of the same areas (and web workers, for the default area) elect
+    # one leader; the others stand by and take over when it goes away
+    election = core.election("areas") if areas else core._election
+
+    def poll_once() -> None:
+        started = time.perf_counter()
+        result = "ok"
+        try:
+            if not election.is_leader():
+                result = "standby"
+                logger.info("Standing by, another process is polling")
+            else:
+                count = poll_areas(areas, index) if areas else poll_default_area()
+                cleanup_seen_mmsi()
+                core.cleanup_positions(POSITION_RETENTION_HOURS)
+                logger.info("Fetched %d ships", count)
+        except Exception as exc:
+            result = "error"
+            logger.exception("Poller failed: %s", exc)
+        POLL_SECONDS.observe(time.perf_counter() - started, result=result)
+        if args.metrics_file:
+            try:
+                REGISTRY.write(args.metrics_file)
+            except OSError as exc:
+                logger.warning("Failed to write metrics to %s: %s", args.metrics_file, exc)
+
+    if not args.daemon:
+        poll_once()
+        return
+
+    if args.metrics_port:
+        REGISTRY.serve(args.metrics_port)
+        logger.info("Serving metrics on :%d/metrics", args.metrics_port)
+    stop = threading.Event()
+    _install_stop_handlers(stop)
+    logger.info("Polling every %.0fs (jitter %.0fs)", args.interval, args.jitter)
+    run_daemon(poll_once, args.interval, args.jitter, stop)
+    core._slack.stop()
+    logger.info("Poller stopped")
 
 
 if __name__ == "__main__":
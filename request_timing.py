@@ -0,0 +1,106 @@
+"""Per-request phase timings for the ``Server-Timing`` response header.
+
+A request activates a :class:`Timings` with :func:`activate`; code on the
+request path wraps its phases in :func:`phase`, which is a no-op outside an
+active request (poller, background refreshes, fetch worker threads). Phases
+that repeat within one request are summed.
+"""
+from __future__ import annotations
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Server-Timing metric name -> description, in header order
+PHASES = {
+    "geometry": "geometry load",
+    "area": "area validation",
+    "token": "token",
+    "mmsiinarea": "mmsiinarea",
+    "latest": "latest/combined",
+    "notify": "notify/DB",
+    "enrich": "enrichment",
+    "serialize": "serialization",
+}
+
+_current: ContextVar[Optional["Timings"]] = ContextVar("request_timings", default=None)
+
+
+class Timings:
+    """Accumulated seconds per phase of one request."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def items(self) -> List[Tuple[str, float]]:
+        known = [(name, self.phases[name]) for name in PHASES if name in self.phases]
+        return known + [(n, s) for n, s in self.phases.items() if n not in PHASES]
+
+    def header(self) -> str:
+        """``Server-Timing`` value with every recorded phase and ``total``."""
+        parts = []
+        for name, seconds in self.items():
+            desc = PHASES.get(name, name)
+            parts.append(f'{name};dur={seconds * 1000:.2f};desc="{desc}"')
+        parts.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(parts)
+
+
+def activate() -> Tuple[Timings, Token]:
+    timings = Timings()
+    return timings, _current.set(timings)
+
+
+def deactivate(token: Token) -> None:
+    _current.reset(token)
+
+
+def current_timings() -> Optional[Timings]:
+    return _current.get()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Add the duration of the block to ``name`` of the active request."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def timed_chunks(chunks: Iterable[bytes], name: str = "serialize") -> Iterable[bytes]:
+    """Wrap ``chunks``, adding the time spent producing them to ``name``.
+
+    Streamed bodies are produced after the headers are sent (and after the
+    request context is gone, hence the eager lookup), so this time reaches
+    the request's :class:`Timings` but not its ``Server-Timing`` header.
+    """
+    timings = _current.get()
+    if timings is None:
+        return chunks
+    return _timed(chunks, timings, name)
+
+
+def _timed(chunks: Iterable[bytes], timings: Timings, name: str) -> Iterator[bytes]:
+    iterator = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            timings.add(name, time.perf_counter() - started)
+            return
+        timings.add(name, time.perf_counter() - started)
+        yield chunk
@@ -0,0 +1,181 @@
+"""Sampling profiler that keeps stacks of the slowest requests.
+
+While at least one request is being tracked, a daemon thread samples the
+stacks of the tracked threads every ``interval`` seconds with
+``sys._current_frames()``. When a request finishes, its samples are kept if
+it is among the ``keep`` slowest requests that finished within the last
+``window`` seconds. Profiles are exported in the folded ("collapsed") stack
+format understood by ``flamegraph.pl``, speedscope and inferno.
+"""
+from __future__ import annotations
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger("barentswatch-geoapp")
+
+
+class Profile(NamedTuple):
+    id: int
+    label: str
+    duration: float
+    # Wall-clock time the request finished
+    finished_at: float
+    samples: Dict[str, int]
+
+    def folded(self) -> str:
+        """One ``frame;frame;... count`` line per distinct stack, root first."""
+        lines = [f"{stack} {count}" for stack, count in sorted(self.samples.items())]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "duration_ms": round(self.duration * 1000, 2),
+            "finished_at": self.finished_at,
+            "samples": sum(self.samples.values()),
+        }
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def fold_stack(frame: Optional[FrameType]) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class _Active:
+    __slots__ = ("handle", "label", "thread_id", "started", "samples")
+
+    def __init__(self, handle: int, label: str, thread_id: int, started: float) -> None:
+        self.handle = handle
+        self.label = label
+        self.thread_id = thread_id
+        self.started = started
+        self.samples: Counter[str] = Counter()
+
+
+class SamplingProfiler:
+    """Profiles tracked requests and retains the slowest ``keep`` of them."""
+
+    def __init__(
+        self,
+        keep: int = 10,
+        window: float = 300.0,
+        interval: float = 0.005,
+        clock: Callable[[], float] = time.time,
+        timer: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.keep = keep
+        self.window = window
+        self.interval = interval
+        self._clock = clock
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._active: Dict[int, _Active] = {}
+        self._profiles: List[Profile] = []
+        self._ids = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+
+    # -------------------------
+    # Request tracking
+    # -------------------------
+    def begin(self, label: str) -> int:
+        """Start sampling the calling thread; returns a handle for :meth:`end`."""
+        handle = next(self._ids)
+        active = _Active(handle, label, threading.get_ident(), self._timer())
+        with self._lock:
+            self._active[handle] = active
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return handle
+
+    def end(self, handle: int) -> Optional[Profile]:
+        """Stop sampling; returns the profile if it ranks among the slowest."""
+        with self._lock:
+            active = self._active.pop(handle, None)
+        if active is None:
+            return None
+        profile = Profile(
+            handle,
+            active.label,
+            self._timer() - active.started,
+            self._clock(),
+            dict(active.samples),
+        )
+        with self._lock:
+            profiles = self._prune()
+            if len(profiles) >= self.keep and profile.duration <= profiles[-1].duration:
+                return None
+            profiles.append(profile)
+            profiles.sort(key=lambda p: p.duration, reverse=True)
+            del profiles[self.keep:]
+        return profile
+
+    def _prune(self) -> List[Profile]:
+        # Called with self._lock held
+        cutoff = self._clock() - self.window
+        self._profiles[:] = [p for p in self._profiles if p.finished_at >= cutoff]
+        return self._profiles
+
+    def slowest(self) -> List[Profile]:
+        with self._lock:
+            return list(self._prune())
+
+    def get(self, profile_id: int) -> Optional[Profile]:
+        return next((p for p in self.slowest() if p.id == profile_id), None)
+
+    # -------------------------
+    # Sampler
+    # -------------------------
+    def sample(self) -> None:
+        """Record one stack for every tracked thread."""
+        with self._lock:
+            active = list(self._active.values())
+        if not active:
+            return
+        frames = sys._current_frames()
+        stacks = []
+        for entry in active:
+            frame = frames.get(entry.thread_id)
+            if frame is not None:
+                stacks.append((entry, fold_stack(frame)))
+        del frames
+        with self._lock:
+            # Requests that ended meanwhile no longer take samples
+            for entry, stack in stacks:
+                if self._active.get(entry.handle) is entry:
+                    entry.samples[stack] += 1
+
+    def _run(self) -> None:
+        try:
+            while True:
+                # Sleep first: requests shorter than one interval take no samples
+                time.sleep(self.interval)
+                with self._lock:
+                    if not self._active:
+                        return
+                try:
+                    self.sample()
+                except Exception:
+                    # Other threads' frames change while they are walked
+                    logger.exception("Profiler sample failed")
+        finally:
+            # Let the next begin() start a sampler, however this one ended
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
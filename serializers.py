@@ -0,0 +1,144 @@
+"""Streaming serializers for ``/ships`` responses.
+
+Responses are produced as generators of byte chunks so large vessel lists
+start flowing immediately instead of being rendered into one string first.
+``orjson`` is used when installed; the standard library otherwise.
+"""
+from __future__ import annotations
+import json
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Features per yielded chunk; keeps writes large without buffering everything
+CHUNK_FEATURES = 256
+
+FORMATS = {
+    "json": "application/json",
+    "geojson": "application/geo+json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _join_chunks(items: Iterable[Any], render: Callable[[Any], bytes], sep: bytes) -> Iterator[bytes]:
+    batch: List[bytes] = []
+    first = True
+    for item in items:
+        batch.append(render(item))
+        if len(batch) >= CHUNK_FEATURES:
+            yield (b"" if first else sep) + sep.join(batch)
+            batch, first = [], False
+    if batch:
+        yield (b"" if first else sep) + sep.join(batch)
+
+
+def iter_ships_json(features: Iterable[Dict[str, Any]], count: int, area_km2: float) -> Iterator[bytes]:
+    """The classic ``{"count", "features", "area_km2"}`` document."""
+    yield b'{"count":' + dumps(count) + b',"area_km2":' + dumps(area_km2) + b',"features":['
+    yield from _join_chunks(features, dumps, b",")
+    yield b"]}"
+
+
+def iter_ships_delta(
+    features: Iterable[Dict[str, Any]],
+    removed: Iterable[int],
+    count: int,
+    area_km2: float,
+    version: str,
+    since: str,
+) -> Iterator[bytes]:
+    """Vessels changed after ``since`` plus the MMSIs removed since then."""
+    yield (
+        b'{"version":'
+        + dumps(version)
+        + b',"since":'
+        + dumps(since)
+        + b',"count":'
+        + dumps(count)
+        + b',"area_km2":'
+        + dumps(area_km2)
+        + b',"removed":'
+        + dumps(list(removed))
+        + b',"features":['
+    )
+    yield from _join_chunks(features, dumps, b",")
+    yield b"]}"
+
+
+def to_geojson_feature(ship: Dict[str, Any]) -> Dict[str, Any]:
+    lon, lat = ship.get("longitude"), ship.get("latitude")
+    geometry = None
+    if isinstance(lon, (int, float)) and isinstance(lat, (int, float)):
+        geometry = {"type": "Point", "coordinates": [lon, lat]}
+    return {"type": "Feature", "id": ship.get("mmsi"), "geometry": geometry, "properties": ship}
+
+
+def iter_geojson(features: Iterable[Dict[str, Any]], count: int, area_km2: float) -> Iterator[bytes]:
+    """A GeoJSON FeatureCollection of Point features (RFC 7946)."""
+    yield (
+        b'{"type":"FeatureCollection","count":'
+        + dumps(count)
+        + b',"area_km2":'
+        + dumps(area_km2)
+        + b',"features":['
+    )
+    yield from _join_chunks(features, lambda ship: dumps(to_geojson_feature(ship)), b",")
+    yield b"]}"
+
+
+def iter_ndjson(features: Iterable[Dict[str, Any]], count: int, area_km2: float) -> Iterator[bytes]:
+    """One JSON object per line, one line per vessel."""
+    for chunk in _join_chunks(features, dumps, b"\n"):
+        yield chunk + b"\n"
+
+
+SERIALIZERS = {
+    "json": iter_ships_json,
+    "geojson": iter_geojson,
+    "ndjson": iter_ndjson,
+}
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick ``gzip`` or ``deflate`` from an Accept-Encoding header, if allowed."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best: Tuple[float, Optional[str]] = (0.0, None)
+    for encoding in ("gzip", "deflate"):
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best[0]:
+            best = (q, encoding)
+    return best[1]
+
+
+def compress(chunks: Iterable[bytes], encoding: str, level: int = 6) -> Iterator[bytes]:
+    """Incrementally compress ``chunks`` as gzip or (zlib-wrapped) deflate."""
+    wbits = 31 if encoding == "gzip" else 15
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    for chunk in chunks:
+        # Sync-flush per chunk so the client receives data as it is produced
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
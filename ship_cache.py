@@ -0,0 +1,69 @@
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class ShipsCache:
+    """Small LRU cache with time-bucketed keys and request coalescing.
+
+    Entries are keyed by ``(key, bucket)`` where ``bucket`` is the current
+    ``ttl``-sized time slot, so a cached value is never served after its slot
+    ends. Concurrent callers asking for the same key while it is being
+    computed wait for the one in-flight computation instead of starting their
+    own. Failures are propagated to every waiter and are not cached.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int = 64,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._clock = clock
+        self._entries: OrderedDict[Tuple[Hashable, int], Any] = OrderedDict()
+        self._inflight: Dict[Tuple[Hashable, int], Future] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        if self.ttl <= 0:
+            return compute()
+        slot = (key, int(self._clock() // self.ttl))
+        with self._lock:
+            if slot in self._entries:
+                self._entries.move_to_end(slot)
+                return self._entries[slot]
+            future = self._inflight.get(slot)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[slot] = future
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop(slot, None)
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            self._inflight.pop(slot, None)
+            self._entries[slot] = value
+            self._entries.move_to_end(slot)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
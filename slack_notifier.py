@@ -0,0 +1,313 @@
+from __future__ import annotations
+import logging
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from db import LazyTable
+
+logger = logging.getLogger("barentswatch-geoapp")
+
+
+class TokenBucket:
+    """Blocking token bucket: ``rate`` tokens per second, up to ``capacity``."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class OutboxItem(NamedTuple):
+    url: str
+    text: str
+    outbox_id: Optional[int] = None
+
+
+def _outbox_table(metadata: Any):
+    from sqlalchemy import Column, DateTime, Integer, Table, Text
+
+    return Table(
+        "slack_outbox",
+        metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("url", Text, nullable=False),
+        Column("text", Text, nullable=False),
+        Column("created_at", DateTime(timezone=True), nullable=False),
+    )
+
+
+class SqlOutbox:
+    """Persists queued notifications in ``slack_outbox`` until they are sent."""
+
+    def __init__(self, engine_getter: Callable[[], Any]) -> None:
+        self._table = LazyTable(engine_getter, _outbox_table)
+
+    def add(self, url: str, text: str) -> Optional[int]:
+        from sqlalchemy.exc import SQLAlchemyError
+
+        try:
+            engine, table = self._table.resolve()
+            if engine is None:
+                return None
+            with engine.begin() as conn:
+                result = conn.execute(
+                    table.insert().values(
+                        url=url, text=text, created_at=datetime.now(timezone.utc)
+                    )
+                )
+                return result.inserted_primary_key[0]
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to store Slack notification: %s", exc)
+            return None
+
+    def remove(self, ids: List[int]) -> None:
+        from sqlalchemy.exc import SQLAlchemyError
+
+        if not ids:
+            return
+        try:
+            engine, table = self._table.resolve()
+            if engine is None:
+                return
+            with engine.begin() as conn:
+                conn.execute(table.delete().where(table.c.id.in_(ids)))
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to remove sent Slack notifications: %s", exc)
+
+    def pending(self, older_than: timedelta = timedelta(0)) -> List[OutboxItem]:
+        from sqlalchemy import select
+        from sqlalchemy.exc import SQLAlchemyError
+
+        try:
+            engine, table = self._table.resolve()
+            if engine is None:
+                return []
+            cutoff = datetime.now(timezone.utc) - older_than
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    select(table.c.id, table.c.url, table.c.text)
+                    .where(table.c.created_at <= cutoff)
+                    .order_by(table.c.id)
+                ).fetchall()
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to load Slack outbox: %s", exc)
+            return []
+        return [OutboxItem(row.url, row.text, row.id) for row in rows]
+
+
+class SlackDispatcher:
+    """Background sender for Slack webhook notifications.
+
+    :meth:`submit` only writes the outbox and enqueues; a worker thread
+    drains the bounded queue, merges everything queued for the same webhook
+    into one message, waits for the :class:`TokenBucket` and retries 429
+    (honouring ``Retry-After``), 5xx and connection errors with jittered
+    exponential backoff. Notifications Slack could not take are kept in the
+    outbox: those left over from a previous process are sent again at
+    :meth:`start`, and the worker retries them every ``replay_after`` while
+    it is idle.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, str], Any],
+        outbox: Optional[SqlOutbox] = None,
+        queue_size: int = 1000,
+        max_batch: int = 20,
+        rate: float = 1.0,
+        burst: float = 1.0,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        replay_after: timedelta = timedelta(minutes=1),
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._send = send
+        self.outbox = outbox
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.replay_after = replay_after
+        self._sleep = sleep
+        self._bucket = TokenBucket(rate, burst, sleep=sleep)
+        self._queue: queue.Queue[OutboxItem] = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        # Outbox ids currently queued, so a replay does not queue them twice
+        self._queued: set[int] = set()
+        self._replayed_at = float("-inf")
+
+    # -------------------------
+    # Producer side
+    # -------------------------
+    def submit(self, url: str, text: str) -> bool:
+        """Queue ``text`` for ``url``; returns False if the queue is full."""
+        self.start()
+        outbox_id = self.outbox.add(url, text) if self.outbox is not None else None
+        if not self._enqueue(OutboxItem(url, text, outbox_id)):
+            logger.warning("Slack queue full, notification kept in outbox only")
+            return False
+        return True
+
+    def _enqueue(self, item: OutboxItem) -> bool:
+        with self._lock:
+            if item.outbox_id is not None:
+                if item.outbox_id in self._queued:
+                    return True
+                self._queued.add(item.outbox_id)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._queued.discard(item.outbox_id)
+            return False
+        return True
+
+    def send_now(self, url: str, text: str) -> bool:
+        """Send synchronously, once, without queueing (``SLACK_ASYNC=0``)."""
+        try:
+            status, _ = self._post(url, text)
+        except Exception as exc:
+            logger.warning("Failed to notify Slack: %s", exc)
+            return False
+        return status < 400
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="slack-dispatcher", daemon=True)
+            self._thread.start()
+        self._replay()
+
+    def _replay(self) -> None:
+        """Queue outbox notifications older than ``replay_after``."""
+        self._replayed_at = time.monotonic()
+        if self.outbox is None:
+            return
+        for item in self.outbox.pending(self.replay_after):
+            if not self._enqueue(item):
+                break
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every queued notification has been handled."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Drain the queue (up to ``timeout``) and stop the worker."""
+        if self._thread is None:
+            return
+        self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    # -------------------------
+    # Worker
+    # -------------------------
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if time.monotonic() - self._replayed_at >= self.replay_after.total_seconds():
+                    self._replay()
+                continue
+            batch = [first]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._deliver_batch(batch)
+            except Exception as exc:  # pragma: no cover - keep the worker alive
+                logger.exception("Slack dispatcher error: %s", exc)
+            finally:
+                with self._lock:
+                    self._queued.difference_update(i.outbox_id for i in batch)
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver_batch(self, batch: List[OutboxItem]) -> None:
+        by_url: Dict[str, List[OutboxItem]] = {}
+        for item in batch:
+            by_url.setdefault(item.url, []).append(item)
+        for url, items in by_url.items():
+            text = "\n".join(item.text for item in items)
+            # Kept in the outbox when Slack stayed unavailable; rejected
+            # notifications would be rejected again
+            if self._deliver(url, text) is not None and self.outbox is not None:
+                self.outbox.remove([i.outbox_id for i in items if i.outbox_id is not None])
+
+    def _deliver(self, url: str, text: str) -> Optional[bool]:
+        """True once sent, False if Slack rejected it, None after the last retry."""
+        for attempt in range(self.max_retries + 1):
+            self._bucket.acquire()
+            try:
+                status, retry_after = self._post(url, text)
+            except Exception as exc:
+                logger.warning("Failed to notify Slack: %s", exc)
+                status, retry_after = 0, None
+            if 200 <= status < 400:
+                return True
+            if status and status < 500 and status != 429:
+                logger.warning("Slack rejected notification: HTTP %s", status)
+                return False
+            if attempt == self.max_retries:
+                break
+            delay = retry_after if retry_after is not None else min(
+                self.max_backoff, self.backoff * 2 ** attempt
+            ) * random.uniform(0.5, 1.0)
+            self._sleep(delay)
+        logger.warning("Slack unavailable after %d attempts, keeping notification", self.max_retries + 1)
+        return None
+
+    def _post(self, url: str, text: str) -> tuple[int, Optional[float]]:
+        resp = self._send(url, text)
+        status = getattr(resp, "status_code", 200)
+        retry_after = None
+        headers = getattr(resp, "headers", None) or {}
+        if status == 429:
+            try:
+                retry_after = float(headers.get("Retry-After", 1))
+            except (TypeError, ValueError):
+                retry_after = 1.0
+        return status, retry_after
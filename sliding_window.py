@@ -0,0 +1,170 @@
+from __future__ import annotations
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from db import LazyTable, upsert
+
+logger = logging.getLogger("poller")
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes even for timezone-aware columns
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class SlidingWindow:
+    """MMSIs seen in an area during the last ``window``, built from deltas.
+
+    Instead of asking ``mmsiinarea`` for the full window on every poll, the
+    poller asks only for ``[next_query_start(now), now]`` and merges the
+    answer here. Each vessel keeps the time it was last reported in the area
+    and is expired once that falls out of the window. Only the vessels
+    recorded since the last :meth:`save` are written back to the store.
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        window: timedelta = timedelta(hours=1),
+        overlap: timedelta = timedelta(minutes=1),
+        store: Optional["SqlWindowStore"] = None,
+    ) -> None:
+        self.scope = scope
+        self.window = window
+        # Re-query a little of the previous interval to cover upstream lag
+        self.overlap = overlap
+        self.store = store
+        self.last_query_to: Optional[datetime] = None
+        self.last_in_area: Dict[int, datetime] = {}
+        # Entries of last_in_area not yet written to the store
+        self._changed: Dict[int, datetime] = {}
+        self._loaded = False
+
+    def load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.store is None:
+            return
+        state = self.store.load(self.scope)
+        if state is not None:
+            self.last_query_to, self.last_in_area = state
+
+    def save(self) -> None:
+        if self.store is None or self.last_query_to is None:
+            return
+        if self.store.save(
+            self.scope, self.last_query_to, self._changed, self.last_query_to - self.window
+        ):
+            self._changed = {}
+
+    def next_query_start(self, now: datetime) -> datetime:
+        full = now - self.window
+        if self.last_query_to is None:
+            return full
+        return max(full, self.last_query_to - self.overlap)
+
+    def record(self, mmsis: Iterable[int], queried_to: datetime) -> None:
+        """Merge a successful delta query covering up to ``queried_to``."""
+        for mmsi in mmsis:
+            self.last_in_area[int(mmsi)] = self._changed[int(mmsi)] = queried_to
+        self.last_query_to = queried_to
+        self.expire(queried_to)
+
+    def expire(self, now: datetime) -> None:
+        cutoff = now - self.window
+        expired = [m for m, seen in self.last_in_area.items() if seen < cutoff]
+        for mmsi in expired:
+            del self.last_in_area[mmsi]
+            self._changed.pop(mmsi, None)
+
+    def mmsis(self) -> List[int]:
+        return list(self.last_in_area)
+
+
+def _window_tables(metadata: Any):
+    from sqlalchemy import Column, DateTime, Integer, String, Table
+
+    state = Table(
+        "poller_state",
+        metadata,
+        Column("scope", String(64), primary_key=True),
+        Column("last_query_to", DateTime(timezone=True), nullable=False),
+    )
+    window = Table(
+        "poller_window",
+        metadata,
+        Column("scope", String(64), primary_key=True),
+        Column("mmsi", Integer, primary_key=True),
+        Column("last_in_area", DateTime(timezone=True), nullable=False),
+    )
+    return state, window
+
+
+class SqlWindowStore:
+    """Persists sliding windows in ``poller_window`` and ``poller_state``."""
+
+    def __init__(self, engine_getter: Callable[[], Any]) -> None:
+        self._tables = LazyTable(engine_getter, _window_tables)
+
+    def load(self, scope: str):
+        from sqlalchemy import select
+        from sqlalchemy.exc import SQLAlchemyError
+
+        try:
+            engine, tables = self._tables.resolve()
+            if engine is None:
+                return None
+            state, window = tables
+            with engine.connect() as conn:
+                row = conn.execute(
+                    select(state.c.last_query_to).where(state.c.scope == scope)
+                ).fetchone()
+                if row is None:
+                    return None
+                rows = conn.execute(
+                    select(window.c.mmsi, window.c.last_in_area).where(window.c.scope == scope)
+                ).fetchall()
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to load poll window %s: %s", scope, exc)
+            return None
+        return _utc(row[0]), {r[0]: _utc(r[1]) for r in rows}
+
+    def save(
+        self,
+        scope: str,
+        last_query_to: datetime,
+        changed: Dict[int, datetime],
+        expired_before: datetime,
+    ) -> bool:
+        """Upsert the ``changed`` vessels and delete the expired ones.
+
+        Returns False when the database write failed, so the caller keeps
+        ``changed`` for the next attempt.
+        """
+        from sqlalchemy.exc import SQLAlchemyError
+
+        try:
+            engine, tables = self._tables.resolve()
+            if engine is None:
+                return True
+            state, window = tables
+            with engine.begin() as conn:
+                conn.execute(state.delete().where(state.c.scope == scope))
+                conn.execute(state.insert().values(scope=scope, last_query_to=last_query_to))
+                conn.execute(
+                    window.delete().where(
+                        window.c.scope == scope, window.c.last_in_area < expired_before
+                    )
+                )
+                _upsert_window(conn, window, scope, changed)
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to store poll window %s: %s", scope, exc)
+            return False
+        return True
+
+
+def _upsert_window(conn: Any, window: Any, scope: str, changed: Dict[int, datetime]) -> None:
+    rows = [{"scope": scope, "mmsi": mmsi, "last_in_area": seen} for mmsi, seen in changed.items()]
+    upsert(conn, window, rows, keys=["scope", "mmsi"], update=["last_in_area"])
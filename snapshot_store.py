@@ -0,0 +1,240 @@
+"""Shared vessel snapshots for stale-while-revalidate serving of ``/ships``.
+
+The poller publishes the vessels it found in an area after every poll; web
+workers serve the newest published snapshot instead of calling BarentsWatch
+on the request path. Snapshots are shared through the database
+(``ships_snapshot``) or a directory of JSON files.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Protocol
+
+from db import LazyTable
+
+logger = logging.getLogger("barentswatch-geoapp")
+
+
+class Snapshot(NamedTuple):
+    features: List[Dict[str, Any]]
+    taken_at: float
+
+
+class SnapshotStore(Protocol):
+    def load(self, scope: str, newer_than: Optional[float] = None) -> Optional[Snapshot]: ...
+
+    def save(self, scope: str, snapshot: Snapshot) -> None: ...
+
+
+class FileSnapshotStore:
+    """One ``<scope>.json`` file per area in ``directory``."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def _path(self, scope: str) -> str:
+        return os.path.join(self.directory, f"{scope}.json")
+
+    def load(self, scope: str, newer_than: Optional[float] = None) -> Optional[Snapshot]:
+        path = self._path(scope)
+        try:
+            # Skip parsing when the file has not been replaced since
+            if newer_than is not None and os.stat(path).st_mtime <= newer_than:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            snapshot = Snapshot(data["features"], float(data["taken_at"]))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("Invalid vessel snapshot %s: %s", path, exc)
+            return None
+        if newer_than is not None and snapshot.taken_at <= newer_than:
+            return None
+        return snapshot
+
+    def save(self, scope: str, snapshot: Snapshot) -> None:
+        path = self._path(scope)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"taken_at": snapshot.taken_at, "features": snapshot.features}, f)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as exc:
+            logger.warning("Failed to write vessel snapshot %s: %s", path, exc)
+
+
+def _snapshot_table(metadata: Any):
+    from sqlalchemy import Column, Float, String, Table, Text
+
+    return Table(
+        "ships_snapshot",
+        metadata,
+        Column("scope", String(64), primary_key=True),
+        Column("taken_at", Float, nullable=False),
+        Column("features", Text, nullable=False),
+    )
+
+
+class SqlSnapshotStore:
+    """Persists snapshots in ``ships_snapshot``, one row per area."""
+
+    def __init__(self, engine_getter: Callable[[], Any]) -> None:
+        self._table = LazyTable(engine_getter, _snapshot_table)
+
+    def load(self, scope: str, newer_than: Optional[float] = None) -> Optional[Snapshot]:
+        from sqlalchemy import select
+        from sqlalchemy.exc import SQLAlchemyError
+
+        try:
+            engine, table = self._table.resolve()
+            if engine is None:
+                return None
+            query = select(table.c.taken_at, table.c.features).where(table.c.scope == scope)
+            if newer_than is not None:
+                # Unchanged snapshots cost one indexed lookup and no payload
+                query = query.where(table.c.taken_at > newer_than)
+            with engine.connect() as conn:
+                row = conn.execute(query).fetchone()
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to load vessel snapshot %s: %s", scope, exc)
+            return None
+        if row is None:
+            return None
+        try:
+            return Snapshot(json.loads(row.features), row.taken_at)
+        except ValueError as exc:
+            logger.warning("Invalid vessel snapshot %s: %s", scope, exc)
+            return None
+
+    def save(self, scope: str, snapshot: Snapshot) -> None:
+        from sqlalchemy.exc import SQLAlchemyError
+
+        try:
+            engine, table = self._table.resolve()
+            if engine is None:
+                return
+            payload = json.dumps(snapshot.features, separators=(",", ":"))
+            with engine.begin() as conn:
+                conn.execute(table.delete().where(table.c.scope == scope))
+                conn.execute(
+                    table.insert().values(scope=scope, taken_at=snapshot.taken_at, features=payload)
+                )
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to store vessel snapshot %s: %s", scope, exc)
+
+
+class Served(NamedTuple):
+    value: Any
+    taken_at: float
+
+
+class SnapshotCache:
+    """Serve the newest snapshot per area and revalidate stale ones lazily.
+
+    :meth:`get` never waits for BarentsWatch once a snapshot exists: it
+    returns the newest snapshot (picking up ones published by the poller
+    through ``store``) and, when that is older than ``stale_after``, starts a
+    single background refresh. Only the very first requests for an area,
+    with nothing published yet, wait for one shared synchronous refresh.
+    ``install`` turns raw features into the value that is served, once per
+    snapshot; the features themselves are not kept.
+
+    With ``leader`` set, only the process it elects revalidates and
+    publishes. The others keep serving what the leader publishes, refresh
+    locally (without publishing) only when there is nothing to serve yet or
+    the leader has not published for twice ``stale_after``.
+    """
+
+    def __init__(
+        self,
+        install: Callable[[List[Dict[str, Any]]], Any],
+        store: Optional[SnapshotStore] = None,
+        stale_after: float = 180.0,
+        check_interval: float = 1.0,
+        clock: Callable[[], float] = time.time,
+        leader: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        self._install = install
+        self.store = store
+        self.stale_after = stale_after
+        self.check_interval = check_interval
+        self._clock = clock
+        self._leader = leader
+        self._served: Dict[str, Served] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._refreshing: set[str] = set()
+        self._lock = threading.Lock()
+        # Held while a first request refreshes, so concurrent ones wait for it
+        self._initial = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._served.clear()
+            self._checked_at.clear()
+
+    def get(self, scope: str, refresh: Callable[[], List[Dict[str, Any]]]) -> Served:
+        now = self._clock()
+        served = self._served.get(scope)
+        if self.store is not None and now - self._checked_at.get(scope, float("-inf")) >= self.check_interval:
+            self._checked_at[scope] = now
+            loaded = self.store.load(scope, newer_than=served.taken_at if served else None)
+            if loaded is not None:
+                served = self._use(scope, loaded)
+        if served is None:
+            with self._initial:
+                served = self._served.get(scope)
+                if served is None:
+                    # Nothing to serve yet; errors reach the caller
+                    return self._refresh(scope, refresh)
+            return served
+        age = now - served.taken_at
+        if age >= self.stale_after and (age >= 2 * self.stale_after or self._leads()):
+            self._refresh_in_background(scope, refresh)
+        return served
+
+    def _leads(self) -> bool:
+        return self._leader is None or self._leader()
+
+    def publish(self, scope: str, features: List[Dict[str, Any]], taken_at: Optional[float] = None) -> Served:
+        """Store a freshly polled snapshot and serve it from now on."""
+        snapshot = Snapshot(features, self._clock() if taken_at is None else taken_at)
+        if self.store is not None:
+            self.store.save(scope, snapshot)
+        return self._use(scope, snapshot)
+
+    def _use(self, scope: str, snapshot: Snapshot) -> Served:
+        with self._lock:
+            current = self._served.get(scope)
+            if current is not None and current.taken_at >= snapshot.taken_at:
+                return current
+            served = Served(self._install(snapshot.features), snapshot.taken_at)
+            self._served[scope] = served
+            return served
+
+    def _refresh(self, scope: str, refresh: Callable[[], List[Dict[str, Any]]]) -> Served:
+        features = refresh()
+        if self._leads():
+            return self.publish(scope, features)
+        return self._use(scope, Snapshot(features, self._clock()))
+
+    def _refresh_in_background(self, scope: str, refresh: Callable[[], List[Dict[str, Any]]]) -> None:
+        with self._lock:
+            if scope in self._refreshing:
+                return
+            self._refreshing.add(scope)
+
+        def run() -> None:
+            try:
+                self._refresh(scope, refresh)
+            except Exception as exc:
+                logger.warning("Background refresh of %s failed, serving stale snapshot: %s", scope, exc)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(scope)
+
+        threading.Thread(target=run, name="snapshot-refresh", daemon=True).start()
@@ -2,6 +2,8 @@ import sys
 import pathlib
 import os
 
+import pytest
+
 # Ensure project root is on sys.path for module imports
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
@@ -9,3 +11,59 @@ if str(ROOT) not in sys.path:
 
 # Use in-memory SQLite database for tests
 os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+# Send Slack notifications synchronously so tests can assert on them directly
+os.environ.setdefault("SLACK_ASYNC", "0")
+
+
+class Clock:
+    """Stands in for ``time.time``/``time.monotonic``; move ``now`` by hand."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+class FakeResponse:
+    """The parts of ``requests.Response`` the code under test reads."""
+
+    def __init__(self, status_code=200, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+        self.text = "" if payload is None else str(payload)
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    """Stands in for ``requests.Session`` and records every ``post``.
+
+    Calls return (or raise) the scripted ``outcomes`` in order, or, with
+    ``respond``, whatever ``respond(url, **kwargs)`` returns.
+    """
+
+    def __init__(self, *outcomes, respond=None):
+        self.outcomes = list(outcomes)
+        self.respond = respond
+        self.calls = []
+
+    @property
+    def timeouts(self):
+        return [call.get("timeout") for call in self.calls]
+
+    def post(self, url, **kwargs):
+        self.calls.append({"url": url, **kwargs})
+        if self.respond is not None:
+            return self.respond(url, **kwargs)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
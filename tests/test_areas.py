@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+import core
+import poller
+from areas import AreaIndex, load_areas, merged_footprint
+
+
+def _square(x0, y0, size=0.1):
+    return {
+        "type": "Polygon",
+        "coordinates": [[[x0, y0], [x0 + size, y0], [x0 + size, y0 + size], [x0, y0 + size], [x0, y0]]],
+    }
+
+
+@pytest.fixture
+def area_dir(tmp_path):
+    north = {"type": "Feature", "properties": {"slack_webhook_url": "http://north"}, "geometry": _square(7.0, 62.1)}
+    south = {"type": "FeatureCollection", "features": [{"type": "Feature", "properties": {"name": "Sør"}, "geometry": _square(7.0, 62.0)}]}
+    (tmp_path / "north.geojson").write_text(json.dumps(north), encoding="utf-8")
+    (tmp_path / "south.geojson").write_text(json.dumps(south), encoding="utf-8")
+    return tmp_path
+
+
+def test_load_areas_from_directory(area_dir, monkeypatch):
+    monkeypatch.setenv("SLACK_WEBHOOK_URL_SOR", "http://env-south")
+    areas = load_areas([str(area_dir)])
+    assert [a.name for a in areas] == ["north", "Sør"]
+    assert areas[0].webhook_url == "http://north"
+    assert merged_footprint(areas)["type"] == "Polygon"
+
+
+def test_area_index_assigns_vessels(area_dir):
+    index = AreaIndex(load_areas([str(area_dir)]))
+    assigned = index.assign([
+        {"mmsi": 1, "longitude": 7.05, "latitude": 62.15},
+        {"mmsi": 2, "longitude": 7.05, "latitude": 62.05},
+        {"mmsi": 3, "longitude": 9.0, "latitude": 62.05},
+        {"mmsi": 4},
+    ])
+    assert [f["mmsi"] for f in assigned["north"]] == [1]
+    assert [f["mmsi"] for f in assigned["Sør"]] == [2]
+
+
+def test_poll_areas_single_upstream_query(area_dir, monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "DATABASE_URL", f"sqlite:///{tmp_path}/seen.db")
+    monkeypatch.setattr(core, "SLACK_WEBHOOK_URL", "http://default")
+    core._known_mmsi.clear()
+    core._engine = None
+    core._seen_table = None
+    core._init_db()
+
+    calls = []
+    posts = []
+
+    def fake_find(polygon_geometry, msgtimefrom, msgtimeto):
+        calls.append(polygon_geometry["type"])
+        return [1, 2]
+
+    def fake_fetch(mmsi_list):
+        calls.append("fetch")
+        return [
+            {"mmsi": 1, "name": "N", "longitude": 7.05, "latitude": 62.15},
+            {"mmsi": 2, "name": "S", "longitude": 7.05, "latitude": 62.05},
+        ]
+
+    def fake_post(url, json, timeout):
+        posts.append((url, json["text"]))
+
+    monkeypatch.setattr(poller.bw_client, "find_mmsi_in_area", fake_find)
+    monkeypatch.setattr(poller.bw_client, "fetch_latest_combined", fake_fetch)
+    monkeypatch.setattr(core.requests, "post", fake_post)
+
+    areas = load_areas([str(area_dir)])
+    assert poller.poll_areas(areas) == 2
+    assert poller.poll_areas(areas) == 2
+
+    assert calls == ["Polygon", "fetch"] * 2
+    assert sorted(url for url, _ in posts) == ["http://default", "http://north"]
+    assert "Område: Sør" in dict(posts)["http://default"]
+    assert core._known_set("north") == {1}
+    assert core._known_set("Sør") == {2}
+    assert core._known_mmsi == set()
+
+
+def test_poll_areas_assigns_once_per_poll(area_dir, monkeypatch):
+    monkeypatch.setattr(poller, "query_mmsi_in_window", lambda geom: [1])
+    monkeypatch.setattr(poller.bw_client, "fetch_latest_combined", lambda mmsi_list: [])
+    monkeypatch.setattr(poller, "notify_new_ships", lambda ships, area, webhook_url: None)
+    unions = []
+    monkeypatch.setattr("areas.merged_footprint", lambda areas: unions.append(1) or _square(7.0, 62.0))
+
+    areas = load_areas([str(area_dir)])
+    index = AreaIndex(areas)
+    assign = index.assign
+    assigns = []
+    index.assign = lambda features: assigns.append(1) or assign(features)
+    poller.poll_areas(areas, index)
+    poller.poll_areas(areas, index)
+    assert len(assigns) == 2
+    assert len(unions) == 1
@@ -1,38 +1,35 @@
 # tests/test_barentswatch.py
+import time
+
+import pytest
+
 from barentswatch import BarentsWatchClient
+from conftest import FakeResponse, FakeSession
+from transport import Transport
 
 
-class FakeResponse:
-    status_code = 200
-
-    def json(self):
-        return [
-            {
-                "mmsi": 123456789,
-                "name": "Test Ship",
-                "latitude": 1.0,
-                "longitude": 2.0,
-                "msgtime": "2023-01-01T00:00:00Z",
-                "shipType": "Cargo",
-                "destination": "Somewhere",
-                "lengthoverall": 150,
-            },
-            {
-                "mmsi": 987654321,
-                "name": "Nested Ship",
-                "latitude": 3.0,
-                "longitude": 4.0,
-                "msgtime": "2023-01-02T00:00:00Z",
-                "shipType": "Tanker",
-                "vesselData": {"destination": "Elsewhere"},
-                "length": 200,
-            },
-        ]
-
-
-class FakeSession:
-    def post(self, url, headers=None, json=None, timeout=None):
-        return FakeResponse()
+LATEST = [
+    {
+        "mmsi": 123456789,
+        "name": "Test Ship",
+        "latitude": 1.0,
+        "longitude": 2.0,
+        "msgtime": "2023-01-01T00:00:00Z",
+        "shipType": "Cargo",
+        "destination": "Somewhere",
+        "lengthoverall": 150,
+    },
+    {
+        "mmsi": 987654321,
+        "name": "Nested Ship",
+        "latitude": 3.0,
+        "longitude": 4.0,
+        "msgtime": "2023-01-02T00:00:00Z",
+        "shipType": "Tanker",
+        "vesselData": {"destination": "Elsewhere"},
+        "length": 200,
+    },
+]
 
 
 def test_fetch_latest_combined_includes_destination_and_length():
@@ -40,10 +37,72 @@ def test_fetch_latest_combined_includes_destination_and_length():
         client_id=None,
         client_secret=None,
         static_access_token="token",
-        session=FakeSession(),
+        session=FakeSession(respond=lambda url, **kwargs: FakeResponse(payload=LATEST)),
     )
     features = client.fetch_latest_combined([123456789])
     assert features[0]["destination"] == "Somewhere"
     assert features[0]["length"] == 150
     # Nested vesselData destination handled
     assert features[1]["destination"] == "Elsewhere"
+
+
+def _ships(mmsi):
+    return [{"mmsi": m, "name": f"Ship {m}"} for m in mmsi]
+
+
+def _recording_session(fail_on=None):
+    def respond(url, json=None, **kwargs):
+        if fail_on is not None and fail_on in json["mmsi"]:
+            return FakeResponse(500, "error")
+        return FakeResponse(payload=_ships(json["mmsi"]))
+
+    return FakeSession(respond=respond)
+
+
+def test_fetch_latest_combined_concurrent_keeps_order_and_dedupes():
+    session = _recording_session()
+    client = BarentsWatchClient(
+        client_id=None,
+        client_secret=None,
+        static_access_token="token",
+        session=session,
+        max_concurrency=4,
+    )
+    mmsi = list(range(1, 11)) + [3, 5, 1]
+    features = client.fetch_latest_combined(mmsi, batch_size=3)
+    assert [f["mmsi"] for f in features] == list(range(1, 11))
+    assert sorted(m for call in session.calls for m in call["json"]["mmsi"]) == list(range(1, 11))
+    assert len(session.calls) == 4
+
+
+def test_fetch_latest_combined_concurrent_failure_raises():
+    session = _recording_session(fail_on=4)
+    client = BarentsWatchClient(
+        client_id=None,
+        client_secret=None,
+        static_access_token="token",
+        transport=Transport(session, sleep=lambda s: None),
+    )
+    with pytest.raises(RuntimeError, match="latest/combined failed"):
+        client.fetch_latest_combined(list(range(1, 10)), batch_size=3, max_concurrency=3)
+
+
+def _auth_session():
+    def respond(url, headers=None, json=None, data=None, **kwargs):
+        if data is not None:
+            return FakeResponse(payload={"access_token": "new", "expires_in": 3600})
+        token = headers["Authorization"].split()[-1]
+        return FakeResponse(401, "error") if token == "old" else FakeResponse(payload=_ships(json["mmsi"]))
+
+    return FakeSession(respond=respond)
+
+
+def test_rejected_token_is_renewed_and_retried_once():
+    session = _auth_session()
+    client = BarentsWatchClient("id", "secret", session=session)
+    client.token_manager._set("old", time.time() + 3600, time.time())
+
+    assert [f["mmsi"] for f in client.fetch_latest_combined([1])] == [1]
+    tokens = [call["headers"]["Authorization"].split()[-1] for call in session.calls if "json" in call]
+    assert tokens == ["old", "new"]
+    client.token_manager.close()
@@ -1,7 +1,12 @@
 # tests/test_basic.py
 import json
+import os
+import subprocess
+import sys
+import threading
+import time
 
-import app as app_module
+import core
 from app import app
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -34,7 +39,7 @@ def test_data_endpoint_debug_detail(monkeypatch):
         def connect(self):
             raise SQLAlchemyError("Boom!")
 
-    monkeypatch.setattr(app_module, "_engine", FailingEngine())
+    monkeypatch.setattr(core, "_engine", FailingEngine())
 
     with app.test_client() as c:
         res = c.get("/data")
@@ -45,3 +50,52 @@ def test_data_endpoint_debug_detail(monkeypatch):
     assert data.get("detail") == "Boom!"
 
     app.debug = False
+
+
+def test_import_does_not_touch_database(tmp_path):
+    db = tmp_path / "lazy.db"
+    code = (
+        "import os, core\n"
+        "assert core._engine is None and core._mid_table is None\n"
+        f"assert not os.path.exists({str(db)!r})\n"
+        "core.notify_new_ships([{'mmsi': 257000000}])\n"
+        "assert 257000000 in core._known_mmsi\n"
+    )
+    root = os.path.dirname(os.path.abspath(core.__file__))
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db}", "SLACK_WEBHOOK_URL": ""}
+    subprocess.run([sys.executable, "-c", code], cwd=root, env=env, check=True)
+    assert db.exists()
+
+
+def test_concurrent_first_use_waits_for_database(monkeypatch):
+    import sqlalchemy
+
+    saved = {
+        name: getattr(core, name)
+        for name in ("_engine", "_seen_table", "_area_seen_table", "_positions_table", "_db_ready")
+    }
+    known = set(core._known_mmsi)
+    create_engine = sqlalchemy.create_engine
+    started = threading.Event()
+
+    def slow_create_engine(*args, **kwargs):
+        started.set()
+        time.sleep(0.2)
+        return create_engine(*args, **kwargs)
+
+    monkeypatch.setattr(sqlalchemy, "create_engine", slow_create_engine)
+    for name in saved:
+        monkeypatch.setattr(core, name, None)
+    monkeypatch.setattr(core, "_db_ready", False)
+    first = threading.Thread(target=core._ensure_db)
+    try:
+        first.start()
+        assert started.wait(5)
+        assert core._ensure_db() is not None
+        assert core._seen_table is not None
+    finally:
+        first.join(5)
+        for name, value in saved.items():
+            setattr(core, name, value)
+        core._known_mmsi.clear()
+        core._known_mmsi.update(known)
@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import core  # noqa: E402
+import geometry_utils  # noqa: E402
+import bench_suite as bench  # noqa: E402
+import import_budget  # noqa: E402
+
+
+def test_suite_runs_offline_and_restores_core():
+    engine = core._engine
+    report = bench.run([10], repeat=1, min_time=0.0001)
+    assert set(report["results"]) == {case.name for case in bench.CASES}
+    assert report["results"]["geometry/area_km2/simple"]["-"]["median_ms"] > 0
+    assert "per_item_us" in report["results"]["notify_new_ships/sqlite/steady"]["10"]
+    assert core._engine is engine
+
+
+def test_cold_geometry_cases_miss_the_caches():
+    case = next(case for case in bench.CASES if case.name == "geometry/area_km2/complex/cold")
+    with case.setup(10) as func:
+        func()
+        func()
+    assert geometry_utils._area_km2_from_canonical.cache_info().hits == 0
+
+
+def test_compare_flags_regressions(tmp_path):
+    report = bench.run([10], only="flag_from_mmsi", repeat=1, min_time=0.0001)
+    assert not any(row["regressed"] for row in bench.compare(report, report))
+
+    faster = json.loads(json.dumps(report))
+    faster["results"]["enrich/flag_from_mmsi"]["10"]["median_ms"] /= 10
+    [row] = bench.compare(report, faster, min_delta_ms=0)
+    assert row["regressed"] and row["ratio"] > 1.3
+
+    # Slower by more than the ratio but less than the absolute floor: noise
+    noisy = json.loads(json.dumps(report))
+    noisy["results"]["enrich/flag_from_mmsi"]["10"]["median_ms"] = 0.01
+    report["results"]["enrich/flag_from_mmsi"]["10"]["median_ms"] = 0.05
+    [row] = bench.compare(report, noisy)
+    assert row["ratio"] > 1.3 and not row["regressed"]
+    assert bench.compare(report, noisy, min_delta_ms=0.01)[0]["regressed"]
+
+    args = ["--sizes", "10", "--only", "flag_from_mmsi", "--repeat", "1", "--min-time", "0.0001"]
+    output = tmp_path / "report.json"
+    assert bench.main(args + ["--output", str(output)]) == 0
+    assert json.loads(output.read_text())["meta"]["sizes"] == [10]
+
+
+def test_importtime_parsing_and_budget_check():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     json.decoder\n"
+        "import time:       300 |        420 |   json\n"
+        "import time:      1000 |       1420 | poller\n"
+    )
+    lines = import_budget.parse_importtime(stderr)
+    assert [(line.name, line.depth) for line in lines] == [("json.decoder", 2), ("json", 1), ("poller", 0)]
+    result = {"median_ms": 1.42, "modules": ["json", "poller"]}
+    assert import_budget.check({"poller": result}, {"poller": {"budget_ms": 2, "forbidden": ["flask"]}}) == []
+    assert import_budget.check({"poller": result}, {"poller": {"budget_ms": 1, "forbidden": ["json"]}}) == [
+        "poller: 1 ms > budget 1 ms",
+        "poller: imports json",
+    ]
+
+
+def test_poller_import_avoids_web_and_geometry_stack():
+    with open(import_budget.BUDGET_PATH, "r", encoding="utf-8") as f:
+        forbidden = json.load(f)["poller"]["forbidden"]
+    result = import_budget.measure("poller", repeat=1)
+    assert import_budget.check({"poller": result}, {"poller": {"forbidden": forbidden}}) == []
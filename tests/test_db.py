@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, inspect, select
+
+from db import LazyTable, upsert
+
+
+def _things(metadata):
+    return Table("things", metadata, Column("id", Integer, primary_key=True))
+
+
+def test_lazy_table_follows_the_engine():
+    engines = [None]
+    lazy = LazyTable(lambda: engines[-1], _things)
+    assert lazy.resolve() == (None, None)
+
+    engines.append(create_engine("sqlite:///:memory:"))
+    engine, table = lazy.resolve()
+    assert engine is engines[-1] and inspect(engine).has_table("things")
+    assert lazy.resolve()[1] is table
+
+    # A replaced engine gets its own table
+    engines.append(create_engine("sqlite:///:memory:"))
+    engine, replaced = lazy.resolve()
+    assert replaced is not table and inspect(engine).has_table("things")
+
+
+class GenericConnection:
+    """A SQLite connection that claims another dialect, to use the fallback."""
+
+    dialect = SimpleNamespace(name="generic")
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, *args, **kwargs):
+        return self._conn.execute(*args, **kwargs)
+
+
+@pytest.mark.parametrize("generic", [False, True])
+def test_upsert_updates_or_skips_existing_keys(generic):
+    engine = create_engine("sqlite:///:memory:")
+    metadata = MetaData()
+    table = Table(
+        "seen",
+        metadata,
+        Column("scope", String(16), primary_key=True),
+        Column("mmsi", Integer, primary_key=True),
+        Column("seen", DateTime(timezone=True), nullable=False),
+        Column("note", String(16)),
+    )
+    metadata.create_all(engine)
+    first, later = datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+    with engine.begin() as conn:
+        db = GenericConnection(conn) if generic else conn
+        upsert(db, table, [{"scope": "a", "mmsi": 1, "seen": first, "note": "x"}], keys=["scope", "mmsi"])
+        rows = [
+            {"scope": "a", "mmsi": 1, "seen": later, "note": "y"},
+            {"scope": "b", "mmsi": 1, "seen": later, "note": "y"},
+        ]
+        upsert(db, table, rows, keys=["scope", "mmsi"], update=["seen"])
+        # Without update columns, existing keys are skipped
+        upsert(db, table, [{"scope": "a", "mmsi": 1, "seen": first, "note": "z"}], keys=["scope", "mmsi"])
+        upsert(db, table, [], keys=["scope", "mmsi"])
+        stored = conn.execute(select(table).order_by(table.c.scope)).fetchall()
+
+    assert [(r.scope, r.mmsi, r.seen.replace(tzinfo=timezone.utc), r.note) for r in stored] == [
+        ("a", 1, later, "x"),
+        ("b", 1, later, "y"),
+    ]
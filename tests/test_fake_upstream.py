@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from barentswatch import BarentsWatchClient  # noqa: E402
+from fake_upstream import FakeConfig, FakeServer, add_arguments, config_from_args  # noqa: E402
+from geometry_utils import features_in_area  # noqa: E402
+from loadgen import drive, percentile, summarize  # noqa: E402
+from transport import Transport  # noqa: E402
+
+SQUARE = {"type": "Polygon", "coordinates": [[[7.0, 62.6], [7.2, 62.6], [7.2, 62.8], [7.0, 62.8], [7.0, 62.6]]]}
+
+
+def _client(server, **transport):
+    env = server.env()
+    return BarentsWatchClient(
+        env["BW_CLIENT_ID"],
+        env["BW_CLIENT_SECRET"],
+        token_url=env["BW_TOKEN_URL"],
+        find_in_area_url=env["BW_FIND_IN_AREA_URL"],
+        latest_combined_url=env["BW_LATEST_COMBINED_URL"],
+        max_concurrency=2,
+        transport=Transport(sleep=lambda s: None, **transport),
+    )
+
+
+def test_client_against_fake_upstream():
+    with FakeServer(FakeConfig(fleet=650, payload_bytes=10)) as server:
+        client = _client(server)
+        now = datetime.now(timezone.utc)
+        mmsis = client.find_mmsi_in_area(SQUARE, now - timedelta(hours=1), now)
+        features = client.fetch_latest_combined(mmsis)
+        stats = server.upstream.stats()
+
+    assert len(features) == 650
+    assert len(features_in_area(features, SQUARE)) == 650
+    assert features[0]["destination"] == "MOLDE" and features[0]["length"]
+    assert stats["calls"] == {"token": 1, "mmsiinarea": 1, "latest": 3}
+
+
+def test_token_lifetime_from_the_command_line():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    config = config_from_args(parser.parse_args(["--token-lifetime", "90"]))
+    assert config.token_lifetime == 90
+    with FakeServer(config) as server:
+        client = _client(server)
+        assert client.token_manager.get_token() == "fake-token"
+        assert 0 < client.token_manager.expires_at - time.time() <= 90
+        client.token_manager.close()
+
+
+def test_injected_failures_are_retried_and_reported():
+    with FakeServer(FakeConfig(fleet=5, error_rate=0.5, throttle_rate=0.2, retry_after=0)) as server:
+        client = _client(server, max_retries=10)
+        mmsis = client.find_mmsi_in_area(SQUARE, datetime.now(timezone.utc), datetime.now(timezone.utc))
+        stats = server.upstream.stats()
+    assert len(mmsis) == 5
+    assert stats["errors"]["500"] + stats["errors"]["429"] > 0
+
+
+def test_load_generator_reports_percentiles():
+    assert percentile([5, 1, 4, 2, 3], 50) == 3
+    assert percentile([float(i) for i in range(1, 101)], 99) == 99
+    with FakeServer() as server:
+        result = drive(f"{server.url}/stats", clients=3, requests_per_client=5)
+        missing = drive(f"{server.url}/missing", clients=1, requests_per_client=2)
+    report = summarize(result, {"token": 0, "latest": 3})
+    assert report["requests"] == 15 and report["errors"] == 0
+    assert report["latency_ms"]["p50"] <= report["latency_ms"]["p99"]
+    assert report["upstream_calls_per_request"] == pytest.approx(0.2)
+    assert missing.errors == 2
@@ -0,0 +1,82 @@
+import json
+import os
+
+import pytest
+
+import core
+import geometry_utils
+from geometry_utils import ensure_valid_polygon_geometry, geometry_area_km2
+
+SQUARE = {
+    "type": "Polygon",
+    "coordinates": [[[7.0, 62.0], [7.1, 62.0], [7.1, 62.1], [7.0, 62.1], [7.0, 62.0]]],
+}
+
+
+def test_area_is_memoized_by_canonical_geometry():
+    geometry_utils._area_km2_from_canonical.cache_clear()
+    first = geometry_area_km2(SQUARE)
+    reordered = {"coordinates": SQUARE["coordinates"], "type": "Polygon"}
+    assert geometry_area_km2(reordered) == first
+    info = geometry_utils._area_km2_from_canonical.cache_info()
+    assert info.misses == 1 and info.hits == 1
+    assert 50 < first < 70
+
+
+def test_transformer_cached_per_zone():
+    assert geometry_utils._transformer_to_utm(32632) is geometry_utils._transformer_to_utm(32632)
+
+
+def test_invalid_geometry_rejected():
+    with pytest.raises(ValueError):
+        ensure_valid_polygon_geometry({"type": "Point", "coordinates": [1, 2]})
+
+
+def test_default_area_reloaded_on_mtime_change(monkeypatch, tmp_path):
+    path = tmp_path / "area.geojson"
+    path.write_text(json.dumps(SQUARE), encoding="utf-8")
+    monkeypatch.setattr(core, "DEFAULT_GEOJSON_PATH", str(path))
+    monkeypatch.setattr(core, "_default_area", None)
+
+    first = core._load_default_area()
+    assert core._load_default_area() is first
+
+    bigger = json.loads(json.dumps(SQUARE))
+    bigger["coordinates"][0][1][0] = 7.2
+    bigger["coordinates"][0][2][0] = 7.2
+    path.write_text(json.dumps(bigger), encoding="utf-8")
+    os.utime(path, ns=(first.mtime_ns + 10**9, first.mtime_ns + 10**9))
+
+    second = core._load_default_area()
+    assert second is not first
+    assert second.area_km2 > first.area_km2
+    assert second.key != first.key
+
+
+def test_features_in_area_drops_departed_vessels():
+    features = [
+        {"mmsi": 1, "longitude": 7.05, "latitude": 62.05},
+        {"mmsi": 2, "longitude": 7.5, "latitude": 62.05},
+        {"mmsi": 3, "longitude": None, "latitude": None},
+        {"mmsi": 4, "longitude": "7.01", "latitude": "62.09"},
+    ]
+    kept = geometry_utils.features_in_area(features, SQUARE)
+    assert [f["mmsi"] for f in kept] == [1, 3, 4]
+
+
+def test_fetch_ships_from_snapshot_skips_upstream(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("upstream must not be called")
+
+    monkeypatch.setattr(core.bw_client, "find_mmsi_in_area", fail)
+    monkeypatch.setattr(core.bw_client, "fetch_latest_combined", fail)
+    monkeypatch.setattr(core, "notify_new_ships", lambda features: None)
+
+    snapshot = [
+        {"mmsi": 1, "longitude": 7.05, "latitude": 62.05, "shipType": 30},
+        {"mmsi": 2, "longitude": 8.0, "latitude": 62.05, "shipType": 30},
+    ]
+    ships = core._fetch_ships(SQUARE, snapshot=snapshot)
+    assert [s["mmsi"] for s in ships] == [1]
+    assert ships[0]["shipType"] == "Fiskefartøy"
+    assert snapshot[0]["shipType"] == 30
@@ -1,4 +1,7 @@
-import app
+import json
+import os
+
+import core
 
 
 def test_ignore_ship_by_name_and_mmsi(monkeypatch):
@@ -12,16 +15,67 @@ def test_ignore_ship_by_name_and_mmsi(monkeypatch):
 
         return Resp()
 
-    monkeypatch.setattr(app, "SLACK_WEBHOOK_URL", "http://example.com")
-    monkeypatch.setattr(app.requests, "post", fake_post)
+    monkeypatch.setattr(core, "SLACK_WEBHOOK_URL", "http://example.com")
+    monkeypatch.setattr(core.requests, "post", fake_post)
 
     # Reset state and configure ignored ship list
-    app._known_mmsi.clear()
-    app._ignored_ships = [{"name": "Amanda", "mmsi": "259032810"}]
+    core._known_mmsi.clear()
+    core._ignored_ships = [{"name": "Amanda", "mmsi": "259032810"}]
 
     ship = {"mmsi": "259032810", "name": "Amanda", "latitude": 1, "longitude": 2}
 
-    app.notify_new_ships([ship])
+    core.notify_new_ships([ship])
 
     assert messages == []
-    assert 259032810 in app._known_mmsi
+    assert 259032810 in core._known_mmsi
+
+
+def _reset_ignored(monkeypatch, path):
+    monkeypatch.setattr(core, "IGNORED_SHIPS_PATH", str(path))
+    monkeypatch.setattr(core, "_ignored_mtime_ns", None)
+    monkeypatch.setattr(core, "_ignored_checked_at", 0.0)
+    monkeypatch.setattr(core, "_ignored_index", None)
+    monkeypatch.setattr(core, "_ignored_ships", [])
+
+
+def test_ignored_ships_hot_reload(monkeypatch, tmp_path):
+    path = tmp_path / "ignored.json"
+    path.write_text(json.dumps({"ignored_ships": [{"name": "Amanda"}]}), encoding="utf-8")
+    _reset_ignored(monkeypatch, path)
+
+    assert core._is_ignored_ship({"name": " AMANDA ", "mmsi": 1})
+    assert not core._is_ignored_ship({"name": "Other", "mmsi": 258015890})
+
+    path.write_text(json.dumps([{"mmsi": "258015890"}]), encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    monkeypatch.setattr(core, "_ignored_checked_at", 0.0)
+
+    assert core._is_ignored_ship({"name": "Other", "mmsi": 258015890})
+    assert not core._is_ignored_ship({"name": "Amanda", "mmsi": 1})
+
+
+def test_invalid_reload_keeps_previous_list(monkeypatch, tmp_path):
+    path = tmp_path / "ignored.json"
+    path.write_text(json.dumps([{"mmsi": 42}]), encoding="utf-8")
+    _reset_ignored(monkeypatch, path)
+    assert core._is_ignored_ship({"mmsi": 42})
+
+    path.write_text("{not json", encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    monkeypatch.setattr(core, "_ignored_checked_at", 0.0)
+    assert core._is_ignored_ship({"mmsi": 42})
+
+
+def test_large_ignore_list_lookup(monkeypatch, tmp_path):
+    path = tmp_path / "ignored.json"
+    entries = [{"name": f"FERRY {i}", "mmsi": str(257000000 + i)} for i in range(50_000)]
+    path.write_text(json.dumps(entries), encoding="utf-8")
+    _reset_ignored(monkeypatch, path)
+
+    index = core._current_ignored_index()
+    assert len(index.mmsis) == 50_000
+    assert core._is_ignored_ship({"name": "ferry 49999"}, index)
+    assert core._is_ignored_ship({"mmsi": 257049999}, index)
+    assert not core._is_ignored_ship({"name": "Cargo", "mmsi": 1}, index)
@@ -0,0 +1,145 @@
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import core
+import metrics
+import poller
+from leader import AdvisoryLeaderLock, Election, FileLeaderLock
+
+
+class Lock:
+    def __init__(self, free=True):
+        self.free = free
+        self.attempts = 0
+
+    def try_acquire(self):
+        self.attempts += 1
+        return self.free
+
+    def release(self):
+        pass
+
+
+def test_file_lock_elects_one_holder(tmp_path):
+    path = str(tmp_path / "locks" / "default.leader")
+    first, second = FileLeaderLock(path), FileLeaderLock(path)
+    assert first.try_acquire() and first.try_acquire()
+    assert not second.try_acquire()
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_lock_is_released_when_the_holder_dies(tmp_path):
+    path = str(tmp_path / "default.leader")
+    code = (
+        "import sys, time\n"
+        "from leader import FileLeaderLock\n"
+        f"assert FileLeaderLock({path!r}).try_acquire()\n"
+        "print('held', flush=True)\n"
+        "time.sleep(30)\n"
+    )
+    root = os.path.dirname(os.path.abspath(core.__file__))
+    holder = subprocess.Popen([sys.executable, "-c", code], cwd=root, stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == "held"
+        standby = FileLeaderLock(path)
+        assert not standby.try_acquire()
+        holder.kill()
+        holder.wait(5)
+        assert standby.try_acquire()
+        standby.release()
+    finally:
+        holder.kill()
+        holder.stdout.close()
+
+
+def test_election_caches_checks_and_takes_over(clock):
+    lock = Lock(free=False)
+    elected = []
+    election = Election(lock, check_interval=10, on_elected=lambda: elected.append(1), clock=clock)
+
+    assert not election.is_leader()
+    assert not election.is_leader()
+    assert lock.attempts == 1
+
+    lock.free = True
+    clock.now += 5
+    assert not election.is_leader()
+    clock.now += 5
+    assert election.is_leader() and election.leader
+    clock.now += 10
+    assert election.is_leader()
+    assert elected == [1] and lock.attempts == 3
+
+
+def test_failed_takeover_gives_the_lock_back(tmp_path):
+    lock = FileLeaderLock(str(tmp_path / "default.leader"))
+
+    def fail():
+        raise RuntimeError("db down")
+
+    assert not Election(lock, on_elected=fail).is_leader()
+    assert FileLeaderLock(lock.path).try_acquire()
+
+
+def test_non_candidates_and_single_processes():
+    lock = Lock()
+    assert not Election(lock, candidate=False).is_leader()
+    assert lock.attempts == 0
+    assert Election(None).is_leader()
+
+
+def test_leader_lock_follows_database_url(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "LEADER_LOCK_DIR", None)
+    monkeypatch.setattr(core, "DATABASE_URL", f"sqlite:///{tmp_path}/seen.db")
+    assert core._leader_lock("default").path == f"{tmp_path}/seen.db.default.leader"
+    monkeypatch.setattr(core, "DATABASE_URL", "sqlite:///:memory:")
+    assert core._leader_lock("default") is None
+    monkeypatch.setattr(core, "DATABASE_URL", "postgresql+psycopg2://u@h/db")
+    assert isinstance(core._leader_lock("default"), AdvisoryLeaderLock)
+    monkeypatch.setattr(core, "LEADER_LOCK_DIR", str(tmp_path))
+    assert core._leader_lock("areas").path == str(tmp_path / "areas.leader")
+
+
+def test_followers_do_not_notify(monkeypatch):
+    notified = []
+    monkeypatch.setattr(core, "notify_new_ships", lambda features: notified.append(features))
+    monkeypatch.setattr(core, "store_positions", lambda features: notified.append(features))
+    geom = {"type": "Polygon", "coordinates": [[[7.0, 62.6], [7.2, 62.6], [7.2, 62.8], [7.0, 62.8], [7.0, 62.6]]]}
+    ship = {"mmsi": 1, "latitude": 62.7, "longitude": 7.1}
+
+    monkeypatch.setattr(core, "_election", Election(Lock(free=False)))
+    assert len(core._collect_ships(geom, [ship])) == 1
+    assert notified == []
+
+    monkeypatch.setattr(core, "_election", Election(Lock()))
+    core._collect_ships(geom, [ship])
+    assert len(notified) == 2
+
+
+def test_new_leader_reloads_seen_set():
+    core.clear_seen_mmsi()
+    core.notify_new_ships([{"mmsi": 111}])
+    # Written by the previous leader while this process was a follower
+    with core._engine.begin() as conn:
+        conn.execute(core._seen_table.insert(), [{"mmsi": 222, "last_seen": datetime.now(timezone.utc)}])
+    core._known_mmsi.discard(111)
+
+    Election(Lock(), on_elected=core._reload_seen_sets).is_leader()
+    assert core._known_mmsi == {111, 222}
+    core.clear_seen_mmsi()
+
+
+def test_poller_stands_by_without_leadership(monkeypatch):
+    def fail():
+        raise AssertionError("standby poller must not poll")
+
+    monkeypatch.setattr(poller, "poll_default_area", fail)
+    monkeypatch.setattr(poller, "cleanup_seen_mmsi", fail)
+    monkeypatch.setattr(core, "_election", Election(Lock(free=False)))
+    standby = metrics.POLL_SECONDS.count(result="standby")
+    poller.main([])
+    assert metrics.POLL_SECONDS.count(result="standby") == standby + 1
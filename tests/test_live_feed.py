@@ -0,0 +1,158 @@
+import json
+
+import pytest
+
+import app
+import core
+from live_feed import FeedFull, SnapshotFeed
+from ship_cache import ShipsCache
+from snapshot_store import SnapshotCache
+from vessel_store import VesselStore
+
+
+def _ship(mmsi, lat=62.0):
+    return {"mmsi": mmsi, "name": "Ship", "latitude": lat, "longitude": 7.0, "shipType": 30}
+
+
+def _parse(message):
+    fields = dict(line.split(": ", 1) for line in message.decode().strip().splitlines())
+    return fields.get("event"), fields.get("id"), json.loads(fields["data"]) if "data" in fields else None
+
+
+def _next_event(events):
+    while True:
+        event, event_id, data = _parse(next(events))
+        if event:
+            return event, event_id, data
+
+
+def test_clients_share_one_refresh_and_get_deltas():
+    store = VesselStore()
+    fleets = [[_ship(1), _ship(2)], [_ship(2, lat=63.0), _ship(3)]]
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        store.apply(fleets[min(len(calls), len(fleets)) - 1])
+
+    feed = SnapshotFeed(store, refresh, interval=60, heartbeat=5)
+    first, second = feed.events(), feed.events()
+    try:
+        event, event_id, data = _next_event(first)
+        assert event == "delta" and event_id == store.token(1)
+        assert sorted(f["mmsi"] for f in data["features"]) == [1, 2]
+        # A client joining later starts from the shared snapshot
+        assert _next_event(second)[0] == "snapshot"
+        assert len(calls) == 1 and feed.subscribers == 2
+
+        refresh()
+        event, event_id, data = _next_event(first)
+        assert event_id == store.token(2) and data["removed"] == [1]
+        assert sorted(f["mmsi"] for f in data["features"]) == [2, 3]
+    finally:
+        feed.stop()
+        first.close()
+        second.close()
+    assert feed.subscribers == 0
+
+
+def test_resume_from_last_event_id_and_heartbeat():
+    store = VesselStore()
+    store.apply([_ship(1)])
+    store.apply([_ship(1), _ship(2)])
+    feed = SnapshotFeed(store, lambda: None, interval=60, heartbeat=0.01)
+    try:
+        resumed = feed.events(last_event_id=store.token(1))
+        event, event_id, data = _next_event(resumed)
+        assert event == "delta" and event_id == store.token(2)
+        assert [f["mmsi"] for f in data["features"]] == [2]
+        assert _next_event(resumed)[0] == "heartbeat"
+        resumed.close()
+
+        # Unknown ids get a full snapshot
+        for last_event_id in (store.token(99), "99", "garbage"):
+            event, _, data = _next_event(feed.events(last_event_id=last_event_id))
+            assert event == "snapshot" and len(data["features"]) == 2
+    finally:
+        feed.stop()
+
+
+def test_reconnect_to_another_worker_gets_a_snapshot():
+    # Two workers polled the same fleet into stores with equal versions
+    worker_a, worker_b = VesselStore(), VesselStore()
+    worker_a.apply([_ship(1)])
+    worker_a.apply([_ship(1), _ship(2)])
+    worker_b.apply([_ship(3)])
+    worker_b.apply([_ship(3), _ship(4)])
+    feed = SnapshotFeed(worker_b, lambda: None, interval=60, heartbeat=5)
+    try:
+        event, event_id, data = _next_event(feed.events(last_event_id=worker_a.token(1)))
+        assert event == "snapshot" and event_id == worker_b.token(2)
+        assert sorted(f["mmsi"] for f in data["features"]) == [3, 4]
+
+        # Even an empty store replaces what the client got from the other worker
+        empty = SnapshotFeed(VesselStore(), lambda: None, interval=60, heartbeat=5)
+        event, _, data = _next_event(empty.events(last_event_id=worker_a.token(2)))
+        assert event == "snapshot" and data["features"] == []
+        empty.stop()
+    finally:
+        feed.stop()
+
+
+def test_subscribers_are_capped_and_slots_freed():
+    feed = SnapshotFeed(VesselStore(), lambda: None, interval=60, heartbeat=5, max_subscribers=2)
+    try:
+        first, second = feed.events(), feed.events()
+        next(first)
+        with pytest.raises(FeedFull):
+            feed.events()
+        assert feed.subscribers == 2
+        # Closed before it sent anything, e.g. a client that went away at once
+        second.close()
+        second.close()
+        third = feed.events()
+        first.close()
+        assert feed.subscribers == 1
+        third.close()
+        assert feed.subscribers == 0
+    finally:
+        feed.stop()
+
+
+@pytest.fixture
+def live_client(monkeypatch):
+    monkeypatch.setattr(core.bw_client, "find_mmsi_in_area", lambda **kwargs: [1])
+    monkeypatch.setattr(core.bw_client, "fetch_latest_combined", lambda mmsi_list: [_ship(1)])
+    monkeypatch.setattr(core, "notify_new_ships", lambda features: None)
+    monkeypatch.setattr(core, "features_in_area", lambda features, geom: features)
+    monkeypatch.setattr(core, "_ships_cache", ShipsCache(ttl=0))
+    monkeypatch.setattr(core, "_snapshots", SnapshotCache(core._install_snapshot))
+    store = VesselStore()
+    monkeypatch.setattr(core, "vessel_store", store)
+    feed = SnapshotFeed(store, core._refresh_default_area, render=app._render_records, interval=60)
+    monkeypatch.setattr(app, "_live_feed", feed)
+    with app.app.test_client() as c:
+        yield c
+    feed.stop()
+
+
+def test_stream_endpoint(live_client):
+    resp = live_client.get("/ships/stream", buffered=False)
+    assert resp.mimetype == "text/event-stream"
+    events = iter(resp.response)
+    event, _, data = _next_event(events)
+    assert event == "delta"
+    assert data["features"][0]["shipType"] == core._ship_type_description(30)
+    resp.close()
+
+
+def test_stream_endpoint_refuses_clients_past_the_cap(live_client):
+    app._live_feed.max_subscribers = 1
+    first = live_client.get("/ships/stream", buffered=False)
+    refused = live_client.get("/ships/stream")
+    assert refused.status_code == 503 and refused.headers["Retry-After"]
+    first.close()
+    assert app._live_feed.subscribers == 0
+    second = live_client.get("/ships/stream", buffered=False)
+    assert second.status_code == 200
+    second.close()
@@ -0,0 +1,105 @@
+import pytest
+import requests
+
+import app
+import core
+import metrics
+import poller
+from barentswatch import BarentsWatchClient
+from conftest import FakeResponse, FakeSession
+from metrics import Registry
+from transport import Transport
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    hist = registry.histogram("op_seconds", "Op time.", ["op"], buckets=(0.1, 1.0))
+    hist.observe(0.05, op="a")
+    hist.observe(0.5, op="a")
+    hist.observe(5, op="a")
+    counter = registry.counter("things_total", "Things.")
+    counter.inc()
+    counter.inc(2)
+
+    text = registry.render()
+    assert "# TYPE op_seconds histogram" in text
+    assert 'op_seconds_bucket{op="a",le="0.1"} 1' in text
+    assert 'op_seconds_bucket{op="a",le="1"} 2' in text
+    assert 'op_seconds_bucket{op="a",le="+Inf"} 3' in text
+    assert 'op_seconds_count{op="a"} 3' in text
+    assert 'op_seconds_sum{op="a"} 5.55' in text
+    assert "things_total 3" in text
+    assert hist.count(op="a") == 3 and counter.value() == 3
+
+
+def test_timer_and_label_validation():
+    hist = Registry().histogram("t_seconds", "T.", ["op"])
+    with hist.time(op="x"):
+        pass
+    assert hist.count(op="x") == 1
+    with pytest.raises(ValueError):
+        hist.observe(1.0)
+
+
+def test_write_and_serve(tmp_path):
+    registry = Registry()
+    registry.counter("polls_total", "Polls.").inc()
+    path = tmp_path / "poller.prom"
+    registry.write(str(path))
+    assert "polls_total 1" in path.read_text()
+
+    server = registry.serve(0, host="127.0.0.1")
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        resp = requests.get(f"{base}/metrics", timeout=5)
+        assert resp.status_code == 200 and "polls_total 1" in resp.text
+        assert resp.headers["Content-Type"] == metrics.CONTENT_TYPE
+        assert requests.get(f"{base}/other", timeout=5).status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_upstream_calls_are_counted():
+    client = BarentsWatchClient(
+        "id",
+        "secret",
+        transport=Transport(
+            FakeSession(
+                FakeResponse(200, [{"mmsi": 1, "latitude": 62.7, "longitude": 7.1}]),
+                FakeResponse(503, "down"),
+            ),
+            max_retries=0,
+        ),
+    )
+    client.token_manager.get_token = lambda: "token"
+    seconds = metrics.UPSTREAM_SECONDS.count(endpoint="latest_combined")
+    errors = metrics.UPSTREAM_ERRORS.value(endpoint="latest_combined")
+    fetched = metrics.VESSELS_FETCHED.value()
+
+    assert len(client.fetch_latest_combined([1])) == 1
+    with pytest.raises(RuntimeError):
+        client.fetch_latest_combined([2])
+
+    assert metrics.UPSTREAM_SECONDS.count(endpoint="latest_combined") == seconds + 2
+    assert metrics.UPSTREAM_ERRORS.value(endpoint="latest_combined") == errors + 1
+    assert metrics.VESSELS_FETCHED.value() == fetched + 1
+
+
+def test_metrics_endpoint():
+    metrics.GEOMETRY_SECONDS.observe(0.001, operation="area")
+    resp = app.app.test_client().get("/metrics")
+    assert resp.status_code == 200
+    assert resp.content_type == metrics.CONTENT_TYPE
+    body = resp.get_data(as_text=True)
+    assert "# TYPE bw_upstream_request_seconds histogram" in body
+    assert 'geometry_seconds_count{operation="area"}' in body
+
+
+def test_poller_writes_metrics_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(poller, "poll_default_area", lambda: 0)
+    monkeypatch.setattr(poller, "cleanup_seen_mmsi", lambda: None)
+    monkeypatch.setattr(core, "cleanup_positions", lambda hours: 0)
+    path = tmp_path / "poller.prom"
+    poller.main(["--metrics-file", str(path)])
+    assert 'poll_seconds_count{result="ok"}' in path.read_text()
@@ -0,0 +1,41 @@
+import json
+import subprocess
+import sys
+
+import core
+from mid_table import ROOT, load_mid_table
+
+
+def test_flag_from_mmsi_uses_precompiled_table():
+    assert core._flag_from_mmsi(257000000) == "🇳🇴 Norway"
+    assert core._flag_from_mmsi(100000000) == "Unknown"
+
+
+def test_table_rebuilt_when_source_changes(tmp_path):
+    source = tmp_path / "mid.json"
+    artifact = tmp_path / "table.json"
+    source.write_text(json.dumps({"mid_to_flag": {"257": "Norway"}}), encoding="utf-8")
+
+    table = load_mid_table(str(source), str(artifact))
+    assert table["257"][:2] == ("Norway", "NO")
+    assert artifact.exists()
+
+    source.write_text(json.dumps({"mid_to_flag": {"257": "Norway", "219": "Denmark"}}), encoding="utf-8")
+    table = load_mid_table(str(source), str(artifact))
+    assert table["219"][:2] == ("Denmark", "DK")
+    assert "219" in json.loads(artifact.read_text(encoding="utf-8"))["mid_table"]
+
+
+def test_pycountry_not_imported_when_artifact_is_fresh():
+    code = "import sys, mid_table; mid_table.load_mid_table(); print('pycountry' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_enrich_features_in_batch():
+    features = [{"shipType": 30}, {"shipType": "70"}, {"shipType": None}, {"shipType": 150}]
+    core._enrich_features(features)
+    assert features[0]["shipType"] == "Fiskefartøy"
+    assert features[1]["shipType"] == core._ship_type_description(70)
+    assert features[2]["shipType"] == "Unknown"
+    assert features[3]["shipType"] == "Unknown"
@@ -0,0 +1,57 @@
+import threading
+
+import poller
+
+
+class RecordingStop(threading.Event):
+    def __init__(self, clock, cycles):
+        super().__init__()
+        self.clock = clock
+        self.cycles = cycles
+        self.waits = []
+
+    def wait(self, timeout=None):
+        self.waits.append(timeout)
+        self.clock.now += timeout
+        if len(self.waits) >= self.cycles:
+            self.set()
+        return self.is_set()
+
+
+def test_daemon_corrects_drift(clock):
+    start = clock.now
+    stop = RecordingStop(clock, cycles=3)
+    starts = []
+
+    def poll_once():
+        starts.append(clock.now)
+        clock.now += 7  # each poll takes 7 s
+
+    poller.run_daemon(poll_once, interval=60, stop=stop, clock=clock)
+    assert [at - start for at in starts] == [0, 60, 120]
+    assert stop.waits == [53, 53, 53]
+
+
+def test_daemon_skips_overrun_cycles(clock):
+    start = clock.now
+    stop = RecordingStop(clock, cycles=2)
+    starts = []
+
+    def poll_once():
+        starts.append(clock.now)
+        clock.now += 130 if len(starts) == 1 else 1
+
+    poller.run_daemon(poll_once, interval=60, stop=stop, clock=clock)
+    assert [at - start for at in starts] == [0, 180]
+
+
+def test_daemon_stops_when_signalled():
+    stop = threading.Event()
+    calls = []
+
+    def poll_once():
+        calls.append(1)
+        stop.set()
+
+    poller.run_daemon(poll_once, interval=3600, stop=stop)
+    assert calls == [1]
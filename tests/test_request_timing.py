@@ -0,0 +1,150 @@
+import time
+
+import pytest
+
+import app
+import core
+import sampling_profiler
+from barentswatch import BarentsWatchClient
+from conftest import FakeResponse, FakeSession
+from request_timing import activate, deactivate, phase, timed_chunks
+from sampling_profiler import SamplingProfiler
+from ship_cache import ShipsCache
+from transport import Transport
+
+SQUARE = {"type": "Polygon", "coordinates": [[[7.0, 62.6], [7.2, 62.6], [7.2, 62.8], [7.0, 62.8], [7.0, 62.6]]]}
+
+
+def _upstream(url, json=None, **kwargs):
+    if "mmsiinarea" in url:
+        return FakeResponse(payload=[1, 2])
+    return FakeResponse(payload=[
+        {"mmsi": mmsi, "name": f"S{mmsi}", "shipType": 30, "latitude": 62.7, "longitude": 7.1}
+        for mmsi in json["mmsi"]
+    ])
+
+
+def _metrics(header):
+    return {part.split(";")[0].strip() for part in header.split(",")}
+
+
+def test_phases_are_recorded_only_inside_a_request():
+    with phase("token"):
+        pass
+    timings, token = activate()
+    try:
+        with phase("token"):
+            pass
+        with phase("token"):
+            pass
+        with phase("custom"):
+            pass
+    finally:
+        deactivate(token)
+    assert [name for name, _ in timings.items()] == ["token", "custom"]
+    header = timings.header()
+    assert header.startswith('token;dur=') and 'desc="token"' in header
+    assert header.split(", ")[-1].startswith("total;dur=")
+
+
+def test_timed_chunks_accumulates_serialization():
+    timings, token = activate()
+    try:
+        chunks = timed_chunks(iter([b"a", b"b"]))
+    finally:
+        deactivate(token)
+    assert list(chunks) == [b"a", b"b"]
+    assert "serialize" in timings.phases
+
+
+def test_post_ships_has_server_timing(monkeypatch):
+    client = BarentsWatchClient("id", "secret", transport=Transport(FakeSession(respond=_upstream)))
+    client.token_manager.get_token = lambda: "token"
+    monkeypatch.setattr(core, "bw_client", client)
+    monkeypatch.setattr(core, "_ships_cache", ShipsCache(ttl=60))
+
+    resp = app.app.test_client().post("/ships", json={"geometry": SQUARE})
+    assert resp.status_code == 200
+    assert resp.get_json()["count"] == 2
+    assert _metrics(resp.headers["Server-Timing"]) == {
+        "geometry", "area", "token", "mmsiinarea", "latest", "notify", "enrich", "total"
+    }
+    resp.close()
+
+
+def test_profiler_keeps_slowest_within_window(clock):
+    profiler = SamplingProfiler(keep=2, window=60, interval=60, clock=clock, timer=clock)
+    kept = []
+    for label, duration in (("a", 0.3), ("b", 0.1), ("c", 0.2), ("d", 0.05)):
+        handle = profiler.begin(label)
+        profiler.sample()
+        clock.now += duration
+        kept.append(profiler.end(handle) is not None)
+
+    assert kept == [True, True, True, False]
+    slowest = profiler.slowest()
+    assert [p.label for p in slowest] == ["a", "c"]
+    folded = slowest[0].folded()
+    assert "test_profiler_keeps_slowest_within_window (test_request_timing.py:" in folded
+    assert folded.rstrip().endswith(" 1")
+
+    clock.now += 61
+    assert profiler.slowest() == []
+
+
+def test_failed_sample_does_not_stop_profiling(monkeypatch):
+    calls = []
+    fold_stack = sampling_profiler.fold_stack
+
+    def flaky_fold_stack(frame):
+        calls.append(1)
+        if len(calls) == 1:
+            raise AttributeError("'dict' object has no attribute 'f_code'")
+        return fold_stack(frame)
+
+    monkeypatch.setattr(sampling_profiler, "fold_stack", flaky_fold_stack)
+    profiler = SamplingProfiler(keep=5, interval=0.001)
+    handle = profiler.begin("first")
+    for _ in range(500):
+        if len(calls) >= 2:
+            break
+        time.sleep(0.002)
+    assert len(calls) >= 2
+    profiler.end(handle)
+    for _ in range(500):
+        if profiler._thread is None:
+            break
+        time.sleep(0.002)
+    assert profiler._thread is None
+
+    handle = profiler.begin("second")
+    time.sleep(0.05)
+    profile = profiler.end(handle)
+    assert profile is not None and profile.samples
+
+
+def test_profile_endpoints_require_admin_token(monkeypatch):
+    profiler = SamplingProfiler(keep=5, interval=0.001)
+    monkeypatch.setattr(app, "_profiler", profiler)
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "secret")
+    client = app.app.test_client()
+
+    client.get("/health").close()
+    assert client.get("/debug/profiles").status_code == 403
+    listing = client.get("/debug/profiles", headers={"X-Admin-Token": "secret"}).get_json()
+    health = next(p for p in listing["profiles"] if p["label"] == "GET /health")
+    folded = client.get(f"/debug/profiles/{health['id']}", headers={"X-Admin-Token": "secret"})
+    assert folded.status_code == 200 and folded.mimetype == "text/plain"
+    missing = client.get("/debug/profiles/999999", headers={"X-Admin-Token": "secret"})
+    assert missing.status_code == 404
+
+
+def test_profile_endpoints_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(app, "_profiler", None)
+    assert app.app.test_client().get("/debug/profiles").status_code == 404
+
+
+@pytest.mark.parametrize("path", ["/health", "/metrics"])
+def test_every_response_has_server_timing(path):
+    resp = app.app.test_client().get(path)
+    assert "total;dur=" in resp.headers["Server-Timing"]
@@ -0,0 +1,87 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+import app
+import core
+import serializers
+from serializers import choose_encoding, compress, iter_geojson, iter_ndjson, iter_ships_json
+from ship_cache import ShipsCache
+from snapshot_store import SnapshotCache
+
+SHIPS = [
+    {"mmsi": 1, "name": "Æsir", "latitude": 62.5, "longitude": 7.1, "shipType": "Fiskefartøy"},
+    {"mmsi": 2, "name": "NoPos", "latitude": None, "longitude": None, "shipType": "Unknown"},
+]
+
+
+def test_json_document_matches_classic_shape(monkeypatch):
+    monkeypatch.setattr(serializers, "CHUNK_FEATURES", 1)
+    body = b"".join(iter_ships_json(iter(SHIPS), 2, 1.5))
+    assert json.loads(body) == {"count": 2, "area_km2": 1.5, "features": SHIPS}
+
+
+def test_geojson_feature_collection():
+    doc = json.loads(b"".join(iter_geojson(SHIPS, 2, 1.5)))
+    assert doc["type"] == "FeatureCollection"
+    assert doc["features"][0]["geometry"] == {"type": "Point", "coordinates": [7.1, 62.5]}
+    assert doc["features"][0]["properties"]["name"] == "Æsir"
+    assert doc["features"][1]["geometry"] is None
+
+
+def test_ndjson_lines():
+    lines = b"".join(iter_ndjson(SHIPS, 2, 1.5)).decode("utf-8").splitlines()
+    assert [json.loads(line)["mmsi"] for line in lines] == [1, 2]
+
+
+@pytest.mark.parametrize(
+    "header,expected",
+    [
+        (None, None),
+        ("gzip, deflate, br", "gzip"),
+        ("deflate", "deflate"),
+        ("gzip;q=0.2, deflate;q=0.8", "deflate"),
+        ("gzip;q=0, identity", None),
+        ("*", "gzip"),
+    ],
+)
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header) == expected
+
+
+def test_compress_round_trip():
+    chunks = [b'{"a":', b"1}"]
+    assert gzip.decompress(b"".join(compress(chunks, "gzip"))) == b'{"a":1}'
+    assert zlib.decompress(b"".join(compress(chunks, "deflate"))) == b'{"a":1}'
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch):
+    monkeypatch.setattr(core.bw_client, "find_mmsi_in_area", lambda **kwargs: [1])
+    monkeypatch.setattr(
+        core.bw_client,
+        "fetch_latest_combined",
+        lambda mmsi_list: [{"mmsi": 1, "name": "A", "latitude": None, "longitude": None, "shipType": 30}],
+    )
+    monkeypatch.setattr(core, "notify_new_ships", lambda features: None)
+    monkeypatch.setattr(core, "_ships_cache", ShipsCache(ttl=60))
+    monkeypatch.setattr(core, "_snapshots", SnapshotCache(core._install_snapshot))
+
+
+def test_ships_endpoint_formats(fake_upstream):
+    with app.app.test_client() as c:
+        geo = c.get("/ships?format=geojson")
+        assert geo.mimetype == "application/geo+json"
+        assert json.loads(geo.data)["type"] == "FeatureCollection"
+
+        nd = c.get("/ships?format=ndjson")
+        assert nd.mimetype == "application/x-ndjson"
+        assert json.loads(nd.data.splitlines()[0])["mmsi"] == 1
+
+        zipped = c.get("/ships", headers={"Accept-Encoding": "gzip"})
+        assert zipped.headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(zipped.data))["count"] == 1
+
+        assert c.get("/ships?format=xml").status_code == 400
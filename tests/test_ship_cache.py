@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+import app
+import core
+from geometry_utils import geometry_hash
+from ship_cache import ShipsCache
+from snapshot_store import SnapshotCache
+
+
+def test_cache_hit_within_ttl_and_expiry(clock):
+    cache = ShipsCache(ttl=10, clock=clock)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_compute("a", compute) == 1
+    clock.now += 5
+    assert cache.get_or_compute("a", compute) == 1
+    clock.now += 5
+    assert cache.get_or_compute("a", compute) == 2
+
+
+def test_cache_lru_eviction(clock):
+    cache = ShipsCache(ttl=60, max_entries=2, clock=clock)
+    cache.get_or_compute("a", lambda: "a")
+    cache.get_or_compute("b", lambda: "b")
+    cache.get_or_compute("a", lambda: "stale")
+    cache.get_or_compute("c", lambda: "c")
+    assert len(cache) == 2
+    assert cache.get_or_compute("a", lambda: "new") == "a"
+    assert cache.get_or_compute("b", lambda: "new") == "new"
+
+
+def test_concurrent_requests_share_one_call():
+    cache = ShipsCache(ttl=60)
+    gate = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        gate.wait(1)
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert calls == [1]
+    assert results == ["value"] * 5
+
+
+def test_failures_are_not_cached():
+    cache = ShipsCache(ttl=60)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", fail)
+    assert cache.get_or_compute("k", lambda: "ok") == "ok"
+
+
+def test_geometry_hash_is_canonical():
+    a = {"type": "Polygon", "coordinates": [[[1, 2], [3, 4], [5, 6], [1, 2]]]}
+    b = {"coordinates": [[[1.0, 2.0], [3.0, 4.0], [5.0, 6.0], [1.0, 2.0]]], "type": "Polygon", "bbox": [1, 2, 5, 6]}
+    assert geometry_hash(a) == geometry_hash(b)
+
+
+def test_get_ships_uses_cache(monkeypatch):
+    calls = []
+
+    def fake_find(polygon_geometry, msgtimefrom, msgtimeto):
+        calls.append("find")
+        return [1]
+
+    def fake_fetch(mmsi_list):
+        calls.append("fetch")
+        return [{"mmsi": 1, "name": "A", "shipType": 30}]
+
+    monkeypatch.setattr(core.bw_client, "find_mmsi_in_area", fake_find)
+    monkeypatch.setattr(core.bw_client, "fetch_latest_combined", fake_fetch)
+    monkeypatch.setattr(core, "notify_new_ships", lambda features: None)
+    monkeypatch.setattr(core, "_ships_cache", ShipsCache(ttl=60))
+    monkeypatch.setattr(core, "_snapshots", SnapshotCache(core._install_snapshot))
+
+    with app.app.test_client() as c:
+        first = c.get("/ships")
+        second = c.get("/ships")
+
+    assert first.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert first.get_json()["features"][0]["shipType"] == "Fiskefartøy"
+    assert calls == ["find", "fetch"]
@@ -1,4 +1,4 @@
-from app import _ship_type_description
+from core import _ship_type_description
 
 
 def test_ship_type_description_known():
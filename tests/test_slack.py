@@ -1,4 +1,4 @@
-import app
+import core
 import poller
 from datetime import datetime, timezone, timedelta
 from sqlalchemy import select
@@ -12,17 +12,17 @@ def test_notify_new_ship(monkeypatch):
             status_code = 200
         return Resp()
 
-    monkeypatch.setattr(app, "SLACK_WEBHOOK_URL", "http://example.com")
-    monkeypatch.setattr(app.requests, "post", fake_post)
-    app._known_mmsi.clear()
-    if app._engine and app._seen_table is not None:
-        with app._engine.begin() as conn:
-            conn.execute(app._seen_table.delete())
+    monkeypatch.setattr(core, "SLACK_WEBHOOK_URL", "http://example.com")
+    monkeypatch.setattr(core.requests, "post", fake_post)
+    core._known_mmsi.clear()
+    if core._engine and core._seen_table is not None:
+        with core._engine.begin() as conn:
+            conn.execute(core._seen_table.delete())
 
 
     ship = {"mmsi": 257000000, "name": "Test", "latitude": 1, "longitude": 2}
-    app.notify_new_ships([ship])
-    app.notify_new_ships([ship])
+    core.notify_new_ships([ship])
+    core.notify_new_ships([ship])
 
     assert len(messages) == 1
     msg = messages[0]
@@ -41,37 +41,37 @@ def test_persistence_across_runs(monkeypatch, tmp_path):
         return Resp()
 
     db_url = f"sqlite:///{tmp_path}/seen.db"
-    monkeypatch.setattr(app, "DATABASE_URL", db_url)
-    monkeypatch.setattr(app, "SLACK_WEBHOOK_URL", "http://example.com")
-    monkeypatch.setattr(app.requests, "post", fake_post)
+    monkeypatch.setattr(core, "DATABASE_URL", db_url)
+    monkeypatch.setattr(core, "SLACK_WEBHOOK_URL", "http://example.com")
+    monkeypatch.setattr(core.requests, "post", fake_post)
 
     # Reset app DB state
-    app._known_mmsi.clear()
-    app._engine = None
-    app._seen_table = None
-    app._init_db()
+    core._known_mmsi.clear()
+    core._engine = None
+    core._seen_table = None
+    core._init_db()
 
     ship = {"mmsi": "999", "name": "Persist", "latitude": 1, "longitude": 2}
-    app.notify_new_ships([ship])
+    core.notify_new_ships([ship])
 
     # Simulate new process by clearing in-memory set and reloading from DB
-    app._known_mmsi.clear()
-    app._init_db()
-    app.notify_new_ships([ship])
+    core._known_mmsi.clear()
+    core._init_db()
+    core.notify_new_ships([ship])
 
     assert len(messages) == 1
 
 
 def test_last_seen_and_cleanup(monkeypatch, tmp_path):
     db_url = f"sqlite:///{tmp_path}/seen.db"
-    monkeypatch.setattr(app, "DATABASE_URL", db_url)
-    monkeypatch.setattr(app, "SLACK_WEBHOOK_URL", "http://example.com")
+    monkeypatch.setattr(core, "DATABASE_URL", db_url)
+    monkeypatch.setattr(core, "SLACK_WEBHOOK_URL", "http://example.com")
 
     # Reset app DB state
-    app._known_mmsi.clear()
-    app._engine = None
-    app._seen_table = None
-    app._init_db()
+    core._known_mmsi.clear()
+    core._engine = None
+    core._seen_table = None
+    core._init_db()
 
     class FakeResp:
         status_code = 200
@@ -79,7 +79,7 @@ def test_last_seen_and_cleanup(monkeypatch, tmp_path):
     def fake_post(url, json, timeout):
         return FakeResp()
 
-    monkeypatch.setattr(app.requests, "post", fake_post)
+    monkeypatch.setattr(core.requests, "post", fake_post)
 
     ship = {"mmsi": 555, "name": "Time", "latitude": 1, "longitude": 2}
 
@@ -96,31 +96,31 @@ def test_last_seen_and_cleanup(monkeypatch, tmp_path):
         def now(cls, tz=None):
             return t2
 
-    monkeypatch.setattr(app, "datetime", FakeDT1)
-    app.notify_new_ships([ship])
-    with app._engine.begin() as conn:
+    monkeypatch.setattr(core, "datetime", FakeDT1)
+    core.notify_new_ships([ship])
+    with core._engine.begin() as conn:
         first_seen = conn.execute(
-            select(app._seen_table.c.last_seen)
+            select(core._seen_table.c.last_seen)
         ).fetchone()[0]
     assert first_seen == t1.replace(tzinfo=None)
 
-    monkeypatch.setattr(app, "datetime", FakeDT2)
-    app.notify_new_ships([ship])
-    with app._engine.begin() as conn:
+    monkeypatch.setattr(core, "datetime", FakeDT2)
+    core.notify_new_ships([ship])
+    with core._engine.begin() as conn:
         second_seen = conn.execute(
-            select(app._seen_table.c.last_seen)
+            select(core._seen_table.c.last_seen)
         ).fetchone()[0]
     assert second_seen == t2.replace(tzinfo=None)
 
     old_time = t2 - timedelta(hours=48)
-    with app._engine.begin() as conn:
+    with core._engine.begin() as conn:
         conn.execute(
-            app._seen_table.insert().values(mmsi=999, last_seen=old_time)
+            core._seen_table.insert().values(mmsi=999, last_seen=old_time)
         )
     monkeypatch.setattr(poller, "datetime", FakeDT2)
     poller.cleanup_seen_mmsi(max_age_hours=24)
-    with app._engine.begin() as conn:
-        rows = conn.execute(select(app._seen_table.c.mmsi)).fetchall()
+    with core._engine.begin() as conn:
+        rows = conn.execute(select(core._seen_table.c.mmsi)).fetchall()
         mmsis = {r[0] for r in rows}
     assert 555 in mmsis and 999 not in mmsis
 
@@ -135,27 +135,58 @@ def test_remove_ship_when_leaving(monkeypatch, tmp_path):
         return Resp()
 
     db_url = f"sqlite:///{tmp_path}/seen.db"
-    monkeypatch.setattr(app, "DATABASE_URL", db_url)
-    monkeypatch.setattr(app, "SLACK_WEBHOOK_URL", "http://example.com")
-    monkeypatch.setattr(app.requests, "post", fake_post)
+    monkeypatch.setattr(core, "DATABASE_URL", db_url)
+    monkeypatch.setattr(core, "SLACK_WEBHOOK_URL", "http://example.com")
+    monkeypatch.setattr(core.requests, "post", fake_post)
 
     # Reset app DB state
-    app._known_mmsi.clear()
-    app._engine = None
-    app._seen_table = None
-    app._init_db()
+    core._known_mmsi.clear()
+    core._engine = None
+    core._seen_table = None
+    core._init_db()
 
     ship = {"mmsi": 321, "name": "Leave", "latitude": 1, "longitude": 2}
 
-    app.notify_new_ships([ship])
+    core.notify_new_ships([ship])
     assert len(messages) == 1
 
-    app.notify_new_ships([])
-    assert 321 not in app._known_mmsi
-    if app._engine and app._seen_table is not None:
-        with app._engine.begin() as conn:
-            rows = conn.execute(select(app._seen_table.c.mmsi)).fetchall()
+    core.notify_new_ships([])
+    assert 321 not in core._known_mmsi
+    if core._engine and core._seen_table is not None:
+        with core._engine.begin() as conn:
+            rows = conn.execute(select(core._seen_table.c.mmsi)).fetchall()
             assert 321 not in {r[0] for r in rows}
 
-    app.notify_new_ships([ship])
+    core.notify_new_ships([ship])
     assert len(messages) == 2
+
+
+def test_seen_mmsi_written_in_one_transaction(monkeypatch, tmp_path):
+    db_url = f"sqlite:///{tmp_path}/seen.db"
+    monkeypatch.setattr(core, "DATABASE_URL", db_url)
+    monkeypatch.setattr(core, "SLACK_WEBHOOK_URL", None)
+
+    core._known_mmsi.clear()
+    core._engine = None
+    core._seen_table = None
+    core._init_db()
+
+    begins = []
+    engine = core._engine
+    original_begin = engine.begin
+
+    class CountingEngine:
+        def begin(self):
+            begins.append(1)
+            return original_begin()
+
+    monkeypatch.setattr(core, "_engine", CountingEngine())
+
+    fleet = [{"mmsi": m, "name": f"S{m}"} for m in range(1000, 1200)]
+    core.notify_new_ships(fleet)
+    core.notify_new_ships(fleet[:150])
+
+    assert len(begins) == 2
+    with engine.begin() as conn:
+        rows = conn.execute(select(core._seen_table.c.mmsi)).fetchall()
+    assert {r[0] for r in rows} == set(range(1000, 1150))
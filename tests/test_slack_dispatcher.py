@@ -0,0 +1,180 @@
+import threading
+from datetime import timedelta
+
+from sqlalchemy import create_engine
+
+import core
+from conftest import FakeResponse
+from slack_notifier import SlackDispatcher, SqlOutbox, TokenBucket
+
+
+def test_queued_notifications_are_batched_per_webhook():
+    sent = []
+    gate = threading.Event()
+
+    def send(url, text):
+        gate.wait(1)
+        sent.append((url, text))
+        return FakeResponse()
+
+    dispatcher = SlackDispatcher(send, rate=1000, burst=1000)
+    dispatcher.submit("http://a", "first")
+    for text in ["second", "third"]:
+        dispatcher.submit("http://a", text)
+    dispatcher.submit("http://b", "other")
+    gate.set()
+    assert dispatcher.flush(2)
+    dispatcher.stop()
+
+    to_a = [text for url, text in sent if url == "http://a"]
+    assert len(to_a) <= 2
+    assert "\n".join(to_a) == "first\nsecond\nthird"
+    assert ("http://b", "other") in sent
+
+
+def test_retries_honour_retry_after_and_backoff():
+    responses = [FakeResponse(429, headers={"Retry-After": "7"}), FakeResponse(503), FakeResponse(200)]
+    sleeps = []
+    dispatcher = SlackDispatcher(
+        lambda url, text: responses.pop(0),
+        rate=1000,
+        burst=1000,
+        backoff=2,
+        sleep=sleeps.append,
+    )
+    assert dispatcher._deliver("http://a", "x") is True
+    assert sleeps[0] == 7
+    assert 2 <= sleeps[1] <= 4
+    assert responses == []
+
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def send(url, text):
+        calls.append(1)
+        return FakeResponse(404)
+
+    dispatcher = SlackDispatcher(send, rate=1000, burst=1000, sleep=lambda s: None)
+    assert dispatcher._deliver("http://a", "x") is False
+    assert calls == [1]
+
+
+def test_token_bucket_limits_rate():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2, capacity=1, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        bucket.acquire()
+    assert sleeps == [0.5, 0.5]
+
+
+def test_outbox_replayed_after_restart(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/outbox.db")
+    outbox = SqlOutbox(lambda: engine)
+    outbox.add("http://a", "left over")
+
+    sent = []
+    dispatcher = SlackDispatcher(
+        lambda url, text: sent.append(text) or FakeResponse(),
+        outbox=outbox,
+        rate=1000,
+        burst=1000,
+        replay_after=timedelta(0),
+    )
+    dispatcher.start()
+    assert dispatcher.flush(2)
+    dispatcher.stop()
+
+    assert sent == ["left over"]
+    assert outbox.pending() == []
+
+
+def test_notify_new_ships_async(monkeypatch):
+    posts = []
+
+    def fake_post(url, json, timeout):
+        posts.append(json["text"])
+        return FakeResponse()
+
+    dispatcher = SlackDispatcher(core._post_slack, rate=1000, burst=1000)
+    monkeypatch.setattr(core, "SLACK_WEBHOOK_URL", "http://example.com")
+    monkeypatch.setattr(core, "SLACK_ASYNC", True)
+    monkeypatch.setattr(core, "_slack", dispatcher)
+    monkeypatch.setattr(core.requests, "post", fake_post)
+    core._known_mmsi.clear()
+
+    core.notify_new_ships([
+        {"mmsi": 257000001, "name": "One"},
+        {"mmsi": 257000002, "name": "Two"},
+    ])
+    assert dispatcher.flush(2)
+    dispatcher.stop()
+
+    assert len(posts) == 1
+    assert "One" in posts[0] and "Two" in posts[0]
+
+
+def test_outage_keeps_notifications_until_slack_recovers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/outbox.db")
+    outbox = SqlOutbox(lambda: engine)
+    up = threading.Event()
+    sent = []
+
+    def send(url, text):
+        if not up.is_set():
+            return FakeResponse(503)
+        sent.append(text)
+        return FakeResponse()
+
+    dispatcher = SlackDispatcher(
+        send,
+        outbox=outbox,
+        rate=1000,
+        burst=1000,
+        max_retries=1,
+        replay_after=timedelta(0),
+        sleep=lambda s: None,
+    )
+    dispatcher.submit("http://a", "during outage")
+    assert dispatcher.flush(2)
+    assert [item.text for item in outbox.pending()] == ["during outage"]
+
+    # The idle worker retries what is left in the outbox
+    up.set()
+    for _ in range(300):
+        if sent:
+            break
+        threading.Event().wait(0.01)
+    assert dispatcher.flush(2)
+    dispatcher.stop()
+    assert sent == ["during outage"]
+    assert outbox.pending() == []
+
+
+def test_new_leader_replays_the_outbox(tmp_path, monkeypatch):
+    from leader import Election
+
+    engine = create_engine(f"sqlite:///{tmp_path}/outbox.db")
+    outbox = SqlOutbox(lambda: engine)
+    outbox.add("http://a", "left by the previous leader")
+    sent = []
+    dispatcher = SlackDispatcher(
+        lambda url, text: sent.append(text) or FakeResponse(),
+        outbox=outbox,
+        rate=1000,
+        burst=1000,
+        replay_after=timedelta(0),
+    )
+    monkeypatch.setattr(core, "SLACK_ASYNC", True)
+    monkeypatch.setattr(core, "_slack", dispatcher)
+
+    assert Election(None, on_elected=core._take_over).is_leader()
+    assert dispatcher.flush(2)
+    dispatcher.stop()
+    assert sent == ["left by the previous leader"]
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import core
+import poller
+from sliding_window import SlidingWindow, SqlWindowStore
+
+T0 = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def test_window_queries_delta_and_expires():
+    window = SlidingWindow("s", window=timedelta(hours=1), overlap=timedelta(minutes=1))
+    assert window.next_query_start(T0) == T0 - timedelta(hours=1)
+    window.record([1, 2], T0)
+
+    t1 = T0 + timedelta(minutes=5)
+    assert window.next_query_start(t1) == T0 - timedelta(minutes=1)
+    window.record([2, 3], t1)
+    assert sorted(window.mmsis()) == [1, 2, 3]
+
+    t2 = T0 + timedelta(minutes=62)
+    window.record([], t2)
+    assert sorted(window.mmsis()) == [2, 3]
+
+
+def test_window_persists_between_runs(tmp_path):
+    from sqlalchemy import create_engine
+
+    engine = create_engine(f"sqlite:///{tmp_path}/window.db")
+    store = SqlWindowStore(lambda: engine)
+    first = SlidingWindow("area", store=store)
+    first.load()
+    first.record([5, 6], T0)
+    first.save()
+
+    second = SlidingWindow("area", store=store)
+    second.load()
+    assert second.last_query_to == T0
+    assert second.last_in_area == {5: T0, 6: T0}
+
+
+def test_poller_asks_only_for_delta(monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "DATABASE_URL", f"sqlite:///{tmp_path}/seen.db")
+    monkeypatch.setattr(core, "SLACK_WEBHOOK_URL", None)
+    core._known_mmsi.clear()
+    core._engine = None
+    core._seen_table = None
+    core._init_db()
+    poller._windows.clear()
+
+    times = iter([T0, T0 + timedelta(minutes=2)])
+
+    class FakeDT:
+        @classmethod
+        def now(cls, tz=None):
+            return next(times)
+
+    queries = []
+    fetched = []
+
+    def fake_find(polygon_geometry, msgtimefrom, msgtimeto):
+        queries.append((msgtimefrom, msgtimeto))
+        return [1] if len(queries) == 1 else [2]
+
+    def fake_fetch(mmsi_list):
+        fetched.append(sorted(mmsi_list))
+        return []
+
+    monkeypatch.setattr(poller, "datetime", FakeDT)
+    monkeypatch.setattr(poller.bw_client, "find_mmsi_in_area", fake_find)
+    monkeypatch.setattr(poller.bw_client, "fetch_latest_combined", fake_fetch)
+
+    poller.poll_default_area()
+    poller._windows.clear()  # simulate a new one-shot run
+    poller.poll_default_area()
+
+    assert queries[0] == (T0 - timedelta(hours=1), T0)
+    assert queries[1] == (T0 - timedelta(minutes=1), T0 + timedelta(minutes=2))
+    assert fetched == [[1], [1, 2]]
+
+
+def test_window_saves_only_the_delta(tmp_path):
+    from sqlalchemy import create_engine, event
+
+    engine = create_engine(f"sqlite:///{tmp_path}/window.db")
+    store = SqlWindowStore(lambda: engine)
+    window = SlidingWindow("area", store=store)
+    window.load()
+    window.record(range(1000), T0)
+    window.save()
+
+    written = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if "poller_window" in statement and not statement.startswith("SELECT"):
+            written.append(len(parameters) if executemany else 1)
+
+    t1 = T0 + timedelta(minutes=61)
+    window.record([1, 5000], t1)
+    window.save()
+    # One bulk delete of the expired vessels, one upsert of the two reported
+    assert written == [1, 2]
+
+    reloaded = SlidingWindow("area", store=store)
+    reloaded.load()
+    assert reloaded.last_in_area == {1: t1, 5000: t1}
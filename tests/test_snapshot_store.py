@@ -0,0 +1,141 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+
+import app
+import core
+from ship_cache import ShipsCache
+from snapshot_store import FileSnapshotStore, Snapshot, SnapshotCache, SqlSnapshotStore
+
+
+def test_stale_snapshot_is_served_while_refreshing(clock):
+    cache = SnapshotCache(len, stale_after=60, clock=clock)
+    assert cache.get("area", lambda: [1, 2]).value == 2
+
+    release = threading.Event()
+    calls = []
+
+    def slow_refresh():
+        calls.append(1)
+        release.wait(5)
+        return [1, 2, 3]
+
+    clock.now += 30
+    assert cache.get("area", slow_refresh).value == 2
+    assert not calls
+
+    clock.now += 60
+    # Stale: served immediately while one refresh runs in the background
+    assert cache.get("area", slow_refresh).value == 2
+    assert cache.get("area", slow_refresh).value == 2
+    release.set()
+    for _ in range(100):
+        if cache.get("area", slow_refresh).value == 3:
+            break
+        threading.Event().wait(0.01)
+    assert cache.get("area", slow_refresh).value == 3
+    assert calls == [1]
+
+
+def test_first_requests_share_one_refresh(clock):
+    cache = SnapshotCache(len, stale_after=60, clock=clock)
+    release = threading.Event()
+    calls = []
+
+    def slow_refresh():
+        calls.append(1)
+        release.wait(5)
+        return [1, 2]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("area", slow_refresh).value)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for _ in range(100):
+        if calls:
+            break
+        threading.Event().wait(0.01)
+    # Give the other requests time to reach the cache while the first one waits
+    threading.Event().wait(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [2, 2, 2, 2] and calls == [1]
+
+
+def test_failed_refresh_keeps_stale_snapshot(clock):
+    cache = SnapshotCache(len, stale_after=60, clock=clock)
+    cache.get("area", lambda: [1])
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    clock.now += 120
+    assert cache.get("area", fail).value == 1
+    with pytest.raises(RuntimeError):
+        SnapshotCache(len).get("other", fail)
+
+
+@pytest.mark.parametrize("kind", ["file", "sql"])
+def test_snapshots_are_shared_through_the_store(kind, tmp_path, clock):
+    if kind == "file":
+        store = FileSnapshotStore(str(tmp_path / "snapshots"))
+    else:
+        engine = create_engine(f"sqlite:///{tmp_path / 'snap.db'}")
+        store = SqlSnapshotStore(lambda: engine)
+    poller = SnapshotCache(len, store, clock=clock)
+    web = SnapshotCache(len, store, check_interval=0, clock=clock)
+
+    poller.publish("area", [{"mmsi": 1}])
+    assert web.get("area", lambda: pytest.fail("should not refresh")).value == 1
+    assert store.load("area", newer_than=clock.now) is None
+
+    clock.now += 10
+    poller.publish("area", [{"mmsi": 1}, {"mmsi": 2}])
+    assert store.load("area") == Snapshot([{"mmsi": 1}, {"mmsi": 2}], clock.now)
+    assert web.get("area", lambda: []).value == 2
+
+
+def test_followers_leave_revalidation_to_the_leader(tmp_path, clock):
+    store = FileSnapshotStore(str(tmp_path / "snapshots"))
+    leading = [False]
+    follower = SnapshotCache(len, store, stale_after=60, check_interval=0, clock=clock, leader=lambda: leading[0])
+
+    # Nothing published yet: bootstrap locally, but do not publish
+    assert follower.get("area", lambda: [1]).value == 1
+    assert store.load("area") is None
+
+    clock.now += 90
+    assert follower.get("area", lambda: pytest.fail("leader refreshes")).value == 1
+
+    # The leader stopped publishing: refresh locally after all
+    clock.now += 40
+    refreshed = threading.Event()
+
+    def refresh():
+        refreshed.set()
+        return [1, 2]
+
+    follower.get("area", refresh)
+    assert refreshed.wait(5)
+    assert store.load("area") is None
+
+
+def test_ships_served_from_snapshot_with_age(monkeypatch):
+    def fail(**kwargs):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(core.bw_client, "find_mmsi_in_area", fail)
+    monkeypatch.setattr(core, "_ships_cache", ShipsCache(ttl=0))
+    monkeypatch.setattr(core, "_snapshots", SnapshotCache(core._install_snapshot, stale_after=60))
+    with app.app.test_client() as c:
+        assert c.get("/ships").status_code == 502
+
+        taken_at = core.time.time() - 120
+        core._snapshots.publish(core._load_default_area().key, [{"mmsi": 1, "shipType": 30}], taken_at)
+        resp = c.get("/ships")
+    assert resp.status_code == 200
+    assert resp.get_json()["count"] == 1
+    assert int(resp.headers["Age"]) >= 120
+    assert resp.headers["X-Snapshot-Stale"] == "1"
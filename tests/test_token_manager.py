@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from token_manager import FileTokenStore, SqlTokenStore, TokenManager
+
+
+def test_single_flight_refresh():
+    calls = []
+    gate = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        gate.wait(1)
+        return "tok", 3600
+
+    manager = TokenManager(fetch)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(manager.get_token()))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    manager.close()
+
+    assert len(calls) == 1
+    assert results == ["tok"] * 8
+
+
+def test_token_near_expiry_is_served_while_refreshing(clock):
+    tokens = iter([("old", 600), ("new", 600)])
+    refreshed = threading.Event()
+
+    def fetch():
+        token = next(tokens)
+        if token[0] == "new":
+            refreshed.set()
+        return token
+
+    manager = TokenManager(fetch, refresh_margin=120, clock=clock)
+    assert manager.get_token() == "old"
+
+    clock.now += 500  # inside refresh margin, still valid
+    assert manager.get_token() == "old"
+    assert refreshed.wait(1)
+    for _ in range(100):
+        if manager.get_token() == "new":
+            break
+        time.sleep(0.01)
+    manager.close()
+    assert manager.get_token() == "new"
+
+
+def test_file_store_shares_token_between_managers(tmp_path):
+    store_path = str(tmp_path / "token.json")
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return "shared", 3600
+
+    first = TokenManager(fetch, store=FileTokenStore(store_path))
+    second = TokenManager(fetch, store=FileTokenStore(store_path))
+    assert first.get_token() == "shared"
+    assert second.get_token() == "shared"
+    first.close()
+    second.close()
+    assert len(calls) == 1
+
+
+def test_sql_store_round_trip(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/token.db")
+    store = SqlTokenStore(lambda: engine)
+    assert store.load() is None
+    store.save("abc", 1234.0)
+    store.save("def", 5678.0)
+    assert store.load() == ("def", 5678.0)
+
+
+def test_rejected_token_is_replaced_and_shared(tmp_path):
+    store_path = str(tmp_path / "token.json")
+    tokens = iter([("old", 3600), ("new", 3600)])
+    first = TokenManager(lambda: next(tokens), store=FileTokenStore(store_path))
+    second = TokenManager(lambda: pytest.fail("second must adopt the new token"), store=FileTokenStore(store_path))
+    assert first.get_token() == second.get_token() == "old"
+
+    first.invalidate("old")
+    assert first.get_token() == "new"
+    # A stale 401 from before the renewal keeps the new token
+    first.invalidate("old")
+    assert first.get_token() == "new"
+    second.invalidate("old")
+    assert second.get_token() == "new"
+    first.close()
+    second.close()
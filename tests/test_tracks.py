@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+import app
+import core
+
+
+def _init(monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "DATABASE_URL", f"sqlite:///{tmp_path}/seen.db")
+    core._known_mmsi.clear()
+    core._engine = None
+    core._seen_table = None
+    core._init_db()
+
+
+def _count():
+    with core._engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(core._positions_table)).scalar()
+
+
+def test_store_positions_suppresses_duplicates(monkeypatch, tmp_path):
+    _init(monkeypatch, tmp_path)
+    features = [
+        {"mmsi": 1, "latitude": 62.5, "longitude": 7.1, "msgtime": "2024-01-01T00:00:00Z"},
+        {"mmsi": 1, "latitude": 62.6, "longitude": 7.2, "msgtime": "2024-01-01T00:05:00+00:00"},
+        {"mmsi": 2, "latitude": None, "longitude": 7.2, "msgtime": "2024-01-01T00:05:00Z"},
+        {"mmsi": 3, "latitude": 62.0, "longitude": 7.0, "msgtime": "not a time"},
+    ]
+    assert core.store_positions(features) == 2
+    core.store_positions(features)
+    assert _count() == 2
+
+
+def test_track_endpoint_and_retention(monkeypatch, tmp_path):
+    _init(monkeypatch, tmp_path)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    core.store_positions([
+        {"mmsi": 7, "latitude": 62.0 + i / 100, "longitude": 7.0, "msgtime": (now - timedelta(hours=i)).isoformat()}
+        for i in range(5)
+    ] + [{"mmsi": 7, "latitude": 61.0, "longitude": 7.0, "msgtime": (now - timedelta(days=30)).isoformat()}])
+
+    client = app.app.test_client()
+    res = client.get("/tracks/7")
+    data = res.get_json()
+    assert res.status_code == 200
+    assert data["count"] == 5
+    times = [p["msgtime"] for p in data["positions"]]
+    assert times == sorted(times)
+
+    since = (now - timedelta(hours=1, minutes=30)).isoformat()
+    res = client.get("/tracks/7", query_string={"from": since})
+    assert res.get_json()["count"] == 2
+
+    assert client.get("/tracks/7?from=yesterday").status_code == 400
+
+    core.cleanup_positions(max_age_hours=24 * 7)
+    assert _count() == 5
@@ -0,0 +1,108 @@
+from datetime import datetime, timezone
+
+import pytest
+import requests
+
+from conftest import FakeResponse, FakeSession
+from transport import CircuitBreaker, CircuitOpenError, Transport, parse_retry_after
+
+
+def _transport(session, sleeps, **kwargs):
+    return Transport(session, sleep=sleeps.append, **kwargs)
+
+
+def test_retries_transient_failures_with_backoff():
+    session = FakeSession(requests.ConnectionError("reset"), FakeResponse(503), FakeResponse(200))
+    sleeps = []
+    transport = _transport(session, sleeps, backoff=1.0, connect_timeout=2, read_timeout=20)
+    assert transport.post("https://bw").status_code == 200
+    assert 0.5 <= sleeps[0] <= 1.0 and 1.0 <= sleeps[1] <= 2.0
+    assert session.timeouts == [(2, 20)] * 3
+
+
+def test_honours_retry_after_and_gives_up_on_long_waits():
+    sleeps = []
+    session = FakeSession(FakeResponse(429, headers={"Retry-After": "3"}), FakeResponse(200))
+    assert _transport(session, sleeps).post("https://bw").status_code == 200
+    assert sleeps == [3.0]
+
+    session = FakeSession(FakeResponse(429, headers={"Retry-After": "600"}))
+    assert _transport(session, sleeps, max_retry_after=30).post("https://bw").status_code == 429
+
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert parse_retry_after("Mon, 01 Jan 2024 00:00:10 GMT", now) == 10.0
+    assert parse_retry_after("soon") is None
+
+
+def test_client_errors_are_not_retried():
+    session = FakeSession(FakeResponse(400))
+    sleeps = []
+    assert _transport(session, sleeps).post("https://bw").status_code == 400
+    assert sleeps == []
+
+
+def test_last_failure_is_returned_or_raised():
+    sleeps = []
+    session = FakeSession(*[FakeResponse(502)] * 3)
+    assert _transport(session, sleeps, max_retries=2).post("https://bw").status_code == 502
+    session = FakeSession(*[requests.ConnectTimeout("unreachable")] * 2)
+    with pytest.raises(requests.ConnectTimeout):
+        _transport(session, sleeps, max_retries=1).post("https://bw")
+    assert session.outcomes == []
+
+
+def test_read_timeouts_are_not_retried():
+    sleeps = []
+    session = FakeSession(requests.ReadTimeout("slow"), FakeResponse(200))
+    with pytest.raises(requests.ReadTimeout):
+        _transport(session, sleeps).post("https://bw")
+    assert sleeps == [] and len(session.outcomes) == 1
+
+
+def test_deadline_caps_attempts_and_waits(clock):
+    start = clock.now
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock.now += seconds
+
+    class SlowSession(FakeSession):
+        def post(self, url, timeout=None, **kwargs):
+            # Each answer takes 4 s, unless the timeout is shorter
+            clock.now += min(4, timeout[1])
+            return super().post(url, timeout=timeout, **kwargs)
+
+    sleeps = []
+    session = SlowSession(*[FakeResponse(503)] * 10)
+    transport = Transport(
+        session, max_retries=9, backoff=1.0, max_backoff=1.0, read_timeout=60, deadline=10, sleep=sleep, clock=clock
+    )
+    assert transport.post("https://bw").status_code == 503
+    # Later attempts only get what is left of the 10 s, never the 60 s read timeout
+    assert session.timeouts[0] == (5, 10)
+    assert all(later[1] < 6.5 for later in session.timeouts[1:])
+    assert len(session.timeouts) <= 3 and clock.now - start <= 10
+
+
+def test_circuit_breaker_fails_fast_then_recovers(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    session = FakeSession(FakeResponse(500), FakeResponse(500), FakeResponse(500), FakeResponse(200))
+    transport = _transport(session, [], max_retries=5, breaker=breaker)
+
+    # Retries stop as soon as the breaker opens
+    with pytest.raises(CircuitOpenError):
+        transport.post("https://bw")
+    assert len(session.timeouts) == 2 and breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        transport.post("https://bw")
+    assert len(session.timeouts) == 2
+
+    # One failed trial re-opens it, a successful one closes it
+    clock.now += 30
+    assert breaker.state == "half-open"
+    with pytest.raises(CircuitOpenError):
+        transport.post("https://bw")
+    assert len(session.timeouts) == 3
+    clock.now += 30
+    assert transport.post("https://bw").status_code == 200
+    assert breaker.state == "closed"
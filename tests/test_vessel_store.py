@@ -0,0 +1,126 @@
+import json
+
+import pytest
+
+import app
+import core
+from ship_cache import ShipsCache
+from snapshot_store import SnapshotCache
+from vessel_store import VesselState, VesselStore
+
+
+def _ship(mmsi, lat=62.0, name="Ship"):
+    return {"mmsi": mmsi, "name": name, "latitude": lat, "longitude": 7.0, "msgtime": "2024-01-01T00:00:00Z", "shipType": 30}
+
+
+def test_apply_reports_delta_and_bumps_version():
+    store = VesselStore()
+    delta = store.apply([_ship(1), _ship(2)])
+    assert delta.added == [1, 2] and not delta.updated and not delta.removed
+    assert store.version == 1
+
+    delta = store.apply([_ship(1), _ship(2)])
+    assert not delta
+    assert store.version == 1
+
+    delta = store.apply([_ship(2, lat=62.1), _ship("3")])
+    assert delta.added == [3] and delta.updated == [2] and delta.removed == [1]
+    assert store.version == 2
+    assert sorted(store.mmsis()) == [2, 3]
+
+
+def test_views_survive_later_updates():
+    store = VesselStore()
+    store.apply([_ship(1), _ship(2)])
+    view = store.view()
+    store.apply([_ship(3)])
+    assert sorted(r.mmsi for r in view) == [1, 2]
+    assert [r.mmsi for r in store.view()] == [3]
+
+
+def test_records_are_compact():
+    record = VesselState.from_feature(1, _ship(1), 1)
+    assert not hasattr(record, "__dict__")
+    assert record.to_feature() == {**_ship(1), "destination": None, "length": None}
+
+
+def test_changes_since_uses_versions_and_tombstones():
+    store = VesselStore(max_tombstones=2)
+    store.apply([_ship(1), _ship(2), _ship(3)])
+    store.apply([_ship(1, lat=63.0), _ship(2)])
+    changes = store.changes_since(1)
+    assert [r.mmsi for r in changes.changed] == [1]
+    assert changes.removed == [3]
+    assert changes.version == 2
+    assert store.changes_since(2).changed == [] and store.changes_since(2).removed == []
+    assert store.changes_since(5) is None
+
+    # Re-added vessels lose their tombstone
+    store.apply([_ship(1, lat=63.0), _ship(2), _ship(3)])
+    assert store.changes_since(1).removed == []
+
+    store.apply([_ship(2), _ship(3)])
+    store.apply([_ship(3)])
+    store.apply([])
+    # Only the newest two removals are kept, so the removal in version 4 is lost
+    assert store.changes_since(3) is None
+    assert sorted(store.changes_since(4).removed) == [2, 3]
+
+
+@pytest.fixture
+def ships_client(monkeypatch):
+    monkeypatch.setattr(core.bw_client, "find_mmsi_in_area", lambda **kwargs: [1, 2])
+    monkeypatch.setattr(core.bw_client, "fetch_latest_combined", lambda mmsi_list: [_ship(1), _ship(2)])
+    monkeypatch.setattr(core, "notify_new_ships", lambda features: None)
+    monkeypatch.setattr(core, "features_in_area", lambda features, geom: features)
+    monkeypatch.setattr(core, "_ships_cache", ShipsCache(ttl=0))
+    monkeypatch.setattr(core, "_snapshots", SnapshotCache(core._install_snapshot))
+    monkeypatch.setattr(core, "vessel_store", VesselStore())
+    with app.app.test_client() as c:
+        yield c
+
+
+def test_ships_etag_and_since(ships_client):
+    c = ships_client
+    first = c.get("/ships")
+    etag = first.headers["ETag"]
+    version = first.headers["X-Snapshot-Version"]
+    assert json.loads(first.data)["count"] == 2
+
+    cached = c.get("/ships", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.data == b""
+
+    # The poller publishes a new snapshot
+    core.publish_default_snapshot([_ship(2, lat=63.0), _ship(3)])
+    changed = c.get("/ships", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+    delta = json.loads(c.get(f"/ships?since={version}").data)
+    assert sorted(f["mmsi"] for f in delta["features"]) == [2, 3]
+    assert delta["removed"] == [1]
+    assert delta["features"][0]["shipType"] == core._ship_type_description(30)
+
+    assert delta["since"] == version
+    assert delta["version"] == core.vessel_store.token(core.vessel_store.version)
+
+    full = json.loads(c.get(f"/ships?since={core.vessel_store.token(999)}").data)
+    assert "since" not in full and full["count"] == 2
+    assert {f["shipType"] for f in full["features"]} == {core._ship_type_description(30)}
+    assert c.get("/ships?since=abc").status_code == 400
+    assert c.get("/ships?since=1").status_code == 400
+
+
+def test_since_from_another_worker_gets_the_full_snapshot(ships_client):
+    c = ships_client
+    c.get("/ships")
+    core.publish_default_snapshot([_ship(2), _ship(3)])
+    worker_b = core.vessel_store
+    # Worker A has the same version numbers for a different history
+    worker_a = VesselStore()
+    worker_a.apply([_ship(1)])
+    assert worker_a.parse_token(worker_a.token(1)) == 1
+    assert worker_b.parse_token(worker_a.token(1)) is None
+
+    resp = json.loads(c.get(f"/ships?since={worker_a.token(1)}").data)
+    assert "since" not in resp and "removed" not in resp
+    assert sorted(f["mmsi"] for f in resp["features"]) == [2, 3]
@@ -0,0 +1,288 @@
+from __future__ import annotations
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional, Protocol, Tuple
+
+from db import LazyTable
+
+logger = logging.getLogger("barentswatch-geoapp")
+
+# (access_token, expiry as epoch seconds)
+TokenRecord = Tuple[str, float]
+
+
+class TokenStore(Protocol):
+    """Shared storage for the current token, visible to all worker processes."""
+
+    def load(self) -> Optional[TokenRecord]: ...
+
+    def save(self, token: str, expires_at: float) -> None: ...
+
+    def lock(self) -> contextlib.AbstractContextManager[Any]: ...
+
+
+class FileTokenStore:
+    """Token store backed by a small JSON file on local disk.
+
+    Writes are atomic (temp file + rename) and :meth:`lock` takes an exclusive
+    ``flock`` so only one process on the host refreshes at a time.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def load(self) -> Optional[TokenRecord]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return str(data["access_token"]), float(data["expires_at"])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("Invalid token cache %s: %s", self.path, exc)
+            return None
+
+    def save(self, token: str, expires_at: float) -> None:
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"access_token": token, "expires_at": expires_at}, f)
+        os.replace(tmp, self.path)
+
+    @contextlib.contextmanager
+    def lock(self) -> Iterator[None]:
+        try:
+            import fcntl
+        except ImportError:  # pragma: no cover - non-POSIX platforms
+            yield
+            return
+        fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+def _token_table(metadata: Any):
+    from sqlalchemy import Column, Float, String, Table, Text
+
+    return Table(
+        "bw_token",
+        metadata,
+        Column("name", String(64), primary_key=True),
+        Column("access_token", Text, nullable=False),
+        Column("expires_at", Float, nullable=False),
+    )
+
+
+class SqlTokenStore:
+    """Token store backed by a ``bw_token`` table in the configured database.
+
+    On Postgres :meth:`lock` uses an advisory lock; other dialects rely on
+    re-reading the store.
+    """
+
+    _ADVISORY_LOCK_KEY = 0x42570001
+
+    def __init__(self, engine_getter: Callable[[], Any], name: str = "default") -> None:
+        self._engine_getter = engine_getter
+        self.name = name
+        self._table = LazyTable(engine_getter, _token_table)
+
+    def load(self) -> Optional[TokenRecord]:
+        from sqlalchemy import select
+        from sqlalchemy.exc import SQLAlchemyError
+
+        try:
+            engine, table = self._table.resolve()
+            if engine is None:
+                return None
+            with engine.connect() as conn:
+                row = conn.execute(
+                    select(table.c.access_token, table.c.expires_at).where(
+                        table.c.name == self.name
+                    )
+                ).fetchone()
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to load shared token: %s", exc)
+            return None
+        return (row[0], float(row[1])) if row else None
+
+    def save(self, token: str, expires_at: float) -> None:
+        from sqlalchemy.exc import SQLAlchemyError
+
+        try:
+            engine, table = self._table.resolve()
+            if engine is None:
+                return
+            with engine.begin() as conn:
+                conn.execute(table.delete().where(table.c.name == self.name))
+                conn.execute(
+                    table.insert().values(
+                        name=self.name, access_token=token, expires_at=expires_at
+                    )
+                )
+        except SQLAlchemyError as exc:
+            logger.warning("Failed to store shared token: %s", exc)
+
+    @contextlib.contextmanager
+    def lock(self) -> Iterator[None]:
+        from sqlalchemy import text
+
+        engine = self._engine_getter()
+        if engine is None or engine.dialect.name != "postgresql":
+            yield
+            return
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": self._ADVISORY_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": self._ADVISORY_LOCK_KEY})
+                conn.commit()
+
+
+class TokenManager:
+    """Thread-safe OAuth token cache with single-flight, proactive refresh.
+
+    ``fetch`` performs the actual token request and returns
+    ``(access_token, expires_in_seconds)``. Callers only block on ``fetch``
+    when no usable token exists; a token that is inside ``refresh_margin`` of
+    its expiry is still handed out while a background thread renews it.
+    After every refresh a timer is armed so the token is renewed before it
+    expires even when no request arrives in between.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Tuple[str, int]],
+        store: Optional[TokenStore] = None,
+        refresh_margin: float = 300.0,
+        min_validity: float = 30.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._fetch = fetch
+        self.store = store
+        self.refresh_margin = refresh_margin
+        self.min_validity = min_validity
+        self._clock = clock
+        self._token: Optional[str] = None
+        self._expires_at: float = 0.0
+        self._refresh_at: float = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._timer: Optional[threading.Timer] = None
+        # Last token the upstream rejected, see invalidate()
+        self._rejected: Optional[str] = None
+
+    @property
+    def expires_at(self) -> float:
+        return self._expires_at
+
+    def get_token(self) -> str:
+        now = self._clock()
+        if not self._usable(now):
+            self._adopt_from_store()
+        token = self._token
+        if token and self._usable(now):
+            if not self._fresh(now):
+                self._refresh_in_background()
+            return token
+        return self._refresh(force=False)
+
+    def invalidate(self, token: str) -> None:
+        """Stop using ``token`` after the upstream rejected it.
+
+        The rejected token is not adopted from the store again, so the next
+        :meth:`get_token` fetches (and shares) a new one. A token that was
+        already replaced, e.g. by another thread seeing the same 401, is kept.
+        """
+        with self._lock:
+            self._rejected = token
+            if self._token == token:
+                self._token = None
+                self._expires_at = self._refresh_at = 0.0
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    def _usable(self, now: float) -> bool:
+        return bool(self._token) and now < self._expires_at - self.min_validity
+
+    def _fresh(self, now: float) -> bool:
+        return bool(self._token) and now < self._refresh_at
+
+    def _set(self, token: str, expires_at: float, now: float) -> None:
+        # Never spend more than half of the remaining lifetime in the refresh
+        # window, otherwise short-lived tokens would be renewed continuously.
+        margin = min(self.refresh_margin, max(0.0, expires_at - now) / 2)
+        self._token, self._expires_at = token, expires_at
+        self._refresh_at = expires_at - margin
+
+    def _adopt_from_store(self) -> bool:
+        if self.store is None:
+            return False
+        record = self.store.load()
+        if record and record[0] != self._rejected and record[1] > self._expires_at:
+            self._set(record[0], record[1], self._clock())
+            return True
+        return False
+
+    def _refresh(self, force: bool) -> str:
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock.
+            if not force and self._usable(self._clock()):
+                return self._token  # type: ignore[return-value]
+            lock = self.store.lock() if self.store is not None else contextlib.nullcontext()
+            with lock:
+                # ...or another process, sharing the token through the store.
+                self._adopt_from_store()
+                now = self._clock()
+                if self._fresh(now) or (not force and self._usable(now)):
+                    self._schedule(now)
+                    return self._token  # type: ignore[return-value]
+                token, expires_in = self._fetch()
+                now = self._clock()
+                self._set(token, now + expires_in, now)
+                if self.store is not None:
+                    try:
+                        self.store.save(token, self._expires_at)
+                    except OSError as exc:
+                        logger.warning("Failed to share token: %s", exc)
+            self._schedule(now)
+            return token
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run() -> None:
+            try:
+                self._refresh(force=True)
+            except Exception as exc:
+                logger.warning("Background token refresh failed: %s", exc)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="bw-token-refresh", daemon=True).start()
+
+    def _schedule(self, now: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        delay = max(1.0, self._refresh_at - now)
+        self._timer = threading.Timer(delay, self._refresh_in_background)
+        self._timer.daemon = True
+        self._timer.start()
@@ -0,0 +1,209 @@
+"""HTTP transport for BarentsWatch: pooling, retries and a circuit breaker.
+
+Every upstream call goes through :class:`Transport.post`, which uses
+separate connect/read timeouts, retries connection errors, 5xx and 429
+with jittered exponential backoff (honouring ``Retry-After``) within a
+total ``deadline`` per call, and
+consults a :class:`CircuitBreaker` so that while BarentsWatch is down calls
+fail immediately instead of tying up workers for the full timeout.
+"""
+from __future__ import annotations
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("barentswatch-geoapp")
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open, :meth:`before_call` raises :class:`CircuitOpenError`. After
+    ``reset_timeout`` seconds one trial call is let through (half-open); its
+    outcome closes the breaker again or re-opens it for another period.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._clock() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.reset_timeout - (self._clock() - self._opened_at)
+            if remaining > 0 or self._trial_running:
+                raise CircuitOpenError(
+                    f"BarentsWatch circuit open, retrying in {max(remaining, 0):.0f}s"
+                )
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    logger.warning(
+                        "BarentsWatch circuit opened after %d failures", self._failures
+                    )
+                self._opened_at = self._clock()
+            self._trial_running = False
+
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delta or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - (now or datetime.now(timezone.utc))).total_seconds())
+
+
+def pooled_session(pool_size: int) -> requests.Session:
+    """A session whose keep-alive pool fits ``pool_size`` parallel requests."""
+    session = requests.Session()
+    # Retries are handled by Transport so they can honour the breaker
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class Transport:
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        pool_size: int = 10,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        max_retry_after: float = 30.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        deadline: Optional[float] = 90.0,
+        breaker: Optional[CircuitBreaker] = None,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.session = session or pooled_session(pool_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # A longer Retry-After is not waited out on the request path
+        self.max_retry_after = max_retry_after
+        # Fail fast on unreachable hosts, be patient with slow queries
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        # Total seconds one post() may take, attempts and waits included
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self._clock = clock
+
+    def _delay(self, attempt: int) -> float:
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _fits(self, ends_at: Optional[float], delay: float) -> bool:
+        """Whether waiting ``delay`` still leaves time for another attempt."""
+        return ends_at is None or self._clock() + delay < ends_at
+
+    def post(self, url: str, **kwargs: Any) -> Any:
+        """POST with retries; returns the last response or raises.
+
+        Only use this for idempotent requests - all BarentsWatch calls here
+        are queries or token grants and are safe to repeat. A read timeout is
+        not retried: the query already took the whole ``read_timeout``, and
+        a retry would most likely hang as long again. No attempt or wait
+        runs past ``deadline``.
+        """
+        ends_at = None if self.deadline is None else self._clock() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            self.breaker.before_call()
+            timeout = self.timeout
+            if ends_at is not None:
+                remaining = max(ends_at - self._clock(), 0.001)
+                timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+            try:
+                resp = self.session.post(url, timeout=timeout, **kwargs)
+            except requests.ConnectionError as exc:
+                # Includes ConnectTimeout: the request never reached upstream
+                self.breaker.record_failure()
+                delay = self._delay(attempt)
+                if attempt == self.max_retries or not self._fits(ends_at, delay):
+                    raise
+                logger.warning("BarentsWatch request failed (%s), retrying in %.1fs", exc, delay)
+                self._sleep(delay)
+                continue
+            except Exception:
+                # ReadTimeout too; never leave a half-open trial dangling
+                self.breaker.record_failure()
+                raise
+
+            status = resp.status_code
+            if status not in RETRY_STATUSES:
+                # 4xx other than 429 is our fault, not an upstream outage
+                self.breaker.record_success()
+                return resp
+            if status == 429:
+                # Throttled, but alive
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            if attempt == self.max_retries:
+                return resp
+            delay = self._delay(attempt)
+            if status == 429:
+                retry_after = parse_retry_after((getattr(resp, "headers", None) or {}).get("Retry-After"))
+                if retry_after is not None:
+                    if retry_after > self.max_retry_after:
+                        return resp
+                    delay = retry_after
+            if not self._fits(ends_at, delay):
+                return resp
+            logger.warning("BarentsWatch returned %s, retrying in %.1fs", status, delay)
+            self._sleep(delay)
+        return resp  # pragma: no cover - loop always returns or raises
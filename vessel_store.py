@@ -0,0 +1,225 @@
+from __future__ import annotations
+import os
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional
+
+
+def _intern(value: Any) -> Any:
+    # Names, destinations and timestamps repeat across polls; share one copy
+    return sys.intern(value) if type(value) is str else value
+
+
+class VesselState:
+    """Latest state of one vessel. Treated as immutable once stored."""
+
+    __slots__ = (
+        "mmsi",
+        "name",
+        "latitude",
+        "longitude",
+        "msgtime",
+        "ship_type",
+        "destination",
+        "length",
+        "version",
+    )
+
+    def __init__(
+        self,
+        mmsi: int,
+        name: Any = None,
+        latitude: Any = None,
+        longitude: Any = None,
+        msgtime: Any = None,
+        ship_type: Any = None,
+        destination: Any = None,
+        length: Any = None,
+        version: int = 0,
+    ) -> None:
+        self.mmsi = mmsi
+        self.name = _intern(name)
+        self.latitude = latitude
+        self.longitude = longitude
+        self.msgtime = _intern(msgtime)
+        self.ship_type = _intern(ship_type)
+        self.destination = _intern(destination)
+        self.length = length
+        self.version = version
+
+    @classmethod
+    def from_feature(cls, mmsi: int, feature: Mapping[str, Any], version: int) -> "VesselState":
+        return cls(
+            mmsi,
+            feature.get("name"),
+            feature.get("latitude"),
+            feature.get("longitude"),
+            feature.get("msgtime"),
+            feature.get("shipType"),
+            feature.get("destination"),
+            feature.get("length"),
+            version,
+        )
+
+    def data(self) -> tuple:
+        return (
+            self.name,
+            self.latitude,
+            self.longitude,
+            self.msgtime,
+            self.ship_type,
+            self.destination,
+            self.length,
+        )
+
+    def to_feature(self) -> Dict[str, Any]:
+        return {
+            "mmsi": self.mmsi,
+            "name": self.name,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "msgtime": self.msgtime,
+            "shipType": self.ship_type,
+            "destination": self.destination,
+            "length": self.length,
+        }
+
+    def __repr__(self) -> str:
+        return f"VesselState(mmsi={self.mmsi}, version={self.version})"
+
+
+class VesselDelta(NamedTuple):
+    added: List[int]
+    updated: List[int]
+    removed: List[int]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+
+class VesselChanges(NamedTuple):
+    """Everything that changed after ``since``, as of store ``version``."""
+
+    version: int
+    since: int
+    changed: List[VesselState]
+    removed: List[int]
+
+
+class VesselStore:
+    """Compact latest-state store for every tracked vessel, keyed by MMSI.
+
+    Records use ``__slots__`` and interned strings. Each :meth:`apply`
+    builds a new MMSI -> record mapping and swaps it in, and
+    changed vessels get a new record rather than being mutated, so readers
+    can iterate :meth:`view` without locks or copies while a poll updates
+    the store. :attr:`version` increases with every change.
+
+    Every record carries the version it last changed in and removed vessels
+    leave a tombstone, so :meth:`changes_since` can answer "what changed
+    after version N" without keeping old snapshots. Only the newest
+    ``max_tombstones`` removals are kept; older versions get ``None``.
+
+    Versions count this process's polls, so clients get them as
+    :meth:`token` strings qualified by :attr:`epoch`; a token from another
+    worker's store does not :meth:`parse_token` here.
+    """
+
+    def __init__(self, max_tombstones: int = 10000) -> None:
+        self._vessels: Dict[int, VesselState] = {}
+        self.version = 0
+        # Versions are only comparable within one store instance
+        self.epoch = os.urandom(4).hex()
+        self.max_tombstones = max_tombstones
+        # MMSI -> version it was removed in, oldest first
+        self._tombstones: Dict[int, int] = {}
+        # Oldest version changes_since() can still answer for
+        self._horizon = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._vessels)
+
+    def __contains__(self, mmsi: object) -> bool:
+        return mmsi in self._vessels
+
+    def get(self, mmsi: int) -> Optional[VesselState]:
+        return self._vessels.get(mmsi)
+
+    def mmsis(self) -> List[int]:
+        return list(self._vessels)
+
+    def view(self) -> Iterable[VesselState]:
+        """Records of the current snapshot; stays valid across later updates."""
+        return self._vessels.values()
+
+    def token(self, version: int) -> str:
+        return f"{self.epoch}-{version}"
+
+    def parse_token(self, token: str) -> Optional[int]:
+        """Version in ``token``, or ``None`` if another store issued it.
+
+        Raises ``ValueError`` for anything that is not a version token.
+        """
+        epoch, _, version = token.rpartition("-")
+        number = int(version)
+        if not epoch:
+            raise ValueError(f"Not a version token: {token!r}")
+        return number if epoch == self.epoch else None
+
+    def changes_since(self, since: int) -> Optional[VesselChanges]:
+        """Vessels added, updated or removed after version ``since``.
+
+        Returns ``None`` when ``since`` is older than the retained tombstones
+        or newer than the store (e.g. from before a restart); the caller
+        should then fall back to the full snapshot.
+        """
+        with self._lock:
+            if since < self._horizon or since > self.version:
+                return None
+            changed = [r for r in self._vessels.values() if r.version > since]
+            removed = [m for m, v in self._tombstones.items() if v > since]
+            return VesselChanges(self.version, since, changed, removed)
+
+    def apply(self, features: Iterable[Mapping[str, Any]]) -> VesselDelta:
+        """Replace the snapshot with ``features``; missing vessels are removed."""
+        with self._lock:
+            current = self._vessels
+            version = self.version + 1
+            vessels: Dict[int, VesselState] = {}
+            added: List[int] = []
+            updated: List[int] = []
+            for feature in features:
+                try:
+                    mmsi = int(feature.get("mmsi"))
+                except (TypeError, ValueError):
+                    continue
+                record = VesselState.from_feature(mmsi, feature, version)
+                previous = current.get(mmsi)
+                if previous is None:
+                    added.append(mmsi)
+                elif previous.data() == record.data():
+                    record = previous
+                else:
+                    updated.append(mmsi)
+                vessels[mmsi] = record
+            removed = [m for m in current if m not in vessels]
+            delta = VesselDelta(added, updated, removed)
+            # Unchanged polls keep the existing mapping and version
+            if delta:
+                self._commit(vessels, removed, added)
+            return delta
+
+    def _commit(self, vessels: Dict[int, VesselState], removed: List[int], added: List[int]) -> None:
+        self.version += 1
+        tombstones = self._tombstones
+        for mmsi in added:
+            tombstones.pop(mmsi, None)
+        for mmsi in removed:
+            # Re-insert so the dict stays ordered by removal version
+            tombstones.pop(mmsi, None)
+            tombstones[mmsi] = self.version
+        while len(tombstones) > self.max_tombstones:
+            mmsi = next(iter(tombstones))
+            self._horizon = tombstones.pop(mmsi)
+        self._vessels = vessels